@@ -2,10 +2,14 @@ from .health import health_bp
 from .swagger import swaggerui_blueprint
 from .chat import chat_bp
 from .prompts import prompt_bp
+from .metrics import metrics_bp
+from .admin import admin_bp
 
 def register_blueprints(app):
     app.register_blueprint(health_bp)
     app.register_blueprint(swaggerui_blueprint)
     app.register_blueprint(chat_bp)
     app.register_blueprint(prompt_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(admin_bp)
 
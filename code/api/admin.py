@@ -0,0 +1,77 @@
+import hmac
+
+from flask import Blueprint, jsonify, request, send_file
+
+from config import ADMIN_API_TOKEN
+from memory_diagnostics import is_tracing, memory_report, take_snapshot
+from profiling import list_profiles, profile_path
+from query_stats import query_stats
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+@admin_bp.before_request
+def require_admin_token():
+    """
+    Admin endpoints expose SQL and internals: they need the X-Admin-Token header
+    and are disabled entirely when ADMIN_API_TOKEN is not configured.
+    """
+    if not ADMIN_API_TOKEN:
+        return jsonify({"success": False, "error": "Admin endpoints are disabled"}), 404
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode(), ADMIN_API_TOKEN.encode()):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+
+@admin_bp.route("/query-stats", methods=["GET"])
+def get_query_stats():
+    """
+    Per-fingerprint statement timings (count, p50/p99) and recent slow queries with sampled plans.
+    """
+    limit = request.args.get("limit", default=50, type=int)
+    return jsonify({
+        "success": True,
+        "threshold_ms": query_stats.threshold_ms,
+        "queries": query_stats.summary(limit),
+        "slow_queries": query_stats.slow_queries(),
+    }), 200
+
+
+@admin_bp.route("/query-stats", methods=["DELETE"])
+def reset_query_stats():
+    query_stats.reset()
+    return jsonify({"success": True, "message": "Query stats reset."}), 200
+
+
+@admin_bp.route("/profiles", methods=["GET"])
+def get_profiles():
+    """
+    Recent request CPU profiles (collapsed stacks), newest first.
+    """
+    limit = request.args.get("limit", default=50, type=int)
+    return jsonify({"success": True, "profiles": list_profiles(limit=limit)}), 200
+
+
+@admin_bp.route("/profiles/<name>", methods=["GET"])
+def download_profile(name):
+    path = profile_path(name)
+    if path is None:
+        return jsonify({"success": False, "error": "Profile not found"}), 404
+    return send_file(path, mimetype="text/plain", as_attachment=True, download_name=name)
+
+
+@admin_bp.route("/memory", methods=["GET"])
+def get_memory_report():
+    """
+    tracemalloc totals, top allocation sites, growth between snapshots and per-endpoint allocation deltas.
+    """
+    limit = request.args.get("limit", default=25, type=int)
+    return jsonify({"success": True, **memory_report(limit)}), 200
+
+
+@admin_bp.route("/memory/snapshot", methods=["POST"])
+def create_memory_snapshot():
+    if not is_tracing():
+        return jsonify({"success": False, "error": "Memory diagnostics are not enabled"}), 409
+    take_snapshot()
+    return jsonify({"success": True, "message": "Snapshot taken."}), 200
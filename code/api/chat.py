@@ -1,14 +1,17 @@
 
+from functools import partial
 from http import HTTPStatus
 import traceback
 from urllib.parse import urlparse
 from flask import Blueprint, jsonify, request
 from api.models import APIResponse
 from history import get_history
+from idempotency import request_fingerprint, run_once
 from leads import get_all_chat_info
-from leads_update import update_chat_info, update_contact_info
+from leads_update import bulk_update_chat_info, update_chat_info, update_contact_info
 from llm_api import get_groq_response
-from api.validators import validate_address, validate_contact_data, validate_history_data, validate_session_id, validate_update_data, chat_api_validate
+from metrics import observe_stage
+from api.validators import validate_address, validate_contact_data, validate_history_data, validate_session_id, validate_update_data, validate_bulk_update_data, chat_api_validate
 
 chat_bp = Blueprint("chat", __name__)
 
@@ -18,23 +21,40 @@ chat_bp = Blueprint("chat", __name__)
 @chat_bp.route('/chat', methods=['POST'])
 def chat_api():
     # Validate Request
-    chat_validation_response = chat_api_validate(request)
+    with observe_stage("validation"):
+        chat_validation_response = chat_api_validate(request)
     if not chat_validation_response.is_valid:
         return APIResponse(chat_validation_response).response(HTTPStatus.BAD_REQUEST)
     
-     # Get response from LLM
     data = request.get_json()
-    input = data.get('input', '')
-    session_id = data.get('session_id')
+    input = data.get('input', '').strip()
+    session_id = chat_validation_response.data["session_id"]
     request_type = chat_validation_response.data["request_type"]
     domain = chat_validation_response.data["domain"]
+    compute = partial(_chat_reply, input, session_id, request_type, domain)
+
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is None:
+        body, status = compute()
+        return jsonify(body), status
+    # A retried message: answered once, duplicates wait for or replay that answer
+    body, status, replayed = run_once(session_id, idempotency_key.strip(),
+                                      request_fingerprint(input, request_type), compute)
+    response = jsonify(body)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response, status
+
+
+def _chat_reply(input, session_id, request_type, domain):
+    # Get response from LLM
     try:
-        bot_response = get_groq_response(input.strip(), session_id, request_type, domain)
-        return APIResponse(None,{'response': bot_response}).response(HTTPStatus.OK)
+        bot_response = get_groq_response(input, session_id, request_type, domain)
+        return APIResponse(None,{'response': bot_response}).payload(HTTPStatus.OK)
     except Exception as e:
         print(f"Error during LLM call: {e}")
         print(traceback.format_exc())
-        return APIResponse().response(HTTPStatus.INTERNAL_SERVER_ERROR)
+        return APIResponse().payload(HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
 @chat_bp.route('/chat-info', methods=['PATCH'])
@@ -55,6 +75,25 @@ def patch_updates():
         return APIResponse().response(HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
+@chat_bp.route('/chat-info/bulk', methods=['PATCH'])
+def patch_bulk_updates():
+    try:
+        bulk_validation_response = validate_bulk_update_data(request)
+        if not bulk_validation_response.is_valid:
+            return APIResponse(bulk_validation_response).response(HTTPStatus.BAD_REQUEST)
+        updates = bulk_validation_response.data
+        updated_session_ids = set(bulk_update_chat_info(updates))
+        not_found = [row[0] for row in updates if row[0] not in updated_session_ids]
+        return APIResponse(None, {
+            'message': "chat-info updated",
+            'updated': len(updated_session_ids),
+            'not_found': not_found
+        }).response(HTTPStatus.OK)
+    except Exception as e:
+        print(traceback.format_exc())
+        return APIResponse().response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
 @chat_bp.route('/chat-info/contact', methods=['PATCH'])
 def patch_contact_info():
     try:
@@ -92,5 +131,6 @@ def history_endpoint():
     if not history_validation_response.is_valid:
         return APIResponse(history_validation_response).response(HTTPStatus.BAD_REQUEST)
     session_id = request.args.get("session_id")
-    history_data, status = get_history(session_id, history_validation_response.data["domain"])
+    history_data, status = get_history(session_id, history_validation_response.data["domain"],
+                                       history_validation_response.data["request_type"])
     return jsonify(history_data), status
\ No newline at end of file
@@ -20,6 +20,7 @@ from http import HTTPStatus
 from flask_smorest import Blueprint, abort
 
 from db import sync_connection
+from db_router import read_connection
 from domains import (
     DomainAlreadyExistsError,
     DomainRepository,
@@ -27,6 +28,7 @@ from domains import (
     InvalidWebsiteURLError,
 )
 from domains.schemas import CreateDomainRequest, DomainResponse
+from api.validators import origin_directory
 
 domains_bp = Blueprint(
     "domains",
@@ -43,14 +45,15 @@ domains_bp = Blueprint(
 # Dependency factory
 # ---------------------------------------------------------------------------
 
-def _get_domain_service() -> DomainService:
+def _get_domain_service(connection=None) -> DomainService:
     """
-    Construct a fully-wired ``DomainService`` using the shared DB connection.
+    Construct a fully-wired ``DomainService`` using the shared DB connection,
+    or *connection* when given (read-only routes pass a replica connection).
 
     Extracted into a named function so tests can patch it with
     ``unittest.mock.patch("api.domains._get_domain_service")``.
     """
-    return DomainService(DomainRepository(sync_connection))
+    return DomainService(DomainRepository(connection or sync_connection))
 
 
 # ---------------------------------------------------------------------------
@@ -67,7 +70,8 @@ def create_domain(body: dict):
     Register a new domain.
 
     Accepts a website address, extracts the canonical hostname (stripping
-    scheme, path, query-string and a leading ``www.``), and auto-generates
+    scheme, path, query-string and a leading ``www.``; ``*.client.com``
+    registers every sub-domain of client.com), and auto-generates
     the domain key from the hostname. The domain is created under the default
     root (parent_id=1) automatically.
     """
@@ -77,6 +81,8 @@ def create_domain(body: dict):
             website_url=body["website_url"],
             parent_id=1,
         )
+        # Served by this process at once; other workers pick it up within ORIGIN_MAP_TTL_SECONDS
+        origin_directory.refresh()
         return domain
     except DomainAlreadyExistsError as exc:
         abort(HTTPStatus.CONFLICT, message=str(exc))
@@ -92,7 +98,8 @@ def list_domains():
 
     Returns an array of domain records ordered by creation time (oldest first).
     """
-    return _get_domain_service().list_domains()
+    with read_connection() as connection:
+        return _get_domain_service(connection).list_domains()
 
 
 @domains_bp.get("/<int:domain_id>")
@@ -102,7 +109,8 @@ def get_domain(domain_id: int):
     """
     Retrieve a single domain by its ID.
     """
-    domain = _get_domain_service().get_domain(domain_id)
+    with read_connection() as connection:
+        domain = _get_domain_service(connection).get_domain(domain_id)
     if domain is None:
         abort(HTTPStatus.NOT_FOUND, message=f"Domain with id={domain_id} not found.")
     return domain
@@ -1,27 +1,146 @@
+"""
+Health checks in two tiers.
+
+* ``GET /health`` is the liveness probe: it does no I/O, so load balancers can
+  poll it as often as they like.
+* ``GET /health/deep`` checks the dependencies over the connections the app
+  already holds (the primary connection and the shard pools; replica lag comes
+  from the replica router's own sampling) and reports database latency, pool
+  saturation, the LLM error rate and background queue depths.  The report is
+  cached for HEALTH_CHECK_CACHE_SECONDS and refreshed by one request at a
+  time, so frequent probes cost no database round trips.
+
+Readiness after start-up is ``GET /ready`` (see ``warmup.py``).
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
 from flask import Blueprint, jsonify
-import psycopg
-from config import DATABASE_URL
+
+from config import HEALTH_CHECK_CACHE_SECONDS, HEALTH_LLM_ERROR_RATE_THRESHOLD
+from metrics import BACKGROUND_QUEUE_DEPTH, DB_POOL_CONNECTIONS, LLM_CALL_ERRORS, LLM_CALL_SECONDS
+from warmup import is_ready, readiness_report
 
 health_bp = Blueprint("health", __name__)
 
+_started_at = time.time()
+_refresh_lock = threading.Lock()
+_cache = {"report": None, "checked_at": 0.0, "llm_totals": (0, 0)}
+
+
 @health_bp.route("/health", methods=["GET"])
 def health():
     """
-    Health check endpoint that verifies application and database connectivity.
+    Liveness probe: the process is up and serving requests. No I/O.
+    """
+    return jsonify({"message": "Hello World", "status": "alive",
+                    "uptime_seconds": round(time.time() - _started_at, 1)}), 200
+
+
+@health_bp.route("/health/deep", methods=["GET"])
+def deep_health():
+    """
+    Dependency health, cached for HEALTH_CHECK_CACHE_SECONDS: 200 when every
+    database answers ("ok" or "degraded"), 503 when one does not ("down").
+    """
+    report = cached_health_report()
+    return jsonify(report), 503 if report["status"] == "down" else 200
+
+
+@health_bp.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness probe: 503 until the worker's warm-up has finished, then 200.
+    """
+    report = readiness_report()
+    if is_ready():
+        return jsonify({"status": "ready", "steps": report["steps"]}), 200
+    return jsonify({"status": "warming_up", **report}), 503
+
+
+def cached_health_report(max_age_seconds: float = HEALTH_CHECK_CACHE_SECONDS) -> dict:
+    """The latest deep-check report, re-run when older than *max_age_seconds*.
+
+    One request refreshes at a time; concurrent ones get the previous report.
     """
-    status = {
-        "message": "Hello World",
-        "database": "disconnected"
+    if _cache["report"] is None or time.time() - _cache["checked_at"] >= max_age_seconds:
+        # Wait for a refresh in progress only when there is no report to serve yet
+        if _refresh_lock.acquire(blocking=_cache["report"] is None):
+            try:
+                if _cache["report"] is None or time.time() - _cache["checked_at"] >= max_age_seconds:
+                    _cache["report"] = check_dependencies()
+                    _cache["checked_at"] = time.time()
+            finally:
+                _refresh_lock.release()
+    return {**_cache["report"], "age_seconds": round(time.time() - _cache["checked_at"], 3)}
+
+
+def check_dependencies() -> dict:
+    from db_router import replica_status
+    from sharding import router
+
+    databases = {shard: _ping(shard) for shard in router.all_shards()}
+    replica = replica_status()
+    llm = _llm_error_rate()
+
+    if not all(check["ok"] for check in databases.values()):
+        status = "down"
+    elif (replica["configured"] and not replica["healthy"]) or (
+            llm["error_rate"] is not None and llm["error_rate"] > HEALTH_LLM_ERROR_RATE_THRESHOLD):
+        status = "degraded"
+    else:
+        status = "ok"
+    return {
+        "status": status,
+        "checked_at": datetime.now(timezone.utc).isoformat(),
+        "databases": databases,
+        "replica": replica,
+        "pools": _pool_saturation(),
+        "llm": llm,
+        "background_queues": {labels[0]: depth for labels, depth in BACKGROUND_QUEUE_DEPTH.collect().items()},
     }
-    
+
+
+def _ping(shard) -> dict:
+    """Round-trip time of ``SELECT 1`` on *shard* (the shared primary connection or a pooled one)."""
+    from sharding import shard_connection
+
+    started = time.perf_counter()
     try:
-        # Check database connectivity
-        with psycopg.connect(DATABASE_URL) as conn:
+        with shard_connection(shard) as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT 1")
-                cur.fetchone()
-        status["database"] = "connected"
-        return jsonify(status), 200
+                cur.execute("SELECT 1;")
+            conn.rollback()
+        return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
     except Exception as e:
-        status["database_error"] = str(e)
-        return jsonify(status), 503
+        print(f"[HEALTH] Database '{shard}' check failed: {e}")
+        return {"ok": False, "latency_ms": None, "error": str(e)}
+
+
+def _pool_saturation() -> dict:
+    """Connections per pool; saturation is the share of the pool's maximum in use."""
+    pools = {}
+    for (pool, state), value in DB_POOL_CONNECTIONS.collect().items():
+        pools.setdefault(pool, {})[state] = value
+    for stats in pools.values():
+        stats["in_use"] = stats.get("size", 0) - stats.get("idle", 0)
+        stats["saturation"] = round(stats["in_use"] / stats["max"], 3) if stats.get("max") else None
+    return pools
+
+
+def _llm_error_rate() -> dict:
+    """LLM calls and failures since the previous deep check, plus the process totals."""
+    errors = sum(LLM_CALL_ERRORS.collect().values())
+    # Failed calls are not observed in the latency histogram
+    calls = sum(sum(counts[:-1]) for counts in LLM_CALL_SECONDS.collect().values()) + errors
+    previous_calls, previous_errors = _cache["llm_totals"]
+    _cache["llm_totals"] = (calls, errors)
+    window_calls, window_errors = calls - previous_calls, errors - previous_errors
+    return {
+        "calls": window_calls,
+        "errors": window_errors,
+        "error_rate": round(window_errors / window_calls, 3) if window_calls else None,
+        "total_calls": calls,
+        "total_errors": errors,
+    }
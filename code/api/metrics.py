@@ -0,0 +1,13 @@
+from flask import Blueprint, Response
+
+from metrics import render_prometheus
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus scrape endpoint: request, chat stage, LLM and connection pool metrics.
+    """
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
@@ -11,20 +11,37 @@ class APIResponse:
         self.data = data
     
     def response(self, http_status=None):
+        body, http_status = self.payload(http_status)
+        return jsonify(body), http_status
+
+    def payload(self, http_status=None):
+        """The response body and status, for callers outside a Flask app context (the ASGI app)."""
         if http_status == HTTPStatus.BAD_REQUEST:
-            return jsonify({
+            return {
                 'success': self.validation_response.is_valid,
-                'error': self.validation_response.message}), http_status
+                'error': self.validation_response.message}, http_status
         elif http_status == HTTPStatus.OK:
-            return jsonify({
+            return {
                 'success': True
-                } | self.data), http_status
+                } | self.data, http_status
         else:
-            return jsonify({
+            return {
             'success': False,
-            'error': "Sorry, something went wrong. Please try again later."}), http_status
+            'error': "Sorry, something went wrong. Please try again later."}, http_status
         
 
+class RequestView:
+    """The parts of a Flask request the validators read, over a Starlette request or WebSocket."""
+
+    def __init__(self, request, json_body=None):
+        self.args = request.query_params
+        self.headers = request.headers
+        self._json = {} if json_body is None else json_body
+
+    def get_json(self, silent=False):
+        return self._json
+
+
 class ValidationResponse:
     def __init__(self, is_valid, message=None, data=None):
         self.is_valid = is_valid 
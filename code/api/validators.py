@@ -1,24 +1,93 @@
 from http import HTTPStatus
 from urllib.parse import urlparse
 from api.models import ValidationResponse
-from config import max_input_length, agent_type , status_type
+from config import DATABASE_URL, ORIGIN_MAP_TTL_SECONDS, max_input_length, max_idempotency_key_length, max_bulk_update_size, agent_type , status_type
 import uuid
-from db import sync_connection
+from db import create_sync_connection
+from sharding import ShardMovingError, resolve_shard
+from metrics import observe_stage
+from session_token import SessionTokenError, verify_token
+from domains import OriginDirectory
+
+# Request origins resolved in memory: exact, www. and wildcard (*.client.com) addresses
+origin_directory = OriginDirectory(lambda: create_sync_connection(DATABASE_URL, autocommit=True),
+                                   ORIGIN_MAP_TTL_SECONDS)
 
 def chat_api_validate(request) -> ValidationResponse:
+    idempotency_key_validation_response = validate_idempotency_key(request)
+    if not idempotency_key_validation_response.is_valid:
+        return idempotency_key_validation_response
+
+    session_token = get_session_token(request)
+    if session_token:
+        return validate_chat_token(request, session_token)
+
+    chat_fields_validation_response = validate_chat_fields(request)
+    if not chat_fields_validation_response.is_valid:
+        return chat_fields_validation_response
+
+    # Idempotency keys are stored per session, so a keyed request must name its session
+    session_id = request.get_json().get("session_id")
+    if request.headers.get("Idempotency-Key") is not None and not (isinstance(session_id, str) and is_valid_uuid(session_id)):
+        return ValidationResponse(False, "A valid session_id is required with an Idempotency-Key")
+
+    address_validation_response = validate_address(request)
+    if not address_validation_response.is_valid:
+        return address_validation_response 
+    
+    return ValidationResponse(True, "", {"request_type":chat_fields_validation_response.data, "domain":address_validation_response.data,
+                                         "session_id":session_id})
+
+
+def validate_chat_token(request, session_token) -> ValidationResponse:
+    """
+    A chat request carrying a session token from /history: the token stands in for the
+    session id, origin and request type, so there is no UUID parsing and no domain lookup.
+    """
     chat_input_validation_response = validate_chat_user_input(request)
     if not chat_input_validation_response.is_valid:
         return chat_input_validation_response
-    
+    try:
+        claims = verify_token(session_token)
+    except SessionTokenError as e:
+        return ValidationResponse(False, str(e))
+
+    data = request.get_json()
+    # Fields sent alongside the token must agree with it
+    if data.get("session_id") not in (None, claims["sid"]):
+        return ValidationResponse(False, "Session token does not match the session id")
+    request_type = data.get("request_type")
+    if request_type is not None and str(request_type).lower().strip() != claims["typ"]:
+        return ValidationResponse(False, "Session token does not match the request type")
+
+    shard_validation_response = _resolve_domain_shard(claims["dom"])
+    if not shard_validation_response.is_valid:
+        return shard_validation_response
+    return ValidationResponse(True, "", {"request_type":claims["typ"], "domain":claims["dom"], "session_id":claims["sid"]})
+
+
+def get_session_token(request):
+    return request.headers.get("X-Session-Token") or (request.get_json(silent=True) or {}).get("session_token")
+
+
+def validate_idempotency_key(request) -> ValidationResponse:
+    """The optional Idempotency-Key header of a chat request (see idempotency.py)."""
+    key = request.headers.get("Idempotency-Key")
+    if key is not None and not (0 < len(key.strip()) <= max_idempotency_key_length):
+        return ValidationResponse(False, "Invalid Idempotency-Key")
+    return ValidationResponse(True, "")
+
+
+def validate_chat_fields(request) -> ValidationResponse:
+    """Input and request type of a chat request; data is the normalised request type."""
+    chat_input_validation_response = validate_chat_user_input(request)
+    if not chat_input_validation_response.is_valid:
+        return chat_input_validation_response
+
     request_type = request.get_json().get('request_type').lower().strip()
     if request_type not in agent_type:
         return ValidationResponse(False, "Need a valid request type")
-
-    address_validation_response = validate_address(request)
-    if not address_validation_response.is_valid:
-        return address_validation_response 
-    
-    return ValidationResponse(True, "", {"request_type":request_type, "domain":address_validation_response.data})
+    return ValidationResponse(True, "", request_type)
     
 
 def validate_contact_data(request):
@@ -43,15 +112,55 @@ def validate_contact_data(request):
 
 def validate_update_data(request):
     data = request.get_json()
-    status = data.get("status")
-    is_active = data.get("is_active")
     if not data:
         return ValidationResponse(False,"data is required")
-    if not validate_session_id(request).is_valid:
-        return validate_session_id(request)
+    session_validation = validate_session_id(request)
+    if not session_validation.is_valid:
+        return session_validation
+    return validate_lead_fields(data.get("status"), data.get("is_active"))
+
+
+def validate_bulk_update_data(request):
+    """Validate a bulk chat-info update in memory; data is a list of (session_id, status, remarks, is_active)."""
+    data = request.get_json(silent=True)
+    if not data:
+        return ValidationResponse(False, "data is required")
+    updates = data.get("updates")
+    if not isinstance(updates, list) or not updates:
+        return ValidationResponse(False, "updates must be a non-empty list")
+    if len(updates) > max_bulk_update_size:
+        return ValidationResponse(False, f"At most {max_bulk_update_size} updates are allowed per request")
+
+    rows = []
+    seen = set()
+    for index, item in enumerate(updates):
+        if not isinstance(item, dict):
+            return ValidationResponse(False, f"updates[{index}]: Invalid input")
+        session_id = item.get("session_id")
+        if session_id is None:
+            return ValidationResponse(False, f"updates[{index}]: session_id is required")
+        if not isinstance(session_id, str) or not is_valid_uuid(session_id):
+            return ValidationResponse(False, f"updates[{index}]: Invalid session id format")
+        if session_id in seen:
+            return ValidationResponse(False, f"updates[{index}]: Duplicate session id")
+        seen.add(session_id)
+
+        status = item.get("status")
+        remarks = item.get("remarks")
+        is_active = item.get("is_active")
+        if not all(value is None or isinstance(value, str) for value in (status, remarks)):
+            return ValidationResponse(False, f"updates[{index}]: Invalid input")
+        fields_validation = validate_lead_fields(status, is_active)
+        if not fields_validation.is_valid:
+            return ValidationResponse(False, f"updates[{index}]: {fields_validation.message}")
+        rows.append((session_id, status or None, remarks or None, is_active))
+    return ValidationResponse(True, "", rows)
+
+
+def validate_lead_fields(status, is_active):
     if status and status not in status_type.__members__ and status not in [s.value for s in status_type]:
         return ValidationResponse(False,"Status not allowed")
-    if is_active and not isinstance(is_active, bool):
+    if is_active is not None and not isinstance(is_active, bool):
         return ValidationResponse(False,"Invalid input")
     return ValidationResponse(True, "")
 
@@ -60,11 +169,23 @@ def validate_history_data(request):
     session_validation_response = validate_session_id(request)
     if not session_validation_response.is_valid:
         return session_validation_response
+    request_type_validation_response = validate_history_request_type(request)
+    if not request_type_validation_response.is_valid:
+        return request_type_validation_response
     
     address_validation_response  = validate_address(request)
     if not address_validation_response.is_valid:
         return address_validation_response 
-    return ValidationResponse(True, None, {"domain": address_validation_response.data})
+    return ValidationResponse(True, None, {"domain": address_validation_response.data,
+                                           "request_type": request_type_validation_response.data})
+
+
+def validate_history_request_type(request):
+    """Optional ``request_type`` of /history (default sales), bound into the session token."""
+    request_type = (request.args.get("request_type") or agent_type.SALES.value).lower().strip()
+    if request_type not in agent_type:
+        return ValidationResponse(False, "Need a valid request type")
+    return ValidationResponse(True, "", request_type)
 
 
 def validate_chat_user_input(request) -> ValidationResponse:
@@ -97,17 +218,23 @@ def validate_session_id(request):
     
 def validate_address(request):
     address = get_request_address(request)
-    """Checks whether the given address exists. Returns (is_valid, domain or message)."""
-    sync_connection.rollback()
-    
-    with sync_connection.cursor() as cur:
-        cur.execute("SELECT key FROM domains WHERE address = %s;", (address,))
-        row = cur.fetchone()
+    """Checks whether the given address is registered. Returns (is_valid, domain or message)."""
+    with observe_stage("domain_lookup"):
+        domain_key = origin_directory.resolve(address)
 
-        if not row:
+        if not domain_key:
             return ValidationResponse(False, "Incorrect Address")
-        
-        return ValidationResponse(True, "",row[0])
+
+    return _resolve_domain_shard(domain_key)
+
+
+def _resolve_domain_shard(domain_key):
+    # Resolve the domain's shard once; history, leads and extraction writes reuse it
+    try:
+        resolve_shard(domain_key)
+    except ShardMovingError:
+        return ValidationResponse(False, "This site is being upgraded, please try again in a minute.")
+    return ValidationResponse(True, "",domain_key)
     
 
 def get_request_address(request):
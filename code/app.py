@@ -1,10 +1,18 @@
-from flask import Flask, render_template
+import threading
+import time
+
+from flask import Flask, g, render_template, request
 from flask_cors import CORS
 from flask_smorest import Api
 
 from api import register_blueprints
 from api.domains import domains_bp
-from config import DEBUG
+from config import DEBUG, FORKING_SERVER
+from memory_diagnostics import request_finished, request_started
+from profiling import RequestProfiler, profile_name, should_profile, write_profile
+from metrics import HTTP_REQUEST_SECONDS
+from tracing import bind_request_id, close_span, open_span, parse_traceparent, request_id_from, unbind_request_id
+from worker_lifecycle import start_maintenance_workers, start_process_resources
 
 # ---------------------------------------------------------------------------
 # Application factory
@@ -33,7 +41,63 @@ def create_app() -> Flask:
     smorest_api = Api(flask_app)
     smorest_api.register_blueprint(domains_bp)
 
-    CORS(flask_app)
+    # Widgets read Idempotent-Replayed on a replayed /chat reply
+    CORS(flask_app, expose_headers=["Idempotent-Replayed"])
+
+    # -- Request latency for /metrics, request IDs, tracing spans, profiles ---
+    @flask_app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.request_memory = request_started()
+        g.request_id = request_id_from(request.headers.get("X-Request-ID"))
+        g.request_id_token = bind_request_id(g.request_id)
+        # The route rule, not the raw path, so session ids do not explode label sets and span names
+        g.endpoint_rule = request.url_rule.rule if request.url_rule else "unmatched"
+        g.request_span = open_span(
+            f"{request.method} {g.endpoint_rule}",
+            parent=parse_traceparent(request.headers.get("traceparent")),
+            kind="server",
+            attributes={"http.method": request.method, "http.route": g.endpoint_rule},
+        )
+        if should_profile(request.headers.get("X-Profile")):
+            g.profile_name = profile_name(g.endpoint_rule, g.request_id)
+            g.profiler = RequestProfiler(threading.get_ident()).start()
+
+    @flask_app.after_request
+    def record_request_duration(response):
+        started = g.get("request_started")
+        if started is not None:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, g.endpoint_rule, request.method,
+                                         response.status_code)
+            response.headers["X-Request-ID"] = g.request_id
+        span = g.get("request_span")
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+            response.headers["traceparent"] = span.traceparent
+        if g.get("profiler") is not None:
+            response.headers["X-Profile-Id"] = g.profile_name
+        return response
+
+    @flask_app.teardown_request
+    def end_request_span(error=None):
+        close_span(g.pop("request_span", None), error)
+        token = g.pop("request_id_token", None)
+        if token is not None:
+            unbind_request_id(token)
+        if "endpoint_rule" in g:
+            request_finished(g.endpoint_rule, g.pop("request_memory", None))
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
+            write_profile(profiler, g.profile_name)
+
+    # -- Process threads (span writer, memory snapshots, warm-up; /ready is 503 until
+    # -- warm-up is done) and maintenance (history partitions and archival, session purge). Under
+    # -- gunicorn they start after the fork instead (worker_lifecycle.py).
+    if not FORKING_SERVER:
+        start_process_resources()
+        start_maintenance_workers()
+
     return flask_app
 
 
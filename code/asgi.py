@@ -0,0 +1,150 @@
+"""
+ASGI entry point: async ``POST /chat`` and ``GET /history``, everything else
+served by the Flask app.
+
+    cd code && uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+The WSGI ``/chat`` holds a request thread for the whole LLM call, so
+concurrency is capped by the thread count.  Here the two endpoints run on the
+event loop: origins are matched in memory (``domains/matcher.py``), prompt
+lookups and history reads/writes use the async pools (``async_db.py``,
+connections held per step, never across the LLM call)
+and the LLM is called with ``ainvoke``, so one process can hold thousands of
+concurrent LLM waits.  Lead extraction still runs on the background executor.
+``/ws/chat`` is the same chat over a WebSocket, with streamed replies
+(``chat_socket.py``).
+
+Other routes (dashboard, prompts, domains, health, /ready, /metrics, admin)
+go to the Flask app through a WSGI adapter, with its own thread pool.
+Responses, CORS and request metrics/IDs/traces match the Flask endpoints.
+"""
+import time
+import traceback
+from contextlib import asynccontextmanager
+from functools import partial
+from http import HTTPStatus
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+
+import worker_lifecycle
+from api.models import APIResponse, RequestView
+from api.validators import chat_api_validate, validate_history_data
+from app import app as flask_app
+from async_db import close_async_pools, open_async_pools
+from chat_socket import chat_socket
+from history import aget_history
+from idempotency import arun_once, request_fingerprint
+from llm_api import aget_groq_response
+from metrics import HTTP_REQUEST_SECONDS, observe_stage
+from tracing import bind_request_id, close_span, open_span, parse_traceparent, request_id_from, unbind_request_id
+
+# Same policy as CORS(flask_app): any origin
+_CORS = [Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                    expose_headers=["Idempotent-Replayed"])]
+
+
+def _instrumented(rule: str):
+    """Request duration, X-Request-ID and a server span, like the Flask app's request hooks."""
+    def decorator(endpoint):
+        async def wrapper(request):
+            started = time.perf_counter()
+            request_id = request_id_from(request.headers.get("X-Request-ID"))
+            token = bind_request_id(request_id)
+            span = open_span(f"{request.method} {rule}", parent=parse_traceparent(request.headers.get("traceparent")),
+                             kind="server", attributes={"http.method": request.method, "http.route": rule})
+            try:
+                response = await endpoint(request)
+            except BaseException as e:
+                close_span(span, e)
+                unbind_request_id(token)
+                raise
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, rule, request.method, response.status_code)
+            response.headers["X-Request-ID"] = request_id
+            if span is not None:
+                span.set_attribute("http.status_code", response.status_code)
+                response.headers["traceparent"] = span.traceparent
+            close_span(span)
+            unbind_request_id(token)
+            return response
+        return wrapper
+    return decorator
+
+
+def _json_response(api_response: APIResponse, http_status) -> JSONResponse:
+    body, http_status = api_response.payload(http_status)
+    return JSONResponse(body, status_code=http_status)
+
+
+@_instrumented("/chat")
+async def chat(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    with observe_stage("validation"):
+        chat_validation_response = chat_api_validate(RequestView(request, data))
+    if not chat_validation_response.is_valid:
+        return _json_response(APIResponse(chat_validation_response), HTTPStatus.BAD_REQUEST)
+
+    input = data.get('input', '').strip()
+    session_id = chat_validation_response.data["session_id"]
+    request_type = chat_validation_response.data["request_type"]
+    domain = chat_validation_response.data["domain"]
+    acompute = partial(_chat_reply, input, session_id, request_type, domain)
+
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is None:
+        body, status = await acompute()
+        return JSONResponse(body, status_code=status)
+    body, status, replayed = await arun_once(session_id, idempotency_key.strip(),
+                                             request_fingerprint(input, request_type), acompute)
+    return JSONResponse(body, status_code=status, headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+
+async def _chat_reply(input, session_id, request_type, domain):
+    try:
+        bot_response = await aget_groq_response(input, session_id, request_type, domain)
+        return APIResponse(None, {'response': bot_response}).payload(HTTPStatus.OK)
+    except Exception as e:
+        print(f"Error during LLM call: {e}")
+        print(traceback.format_exc())
+        return APIResponse().payload(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+@_instrumented("/history")
+async def history(request):
+    history_validation_response = validate_history_data(RequestView(request))
+    if not history_validation_response.is_valid:
+        return _json_response(APIResponse(history_validation_response), HTTPStatus.BAD_REQUEST)
+    history_data, status = await aget_history(request.query_params.get("session_id"),
+                                              history_validation_response.data["domain"],
+                                              history_validation_response.data["request_type"])
+    return JSONResponse(history_data, status_code=status)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await open_async_pools()
+    yield
+    await close_async_pools()
+    worker_lifecycle.worker_exit()
+
+
+def create_asgi_app(wsgi_app=flask_app) -> Starlette:
+    return Starlette(
+        routes=[
+            Route("/chat", chat, methods=["POST", "OPTIONS"], middleware=_CORS),
+            Route("/history", history, methods=["GET", "OPTIONS"], middleware=_CORS),
+            WebSocketRoute("/ws/chat", chat_socket),
+            Mount("/", app=WSGIMiddleware(wsgi_app)),
+        ],
+        lifespan=lifespan,
+    )
+
+
+app = create_asgi_app()
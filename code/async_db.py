@@ -0,0 +1,79 @@
+"""
+Async connection pools for the ASGI chat path (``asgi.py``).
+
+One ``psycopg_pool.AsyncConnectionPool`` per shard: the primary shard's pool
+also serves the directory lookups (domains, prompts).  Pools are opened by the
+ASGI app's lifespan (``open_async_pools``) or on first use, and closed on
+shutdown.  Connections are held only for the statements of one step, never
+across an LLM call, so a small pool serves many concurrent chats.
+
+The sync code paths keep ``db.sync_connection`` and the shard router's pools.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from psycopg_pool import AsyncConnectionPool
+
+from config import ASYNC_DB_POOL_SIZE, DATABASE_URL, PRIMARY_SHARD, SHARD_DATABASE_URLS
+from metrics import DB_POOL_CONNECTIONS, DB_POOL_WAIT_SECONDS, pool_stats_callback
+from query_stats import AsyncInstrumentedCursor
+
+_pools = {}
+
+
+def _shard_url(shard) -> str:
+    if shard == PRIMARY_SHARD:
+        return DATABASE_URL
+    if shard not in SHARD_DATABASE_URLS:
+        from sharding import UnknownShardError
+        raise UnknownShardError(f"Shard '{shard}' is not configured.")
+    return SHARD_DATABASE_URLS[shard]
+
+
+async def _get_pool(shard) -> AsyncConnectionPool:
+    pool = _pools.get(shard)
+    if pool is None:
+        # Shard schemas are migrated by the sync router when it first connects
+        pool = _pools[shard] = AsyncConnectionPool(
+            _shard_url(shard), min_size=1, max_size=ASYNC_DB_POOL_SIZE, open=False,
+            name=f"async-{shard}", kwargs={"cursor_factory": AsyncInstrumentedCursor},
+        )
+    if pool.closed:
+        # Concurrent first requests all await this; opening an open pool is a no-op
+        await pool.open()
+    return pool
+
+
+def pool_stats() -> dict:
+    """Gauge callback: max/size/idle/waiting connections of every async pool."""
+    values = {}
+    for pool in list(_pools.values()):
+        values.update(pool_stats_callback(pool.name, lambda pool=pool: pool)())
+    return values
+
+
+DB_POOL_CONNECTIONS.add_callback(pool_stats)
+
+
+@asynccontextmanager
+async def async_shard_connection(shard=PRIMARY_SHARD):
+    """Async connection to *shard* from its pool; committed or rolled back on exit."""
+    pool = await _get_pool(shard)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    async with pool.connection() as conn:
+        DB_POOL_WAIT_SECONDS.observe(loop.time() - started, pool.name)
+        yield conn
+
+
+async def open_async_pools(shards=None):
+    """Open the pools of *shards* (default: all configured) ahead of the first request."""
+    for shard in shards or [PRIMARY_SHARD, *SHARD_DATABASE_URLS]:
+        await _get_pool(shard)
+
+
+async def close_async_pools():
+    pools = list(_pools.values())
+    _pools.clear()
+    for pool in pools:
+        await pool.close()
@@ -0,0 +1,253 @@
+"""
+Synthetic data generator: production-sized volumes of domains, leads and history.
+
+Seeds the database at DATABASE_URL with COPY:
+
+* ``domains``: ``--domains`` hostnames under ``*.synthetic.test``.  About a
+  fifth are roots under the default COMMON domain (id 1); every other domain
+  hangs off an earlier one, giving parent chains up to ``--max-depth`` deep.
+* ``chat_info``: ``--leads`` leads spread over the synthetic domains, with
+  names, emails, statuses and creation times over the last ``--days`` days
+  (about 5% inactive).  Marked with ``metadata.synthetic``.
+* ``chat_table``: ``--messages`` messages of alternating human/AI turns spread
+  unevenly over the leads' sessions.  When the table is partitioned, the
+  monthly partitions covering ``--days`` are created first.
+
+Each run adds to what is already there, so repeated runs grow the data set;
+``--delete`` removes every synthetic row again.  Shards configured with
+DATABASE_SHARDS are not seeded: all data goes to the primary.
+
+Usage (from the ``code`` directory)
+-----
+    python -m benchmarks.datagen --messages 2000000 --leads 300000 --domains 5000
+    python -m benchmarks.datagen --delete
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import psycopg
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+
+from config import DATABASE_URL, table_name
+from domains import DomainService
+from history_retention import ensure_partitions, table_kind
+
+SYNTHETIC_SUFFIX = "synthetic.test"
+ROOT_PARENT_ID = 1
+ROOT_SHARE = 0.2
+INACTIVE_SHARE = 0.05
+
+_FIRST_NAMES = ("Asha", "Ben", "Carla", "Dev", "Elif", "Farid", "Grace", "Hiro", "Ines", "Jonas", "Kofi", "Lena")
+_LAST_NAMES = ("Shah", "Okafor", "Muller", "Rossi", "Tanaka", "Silva", "Kim", "Novak", "Haddad", "Berg")
+_COUNTRIES = ("India", "Nigeria", "Germany", "Italy", "Japan", "Brazil", "Korea", "Czechia", "Lebanon", "Norway")
+_STATUSES = ("OPEN", "OPEN", "OPEN", "CONTACTED", "QUALIFIED", "CLOSED")
+_SUBDOMAINS = ("www2", "shop", "blog", "help", "app", "eu", "us", "store", "docs", "m")
+_QUESTIONS = ("What does the premium plan include?", "Do you ship to my country?",
+              "Can I get a demo next week?", "How much is the annual subscription?",
+              "Is there a discount for students?", "Can someone call me back?")
+_ANSWERS = ("The premium plan includes priority support and unlimited seats.",
+            "Yes, we ship worldwide within five business days.",
+            "Of course, could you share your email so we can schedule it?",
+            "The annual subscription is billed once and saves two months.",
+            "We offer 30% off with a valid student ID.",
+            "Sure, please share your phone number and a good time to call.")
+
+
+# ---------------------------------------------------------------------------
+# Generators
+# ---------------------------------------------------------------------------
+
+def generate_domains(conn, count: int, max_depth: int = 5, rng: random.Random = None) -> list[tuple]:
+    """Insert *count* synthetic domains; returns their (id, key, address) rows."""
+    rng = rng or random.Random()
+    if count <= 0:
+        return []
+    with conn.cursor() as cur:
+        cur.execute("SELECT nextval(pg_get_serial_sequence('domains', 'id')) FROM generate_series(1, %s);", (count,))
+        ids = [row[0] for row in cur.fetchall()]
+        existing = synthetic_domains(conn)
+        # (id, address, depth) of every domain a new one may hang off
+        parents = [(domain_id, address, address.count(".") - SYNTHETIC_SUFFIX.count(".") - 1)
+                   for domain_id, _, address in existing]
+        created = []
+        with cur.copy("COPY domains (id, key, address, parent, created_at) FROM STDIN") as copy:
+            now = datetime.now(timezone.utc)
+            for domain_id in ids:
+                candidates = [parent for parent in parents[-1000:] if parent[2] < max_depth - 1]
+                if not candidates or rng.random() < ROOT_SHARE:
+                    parent_id, address, depth = ROOT_PARENT_ID, f"site-{domain_id}.{SYNTHETIC_SUFFIX}", 0
+                else:
+                    parent_id, parent_address, parent_depth = rng.choice(candidates)
+                    address, depth = f"{rng.choice(_SUBDOMAINS)}{domain_id}.{parent_address}", parent_depth + 1
+                key = DomainService.generate_key(address)
+                copy.write_row((domain_id, key, address, parent_id, now))
+                parents.append((domain_id, address, depth))
+                created.append((domain_id, key, address))
+    conn.commit()
+    return created
+
+
+def generate_leads(conn, count: int, domain_keys: list[str], days: int = 90,
+                   rng: random.Random = None) -> list[tuple]:
+    """Insert *count* synthetic leads; returns their (session_id, domain_key, created_at) rows."""
+    rng = rng or random.Random()
+    now = datetime.now(timezone.utc)
+    leads = []
+    with conn.cursor() as cur, cur.copy(
+            "COPY chat_info (session_id, contact_name, email, mobile, country, request_type, status, "
+            "remarks, domain, created_at, metadata, is_active, deactivated_at) FROM STDIN") as copy:
+        for index in range(count):
+            session_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            first, last = rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES)
+            domain_key = rng.choice(domain_keys)
+            created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            is_active = rng.random() >= INACTIVE_SHARE
+            copy.write_row((
+                session_id, f"{first} {last}", f"{first}.{last}{index}@example.org".lower(),
+                f"+{rng.randint(10, 99)}{rng.randint(10 ** 8, 10 ** 9 - 1)}", rng.choice(_COUNTRIES),
+                "sales", rng.choice(_STATUSES), "", domain_key, created_at,
+                '{"synthetic": true}', is_active, None if is_active else created_at,
+            ))
+            leads.append((session_id, domain_key, created_at))
+    conn.commit()
+    return leads
+
+
+def generate_messages(conn, count: int, leads: list[tuple], rng: random.Random = None) -> int:
+    """
+    Insert about *count* history messages over the sessions of *leads*.
+    Sessions get between 1 and twice the mean number of messages; returns the number inserted.
+    """
+    rng = rng or random.Random()
+    if count <= 0 or not leads:
+        return 0
+    human = [json.dumps(message_to_dict(HumanMessage(content=text))) for text in _QUESTIONS]
+    ai = [json.dumps(message_to_dict(AIMessage(content=text))) for text in _ANSWERS]
+    mean = max(1, count // len(leads))
+    inserted = 0
+    with conn.cursor() as cur, cur.copy(f"COPY {table_name} (session_id, message, created_at) FROM STDIN") as copy:
+        for session_id, _, created_at in leads:
+            if inserted >= count:
+                break
+            turns = min(rng.randint(1, 2 * mean - 1) if mean > 1 else 1, count - inserted)
+            for index in range(turns):
+                message = rng.choice(ai if index % 2 else human)
+                copy.write_row((session_id, message, created_at + timedelta(seconds=20 * index)))
+            inserted += turns
+    conn.commit()
+    return inserted
+
+
+def generate(database_url: str = DATABASE_URL, messages: int = 0, leads: int = 0, domains: int = 0,
+             max_depth: int = 5, days: int = 90, seed: int = None) -> dict:
+    """Add the given numbers of synthetic rows and ANALYZE the tables; returns what was inserted."""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    with psycopg.connect(database_url) as conn:
+        if messages and table_kind(conn, table_name) == "p":
+            ensure_partitions(conn, table_name, months_ahead=days // 28 + 1,
+                              now=datetime.now(timezone.utc) - timedelta(days=days))
+        created_domains = generate_domains(conn, domains, max_depth, rng)
+        domain_keys = [key for _, key, _ in synthetic_domains(conn)] or ["COMMON"]
+        created_leads = generate_leads(conn, leads, domain_keys, days, rng)
+        inserted_messages = generate_messages(conn, messages, created_leads, rng)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for table in ("domains", "chat_info", table_name):
+                cur.execute(f"ANALYZE {table};")
+    summary = {"domains": len(created_domains), "leads": len(created_leads), "messages": inserted_messages,
+               "seconds": round(time.perf_counter() - started, 2)}
+    print(f"[DATAGEN] Inserted {summary['domains']} domains, {summary['leads']} leads, "
+          f"{summary['messages']} messages in {summary['seconds']}s")
+    return summary
+
+
+# ---------------------------------------------------------------------------
+# Inspection and cleanup
+# ---------------------------------------------------------------------------
+
+def synthetic_domains(conn) -> list[tuple]:
+    """(id, key, address) of every synthetic domain, oldest first."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, key, address FROM domains WHERE address LIKE %s ORDER BY id;",
+                    (f"%.{SYNTHETIC_SUFFIX}",))
+        return cur.fetchall()
+
+
+def synthetic_counts(database_url: str = DATABASE_URL) -> dict:
+    with psycopg.connect(database_url) as conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM domains WHERE address LIKE %s;", (f"%.{SYNTHETIC_SUFFIX}",))
+        domains = cur.fetchone()[0]
+        cur.execute("SELECT count(*) FROM chat_info WHERE metadata ? 'synthetic';")
+        leads = cur.fetchone()[0]
+        cur.execute(f"""
+            SELECT count(*) FROM {table_name} m
+            JOIN chat_info c ON c.session_id = m.session_id::text
+            WHERE c.metadata ? 'synthetic';
+        """)
+        messages = cur.fetchone()[0]
+    return {"domains": domains, "leads": leads, "messages": messages}
+
+
+def sample_sessions(database_url: str, count: int, seed: int = 0) -> list[tuple]:
+    """(session_id, domain address) of *count* random active synthetic leads that have history."""
+    with psycopg.connect(database_url) as conn, conn.cursor() as cur:
+        cur.execute("SELECT setseed(%s);", (rng_seed(seed),))
+        cur.execute(f"""
+            SELECT c.session_id, d.address
+            FROM chat_info c
+            JOIN domains d ON d.key = c.domain
+            WHERE c.metadata ? 'synthetic' AND c.is_active
+              AND EXISTS (SELECT 1 FROM {table_name} m WHERE m.session_id = c.session_id::uuid)
+            ORDER BY random()
+            LIMIT %s;
+        """, (count,))
+        return cur.fetchall()
+
+
+def rng_seed(seed: int) -> float:
+    """Map any integer seed to Postgres' setseed() range [-1, 1]."""
+    return (seed % 2001 - 1000) / 1000
+
+
+def delete_synthetic_data(database_url: str = DATABASE_URL) -> dict:
+    """Delete every synthetic message, lead and domain; returns the number of rows deleted per table."""
+    with psycopg.connect(database_url) as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            DELETE FROM {table_name} m USING chat_info c
+            WHERE c.session_id = m.session_id::text AND c.metadata ? 'synthetic';
+        """)
+        messages = cur.rowcount
+        cur.execute("DELETE FROM chat_info WHERE metadata ? 'synthetic';")
+        leads = cur.rowcount
+        cur.execute("DELETE FROM domains WHERE address LIKE %s;", (f"%.{SYNTHETIC_SUFFIX}",))
+        domains = cur.rowcount
+    print(f"[DATAGEN] Deleted {domains} domains, {leads} leads, {messages} messages")
+    return {"domains": domains, "leads": leads, "messages": messages}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=0, help="history messages to add")
+    parser.add_argument("--leads", type=int, default=0, help="chat_info leads to add")
+    parser.add_argument("--domains", type=int, default=0, help="domains to add")
+    parser.add_argument("--max-depth", type=int, default=5, help="longest parent chain below the COMMON root")
+    parser.add_argument("--days", type=int, default=90, help="spread creation times over this many days")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--delete", action="store_true", help="delete all synthetic data instead")
+    args = parser.parse_args(argv)
+
+    if args.delete:
+        return delete_synthetic_data(DATABASE_URL)
+    if args.messages and not args.leads:
+        parser.error("--messages needs --leads: messages are spread over the new leads' sessions")
+    generate(DATABASE_URL, args.messages, args.leads, args.domains, args.max_depth, args.days, args.seed)
+    print(f"[DATAGEN] Synthetic rows now: {synthetic_counts(DATABASE_URL)}")
+
+
+if __name__ == "__main__":
+    main()
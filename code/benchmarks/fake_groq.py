@@ -0,0 +1,157 @@
+"""
+OpenAI/Groq-compatible LLM stand-in for benchmarks.
+
+Serves ``POST /openai/v1/chat/completions`` (the path the Groq client calls
+under ``GROQ_API_BASE``) with a configurable time to first token and token
+rate, so load tests measure the app rather than a remote provider.  Requests
+with ``"stream": true`` get server-sent event chunks at the token cadence.
+
+Extraction prompts get canned JSON: the name prompt (it mentions
+``name_detected``) a detected name, any other prompt asking for JSON a contact
+record; everything else a chat reply of ``reply_tokens`` words.
+
+Usage
+-----
+    python -m benchmarks.fake_groq --port 8099 --latency-ms 300 --tokens-per-second 200
+    GROQ_API_BASE=http://127.0.0.1:8099 flask --app app run
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTACT_JSON = {"contact_name": "Bench User", "email": "bench@example.com", "mobile": "", "country": "India"}
+NAME_JSON = {"name_detected": True, "contact_name": "Bench User", "confidence": "high"}
+_WORDS = ("sure", "we", "can", "help", "with", "that", "and", "our", "team", "will", "follow", "up")
+
+
+class FakeGroqServer:
+    """Threaded HTTP server answering chat completions after a simulated delay."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=300.0, tokens_per_second=200.0, reply_tokens=60):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.calls = {"chat": 0, "extraction": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-groq", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = {"chat": 0, "extraction": 0}
+
+    def count(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+
+    def reply_for(self, messages) -> tuple[str, str]:
+        """Return (kind, content) for a chat completion request."""
+        prompt = " ".join(str(message.get("content", "")) for message in messages)
+        if "name_detected" in prompt:
+            return "extraction", json.dumps(NAME_JSON)
+        if "JSON" in prompt:
+            return "extraction", json.dumps(CONTACT_JSON)
+        words = [_WORDS[index % len(_WORDS)] for index in range(self.reply_tokens)]
+        return "chat", " ".join(words).capitalize() + "."
+
+
+def _handler_for(fake: FakeGroqServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            messages = body.get("messages") or []
+            kind, content = fake.reply_for(messages)
+            fake.count(kind)
+
+            tokens = content.split(" ")
+            prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in messages)
+            token_delay = 1 / fake.tokens_per_second if fake.tokens_per_second > 0 else 0
+            time.sleep(fake.latency_ms / 1000)
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = body.get("model", "fake-model")
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                     "total_tokens": prompt_tokens + len(tokens)}
+
+            if body.get("stream"):
+                self._stream(completion_id, model, tokens, token_delay, usage)
+                return
+            time.sleep(token_delay * len(tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        def _stream(self, completion_id, model, tokens, token_delay, usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for index, token in enumerate(tokens):
+                time.sleep(token_delay)
+                delta = {"role": "assistant", "content": token if index == 0 else f" {token}"}
+                self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                         "x_groq": {"usage": usage}})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _event(self, payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    args = parser.parse_args()
+    server = FakeGroqServer(args.host, args.port, args.latency_ms, args.tokens_per_second, args.reply_tokens)
+    print(f"[FAKE_GROQ] Listening on {server.url}")
+    server._server.serve_forever()
@@ -0,0 +1,100 @@
+"""
+Import-time benchmark for the app entry point.
+
+Imports a module (``app`` by default) in a fresh interpreter with
+``python -X importtime`` and reports the total and the slowest imports.  Two
+checks make the run exit with status 1, and are enforced by the test suite:
+
+* the best of ``--runs`` totals is over ``--budget-ms`` (IMPORT_TIME_BUDGET_MS);
+* a module in DEFERRED_MODULES was imported: those are only loaded on first
+  use (first chat request, first history read), never at start-up.
+
+The total includes module-level work such as connecting to the database, so
+run it against the usual local Postgres.
+
+Usage (from the ``code`` directory)
+-----
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --module llm_api --top 40
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME_BUDGET_MS = 1000
+# Imported on first use only; any of these (or their submodules) at start-up is a regression
+DEFERRED_MODULES = (
+    "langchain_postgres",
+    "langchain_groq",
+    "langchain_core.language_models",
+    "langchain_core.runnables",
+    "langchain_core.prompts",
+    "local_llm",
+    "google.cloud",
+)
+
+
+def parse_importtime(stderr: str) -> dict:
+    """``{module: (self_us, cumulative_us, depth)}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def measure_import(module: str = "app", runs: int = 3) -> dict:
+    """Import *module* in *runs* fresh interpreters; returns the fastest run's total and per-module times."""
+    best = None
+    for _ in range(runs):
+        # Warm-up would import the deferred modules in the background while we measure
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=CODE_DIR, capture_output=True, text=True,
+                                env={**os.environ, "WARMUP_ENABLED": "False"})
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+        modules = parse_importtime(result.stderr)
+        total_ms = sum(cumulative for _, cumulative, depth in modules.values() if depth == 0) / 1000
+        if best is None or total_ms < best["total_ms"]:
+            best = {"module": module, "total_ms": round(total_ms, 1), "modules": modules}
+    return best
+
+
+def deferred_modules_imported(modules: dict) -> list[str]:
+    return sorted(name for name in modules
+                  if any(name == deferred or name.startswith(deferred + ".") for deferred in DEFERRED_MODULES))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters; the fastest counts")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=25, help="slowest imports to list")
+    args = parser.parse_args(argv)
+
+    result = measure_import(args.module, args.runs)
+    slowest = sorted(result["modules"].items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for name, (self_us, cumulative_us, depth) in slowest:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {'  ' * depth}{name}")
+    print(f"\n[IMPORT_TIME] import {args.module}: {result['total_ms']} ms (budget {args.budget_ms:g} ms)")
+
+    failed = False
+    if result["total_ms"] > args.budget_ms:
+        print(f"[IMPORT_TIME] Over budget by {result['total_ms'] - args.budget_ms:.1f} ms")
+        failed = True
+    deferred = deferred_modules_imported(result["modules"])
+    if deferred:
+        print(f"[IMPORT_TIME] Imported at start-up but should be deferred: {', '.join(deferred)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
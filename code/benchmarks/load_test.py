@@ -0,0 +1,329 @@
+"""
+Load-test benchmark: throughput and latency of /history and /chat.
+
+Starts a fake Groq server (``benchmarks.fake_groq``) or uses the app's local
+LLM backend (``--llm local``), seeds sessions with history into the database
+at DATABASE_URL and starts the app as a subprocess, then drives each traffic
+mix at each concurrency level for a fixed duration.  For every (mix,
+concurrency) it reports RPS, latency p50/p95/p99 per endpoint, errors, DB
+statements per request (from ``/admin/query-stats``) and LLM calls per request
+(from ``/metrics``).  Results are written as JSON; ``--compare`` prints the
+change against an earlier result file.
+
+Usage (from the ``code`` directory)
+-----
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --mixes history,mixed --levels 1,8,32 --duration 30
+    python -m benchmarks.load_test --llm local --llm-latency-ms 800 --compare benchmarks/results/load_20261019T101500Z.json
+    python -m benchmarks.load_test --app-command "gunicorn -b 127.0.0.1:{port} app:app"
+"""
+import argparse
+import json
+import os
+import random
+import re
+import secrets
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import psycopg
+import requests
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+
+from benchmarks.fake_groq import FakeGroqServer
+from config import DATABASE_URL, table_name
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(CODE_DIR, "benchmarks", "results")
+ORIGIN = "https://example.com"
+
+MIXES = {
+    "history": {"history": 1.0},
+    "chat": {"chat": 1.0},
+    "mixed": {"history": 0.8, "chat": 0.2},
+}
+
+DEFAULT_APP_COMMAND = f"{shlex.quote(sys.executable)} -m flask --app app run --port {{port}} --no-reload --no-debugger --with-threads"
+
+
+# ---------------------------------------------------------------------------
+# Setup
+# ---------------------------------------------------------------------------
+
+def seed_sessions(database_url: str, sessions: int, messages_per_session: int) -> list[str]:
+    """Insert *sessions* sessions of alternating human/AI messages and return their ids."""
+    session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    with psycopg.connect(database_url) as conn, conn.cursor() as cur:
+        with cur.copy(f"COPY {table_name} (session_id, message) FROM STDIN") as copy:
+            for session_id in session_ids:
+                for index in range(messages_per_session):
+                    message = (HumanMessage(content=f"Question {index} about your services?") if index % 2
+                               else AIMessage(content=f"Answer {index}: we can certainly help with that."))
+                    copy.write_row((session_id, json.dumps(message_to_dict(message))))
+        with cur.copy("COPY chat_info (session_id, request_type, domain) FROM STDIN") as copy:
+            for session_id in session_ids:
+                copy.write_row((session_id, "sales", "COMMON"))
+    return session_ids
+
+
+def delete_sessions(database_url: str, session_ids: list[str]):
+    with psycopg.connect(database_url) as conn, conn.cursor() as cur:
+        cur.execute(f"DELETE FROM {table_name} WHERE session_id = ANY(%s::uuid[]);", (session_ids,))
+        cur.execute("DELETE FROM chat_info WHERE session_id = ANY(%s);", (session_ids,))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(command: str, port: int, env: dict, timeout_seconds: float = 60):
+    """Start the app with *command* and wait until /ready answers (warm-up done)."""
+    process = subprocess.Popen(shlex.split(command.format(port=port)), cwd=CODE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode} before becoming ready")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"App did not become ready within {timeout_seconds}s")
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+def percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[int(index)]
+
+
+def _latency_summary(latencies):
+    return {
+        "requests": len(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def run_level(base_url, mix, concurrency, duration, session_ids, seed=0):
+    """Drive *mix* with *concurrency* workers for *duration* seconds; return per-request samples."""
+    kinds, weights = zip(*mix.items())
+    samples = []
+    samples_lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        local = []
+        with requests.Session() as http:
+            http.headers["Origin"] = ORIGIN
+            while time.monotonic() < deadline:
+                kind = rng.choices(kinds, weights)[0]
+                session_id = rng.choice(session_ids)
+                started = time.perf_counter()
+                try:
+                    if kind == "history":
+                        response = http.get(f"{base_url}/history", params={"session_id": session_id}, timeout=60)
+                    else:
+                        response = http.post(f"{base_url}/chat", timeout=120, json={
+                            "input": "Can you tell me more about your pricing?",
+                            "session_id": session_id,
+                            "request_type": "sales",
+                        })
+                    ok = response.status_code < 400
+                except requests.RequestException:
+                    ok = False
+                local.append((kind, time.perf_counter() - started, ok))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def llm_calls(base_url) -> dict:
+    """LLM calls so far by kind ("chat", "extraction"), from the app's /metrics."""
+    body = requests.get(f"{base_url}/metrics", timeout=10).text
+    return {call: int(float(count))
+            for call, count in re.findall(r'^llm_call_duration_seconds_count\{call="(\w+)"\} (\S+)$', body, re.MULTILINE)}
+
+
+def measure(base_url, admin_headers, mix_name, concurrency, duration, session_ids, seed):
+    requests.delete(f"{base_url}/admin/query-stats", headers=admin_headers, timeout=10)
+    llm_before = llm_calls(base_url)
+
+    samples, elapsed = run_level(base_url, MIXES[mix_name], concurrency, duration, session_ids, seed)
+    llm_after = llm_calls(base_url)
+    calls = {call: count - llm_before.get(call, 0) for call, count in llm_after.items()}
+
+    stats = requests.get(f"{base_url}/admin/query-stats", params={"limit": 100000},
+                         headers=admin_headers, timeout=10).json()
+    statements = sum(row["count"] for row in stats.get("queries", []))
+    total = len(samples)
+    result = {
+        "mix": mix_name,
+        "concurrency": concurrency,
+        "duration_seconds": round(elapsed, 2),
+        "requests": total,
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "rps": round(total / elapsed, 2) if elapsed else None,
+        "latency": _latency_summary([latency for _, latency, _ in samples]),
+        "endpoints": {
+            kind: _latency_summary([latency for sample_kind, latency, _ in samples if sample_kind == kind])
+            for kind in MIXES[mix_name]
+        },
+        "db_queries_per_request": round(statements / total, 2) if total else None,
+        "llm_calls_per_request": round(sum(calls.values()) / total, 2) if total else None,
+        "llm_calls": calls,
+    }
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=CODE_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'mix':<8} {'conc':>4} {'rps':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'err':>5} {'db/req':>7} {'llm/req':>7}")
+    for row in results:
+        latency = row["latency"]
+        print(f"{row['mix']:<8} {row['concurrency']:>4} {row['rps'] or 0:>8.1f} {latency['p50_ms'] or 0:>8.1f} "
+              f"{latency['p95_ms'] or 0:>8.1f} {latency['p99_ms'] or 0:>8.1f} {row['errors']:>5} "
+              f"{row['db_queries_per_request'] or 0:>7.1f} {row['llm_calls_per_request'] or 0:>7.2f}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(row["mix"], row["concurrency"]): row for row in json.load(f)["results"]}
+    print(f"\nChange against {baseline_path}:")
+    for row in results:
+        before = baseline.get((row["mix"], row["concurrency"]))
+        if not before:
+            continue
+        print(f"{row['mix']:<8} {row['concurrency']:>4}  rps {_change(before['rps'], row['rps'])}  "
+              f"p95 {_change(before['latency']['p95_ms'], row['latency']['p95_ms'])}")
+
+
+def _change(before, after):
+    if not before or after is None:
+        return "n/a"
+    return f"{before:.1f} -> {after:.1f} ({(after - before) / before * 100:+.1f}%)"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mixes", default="history,chat,mixed", help=f"comma-separated, from {sorted(MIXES)}")
+    parser.add_argument("--levels", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per (mix, level)")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of unrecorded load before each mix")
+    parser.add_argument("--sessions", type=int, default=200, help="seeded sessions")
+    parser.add_argument("--messages", type=int, default=20, help="seeded messages per session")
+    parser.add_argument("--llm", choices=("fake-groq", "local"), default="fake-groq",
+                        help="fake Groq HTTP server, or the app's in-process local LLM backend")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200)
+    parser.add_argument("--app-command", default=DEFAULT_APP_COMMAND, help="command starting the app; {port} is substituted")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default benchmarks/results/load_<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--keep-data", action="store_true", help="do not delete the seeded sessions afterwards")
+    args = parser.parse_args(argv)
+
+    mixes = [name.strip() for name in args.mixes.split(",") if name.strip()]
+    unknown = [name for name in mixes if name not in MIXES]
+    if unknown:
+        parser.error(f"unknown mixes: {unknown}")
+    levels = [int(level) for level in args.levels.split(",")]
+
+    admin_token = secrets.token_hex(16)
+    # DATABASE_URL in the environment is the base URL; config appends the database name
+    env = {**os.environ, "ADMIN_API_TOKEN": admin_token, "DEBUG": "False"}
+    fake = None
+    if args.llm == "local":
+        env.update({"LLM_BACKEND": "local", "LOCAL_LLM_LATENCY_MS": str(args.llm_latency_ms),
+                    "LOCAL_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second)})
+    else:
+        fake = FakeGroqServer(latency_ms=args.llm_latency_ms, tokens_per_second=args.llm_tokens_per_second).start()
+        env.update({"LLM_BACKEND": "groq", "GROQ_API_BASE": fake.url,
+                    "GROQ_API_KEY": os.getenv("GROQ_API_KEY") or "benchmark"})
+    session_ids = seed_sessions(DATABASE_URL, args.sessions, args.messages)
+    port = free_port()
+    app = None
+    results = []
+    try:
+        app = start_app(args.app_command, port, env)
+        base_url = f"http://127.0.0.1:{port}"
+        admin_headers = {"X-Admin-Token": admin_token}
+        for mix_name in mixes:
+            if args.warmup > 0:
+                run_level(base_url, MIXES[mix_name], max(levels), args.warmup, session_ids, args.seed)
+            for concurrency in levels:
+                print(f"[BENCHMARK] {mix_name} x{concurrency} for {args.duration}s")
+                results.append(measure(base_url, admin_headers, mix_name, concurrency,
+                                       args.duration, session_ids, args.seed))
+    finally:
+        if app is not None:
+            app.terminate()
+            app.wait(timeout=30)
+        if fake is not None:
+            fake.stop()
+        if not args.keep_data:
+            delete_sessions(DATABASE_URL, session_ids)
+
+    report = {
+        "benchmark": "load",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print_results(results)
+    print(f"\n[BENCHMARK] Results written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Micro-benchmarks of pure-Python hot-path functions, checked against baselines.
+
+Each benchmark is timed with ``timeit`` (call count picked by ``autorange``,
+best of ``--repeat`` runs) and compared with ``benchmarks/baselines/micro.json``.
+A benchmark slower than its baseline by more than ``--threshold`` (default
+25%) is a regression and makes the run exit with status 1.
+
+Database access is replaced by stub connections, so the numbers cover the
+Python code only.  Baselines are machine-specific: refresh them with
+``--update-baseline`` on the machine that runs the check.
+
+Usage (from the ``code`` directory)
+-----
+    python -m benchmarks.micro                     # compare with the baselines
+    python -m benchmarks.micro --update-baseline   # record new baselines
+    python -m benchmarks.micro -k message_mapping  # only matching benchmarks
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import sys
+import timeit
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http import HTTPStatus
+
+from flask import Flask
+from langchain_core.messages import AIMessage, HumanMessage
+
+import history
+import system_prompt
+from api import validators
+from api.models import APIResponse, ValidationResponse
+from domains import DomainService, OriginMatcher
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "micro.json")
+DEFAULT_THRESHOLD = 0.25
+
+_benchmarks = {}
+
+
+def benchmark(name: str):
+    """
+    Register a benchmark. The decorated generator sets up its fixtures, yields
+    the zero-argument callable to time, and tears down after the yield.
+    """
+    def decorator(factory):
+        if not inspect.isgeneratorfunction(factory):
+            raise TypeError(f"Benchmark '{name}' must be a generator function")
+        _benchmarks[name] = factory
+        return factory
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Stubs
+# ---------------------------------------------------------------------------
+
+class _StubCursor:
+    def __init__(self, row):
+        self._row = row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return self._row
+
+
+class _StubConnection:
+    """Connection whose every query returns *row*."""
+
+    def __init__(self, row):
+        self._row = row
+
+    def cursor(self):
+        return _StubCursor(self._row)
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+
+class _StubOriginDirectory:
+    """Origin directory serving a fixed matcher, with no database reloads."""
+
+    def __init__(self, entries):
+        self._matcher = OriginMatcher(entries)
+
+    def resolve(self, address):
+        return self._matcher.match(address)
+
+
+class _StubHistory:
+    def __init__(self, messages):
+        self.messages = messages
+
+
+@contextmanager
+def _patched(module, attribute, value):
+    original = getattr(module, attribute)
+    setattr(module, attribute, value)
+    try:
+        yield
+    finally:
+        setattr(module, attribute, original)
+
+
+def _messages(count):
+    return [HumanMessage(content=f"Question {index}: what does the premium plan include?") if index % 2
+            else AIMessage(content=f"Answer {index}: the **premium plan** includes priority support.")
+            for index in range(count)]
+
+
+_flask_app = Flask(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+@benchmark("DomainService.extract_address")
+def extract_address():
+    yield lambda: DomainService.extract_address("https://www.shop.example.co.uk/products?page=2")
+
+
+@benchmark("DomainService.generate_key")
+def generate_key():
+    yield lambda: DomainService.generate_key("api.shop.example.co.uk")
+
+
+@benchmark("validators.is_valid_uuid")
+def is_valid_uuid():
+    value = str(uuid.uuid4())
+    yield lambda: validators.is_valid_uuid(value)
+
+
+@benchmark("validators.chat_api_validate")
+def chat_api_validate():
+    payload = {"input": "Can you tell me about your pricing?", "session_id": str(uuid.uuid4()), "request_type": "sales"}
+    with _patched(validators, "origin_directory", _StubOriginDirectory([("example.com", "COMMON")])), \
+            _flask_app.test_request_context("/chat", method="POST", json=payload,
+                                            headers={"Origin": "https://example.com"}) as context:
+        def validate():
+            result = validators.chat_api_validate(context.request)
+            assert result.is_valid, result.message
+        yield validate
+
+
+def _message_mapping(count):
+    @benchmark(f"history._message_mapping[{count}]")
+    def message_mapping():
+        stub = _StubHistory(_messages(count))
+        yield lambda: history._message_mapping(stub)
+
+
+for _count in (10, 100, 1000):
+    _message_mapping(_count)
+
+
+@benchmark("APIResponse.response[ok]")
+def api_response_ok():
+    data = {"session_id": str(uuid.uuid4()), "history": [{"type": "ai", "content": "Hello!"}] * 20}
+    with _flask_app.app_context():
+        yield lambda: APIResponse(data=data).response(HTTPStatus.OK)
+
+
+@benchmark("APIResponse.response[bad_request]")
+def api_response_bad_request():
+    with _flask_app.app_context():
+        yield lambda: APIResponse(ValidationResponse(False, "Incorrect Address")).response(HTTPStatus.BAD_REQUEST)
+
+
+@benchmark("system_prompt.get_prompt[system]")
+def get_prompt_system():
+    with _patched(system_prompt, "sync_connection", _StubConnection(("You are a helpful sales assistant.",))):
+        yield lambda: system_prompt.get_prompt("COMMON", "sales", "system")
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def run_benchmark(factory, repeat: int = 5, number: int = None) -> dict:
+    """Time one benchmark; returns seconds per call (best run) and the call count used."""
+    generator = factory()
+    func = next(generator)
+    try:
+        timer = timeit.Timer(func)
+        if number is None:
+            number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+    finally:
+        generator.close()
+    return {"seconds_per_call": best, "number": number}
+
+
+def run_benchmarks(pattern: str = None, repeat: int = 5, number: int = None) -> dict:
+    return {name: run_benchmark(factory, repeat, number)
+            for name, factory in _benchmarks.items() if not pattern or pattern in name}
+
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    """One row per benchmark with its change against the baseline; ``regressed`` rows fail the run."""
+    rows = []
+    for name, result in results.items():
+        before = baseline.get("benchmarks", {}).get(name)
+        change = None
+        if before:
+            change = result["seconds_per_call"] / before["seconds_per_call"] - 1
+        rows.append({
+            "name": name,
+            "seconds_per_call": result["seconds_per_call"],
+            "baseline_seconds_per_call": before["seconds_per_call"] if before else None,
+            "change": change,
+            "regressed": change is not None and change > threshold,
+        })
+    return rows
+
+
+def machine_info() -> dict:
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "system": platform.system()}
+
+
+def load_baseline(path: str = BASELINE_FILE) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results: dict, path: str = BASELINE_FILE, merge_into: dict = None):
+    benchmarks = dict((merge_into or {}).get("benchmarks", {}))
+    benchmarks.update({name: {"seconds_per_call": result["seconds_per_call"]} for name, result in results.items()})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"recorded_at": datetime.now(timezone.utc).isoformat(), "machine": machine_info(),
+                   "benchmarks": dict(sorted(benchmarks.items()))}, f, indent=2)
+        f.write("\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before failing, as a fraction (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    results = run_benchmarks(args.pattern, args.repeat)
+    if args.update_baseline:
+        save_baseline(results, args.baseline, merge_into=baseline)
+        print(f"[MICRO] Baselines for {len(results)} benchmarks written to {args.baseline}")
+        return 0
+
+    if baseline.get("machine") and baseline["machine"] != machine_info():
+        print(f"[MICRO] Warning: baselines were recorded on {baseline['machine']}, this is {machine_info()}")
+    rows = compare_with_baseline(results, baseline, args.threshold)
+    print(f"{'benchmark':<40} {'us/call':>10} {'baseline':>10} {'change':>8}")
+    for row in rows:
+        baseline_us = f"{row['baseline_seconds_per_call'] * 1e6:10.2f}" if row["baseline_seconds_per_call"] else f"{'-':>10}"
+        change = f"{row['change'] * 100:+7.1f}%" if row["change"] is not None else f"{'new':>8}"
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['name']:<40} {row['seconds_per_call'] * 1e6:10.2f} {baseline_us} {change}{flag}")
+
+    regressions = [row["name"] for row in rows if row["regressed"]]
+    if regressions:
+        print(f"[MICRO] {len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Scaling benchmark: endpoint latency as the data set grows.
+
+Grows the synthetic data set (``benchmarks.datagen``) in steps towards the
+target volumes and, after each step, times sequential requests to the
+endpoints whose cost depends on table size:
+
+* ``GET /chat-info``  (``get_all_chat_info``, every active lead)
+* ``GET /domains/``   (``DomainRepository.list_all``)
+* ``GET /history``    (one session's history, random synthetic sessions)
+
+``--scales`` are fractions of the targets, so the default run measures at
+0.1%, 1%, 10% and 100% of 2M messages / 300k leads / 5k domains.  Each row
+records the row counts, p50/p95/p99 latency and response size per endpoint;
+results are written as JSON like the load test's.  The synthetic data is
+deleted afterwards unless ``--keep-data`` is given.
+
+Usage (from the ``code`` directory)
+-----
+    python -m benchmarks.scaling
+    python -m benchmarks.scaling --messages 200000 --leads 30000 --domains 1000 --scales 0.1,0.5,1
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks import datagen
+from benchmarks.load_test import DEFAULT_APP_COMMAND, RESULTS_DIR, _git_commit, _latency_summary, free_port, start_app
+from config import DATABASE_URL
+
+ENDPOINTS = ("chat-info", "domains", "history")
+
+
+def measure_endpoints(base_url: str, sessions: list[tuple], requests_per_endpoint: int, seed: int = 0) -> dict:
+    """Time *requests_per_endpoint* sequential requests per endpoint; returns latency and size per endpoint."""
+    rng = random.Random(seed)
+    results = {}
+    with requests.Session() as http:
+        for endpoint in ENDPOINTS:
+            latencies, sizes, errors = [], [], 0
+            for _ in range(requests_per_endpoint):
+                if endpoint == "history":
+                    if not sessions:
+                        break
+                    session_id, address = rng.choice(sessions)
+                    url, kwargs = f"{base_url}/history", {"params": {"session_id": session_id},
+                                                          "headers": {"Origin": f"https://{address}"}}
+                elif endpoint == "domains":
+                    url, kwargs = f"{base_url}/domains/", {}
+                else:
+                    url, kwargs = f"{base_url}/chat-info", {}
+                started = time.perf_counter()
+                try:
+                    response = http.get(url, timeout=300, **kwargs)
+                    latencies.append(time.perf_counter() - started)
+                    sizes.append(len(response.content))
+                    errors += response.status_code >= 400
+                except requests.RequestException:
+                    errors += 1
+            results[endpoint] = {**_latency_summary(latencies), "errors": errors,
+                                 "mean_response_bytes": round(sum(sizes) / len(sizes)) if sizes else None}
+    return results
+
+
+def print_results(results):
+    header = f"{'messages':>10} {'leads':>8} {'domains':>8}"
+    for endpoint in ENDPOINTS:
+        header += f" {endpoint + ' p50':>15} {'p95':>8}"
+    print(header)
+    for row in results:
+        line = f"{row['rows']['messages']:>10} {row['rows']['leads']:>8} {row['rows']['domains']:>8}"
+        for endpoint in ENDPOINTS:
+            latency = row["endpoints"][endpoint]
+            line += f" {latency['p50_ms'] or 0:>15.1f} {latency['p95_ms'] or 0:>8.1f}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2_000_000, help="target history messages")
+    parser.add_argument("--leads", type=int, default=300_000, help="target leads")
+    parser.add_argument("--domains", type=int, default=5_000, help="target domains")
+    parser.add_argument("--scales", default="0.001,0.01,0.1,1", help="comma-separated fractions of the targets")
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint per step")
+    parser.add_argument("--sessions", type=int, default=200, help="sessions sampled for /history")
+    parser.add_argument("--app-command", default=DEFAULT_APP_COMMAND, help="command starting the app; {port} is substituted")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default benchmarks/results/scaling_<timestamp>.json)")
+    parser.add_argument("--keep-data", action="store_true", help="do not delete the synthetic data afterwards")
+    args = parser.parse_args(argv)
+
+    scales = sorted(float(scale) for scale in args.scales.split(","))
+    # Domains are seeded while the app runs: have it pick them up within a second
+    env = {**os.environ, "DEBUG": "False", "ORIGIN_MAP_TTL_SECONDS": "1"}
+    port = free_port()
+    app = None
+    results = []
+    seeded = {"messages": 0, "leads": 0, "domains": 0}
+    try:
+        app = start_app(args.app_command, port, env)
+        base_url = f"http://127.0.0.1:{port}"
+        for step, scale in enumerate(scales):
+            target = {"messages": int(args.messages * scale), "leads": max(1, int(args.leads * scale)),
+                      "domains": max(1, int(args.domains * scale))}
+            delta = {name: max(0, target[name] - seeded[name]) for name in target}
+            print(f"[BENCHMARK] Scale {scale:g}: adding {delta}")
+            inserted = datagen.generate(DATABASE_URL, delta["messages"], delta["leads"], delta["domains"],
+                                        seed=args.seed + step)
+            for name in seeded:
+                seeded[name] += inserted[name]
+            time.sleep(2)
+
+            sessions = datagen.sample_sessions(DATABASE_URL, args.sessions, args.seed)
+            # One unrecorded round so connection setup and cold caches do not count
+            measure_endpoints(base_url, sessions, 1, args.seed)
+            results.append({
+                "scale": scale,
+                "rows": dict(seeded),
+                "seed_seconds": inserted["seconds"],
+                "endpoints": measure_endpoints(base_url, sessions, args.requests, args.seed),
+            })
+    finally:
+        if app is not None:
+            app.terminate()
+            app.wait(timeout=30)
+        if not args.keep_data:
+            datagen.delete_synthetic_data(DATABASE_URL)
+
+    report = {
+        "benchmark": "scaling",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"scaling_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print_results(results)
+    print(f"\n[BENCHMARK] Results written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Chat over a WebSocket (``/ws/chat`` on the ASGI app) for the embed widget.
+
+    ws://host/ws/chat?session_id=<uuid>        (Origin header as for /chat)
+
+Origin and session are validated once, at connect: a failure sends an
+``error`` frame and closes with 1008.  Frames are JSON objects:
+
+    client -> {"type": "message", "input": "...", "request_type": "sales"}
+    server <- {"type": "token", "text": "..."} ... {"type": "done", "response": "..."}
+    either -> {"type": "ping"}, answered with {"type": "pong"}
+
+Replies are streamed from the LLM and stored like /chat replies (history, then
+lead extraction on the background executor).
+
+Heartbeat: the server pings every ``WEBSOCKET_PING_INTERVAL_SECONDS`` and
+closes (1001) a socket that sent nothing for ``WEBSOCKET_IDLE_TIMEOUT_SECONDS``.
+Backpressure: messages are answered one at a time and at most
+``WEBSOCKET_MAX_PENDING_MESSAGES`` wait; more get an ``error`` frame.  Tokens
+are pulled from the LLM only as fast as the client reads them, and a client
+that does not take a frame within ``WEBSOCKET_SEND_TIMEOUT_SECONDS`` is
+disconnected (1013).  A process accepts ``WEBSOCKET_MAX_CONNECTIONS`` sockets
+and closes further ones with 1013.
+"""
+import asyncio
+import json
+import traceback
+import uuid
+
+from starlette.websockets import WebSocketDisconnect
+
+from api.models import RequestView
+from api.validators import validate_chat_fields, validate_history_data
+from config import (WEBSOCKET_IDLE_TIMEOUT_SECONDS, WEBSOCKET_MAX_CONNECTIONS, WEBSOCKET_MAX_PENDING_MESSAGES,
+                    WEBSOCKET_PING_INTERVAL_SECONDS, WEBSOCKET_SEND_TIMEOUT_SECONDS)
+from llm_api import astream_groq_response
+from metrics import (WEBSOCKET_CONNECTIONS, WEBSOCKET_DISCONNECTS, WEBSOCKET_FIRST_TOKEN_SECONDS,
+                     WEBSOCKET_FRAMES)
+from tracing import bind_request_id, start_span, unbind_request_id
+
+# Close codes (RFC 6455)
+GOING_AWAY = 1001
+POLICY_VIOLATION = 1008
+INTERNAL_ERROR = 1011
+TRY_AGAIN_LATER = 1013
+
+_CLOSE_CODES = {"idle": GOING_AWAY, "slow_client": TRY_AGAIN_LATER, "error": INTERNAL_ERROR}
+
+_open_connections = 0
+
+
+def connection_stats() -> dict:
+    """Gauge callback: open chat sockets of this process."""
+    return {(): _open_connections}
+
+
+WEBSOCKET_CONNECTIONS.add_callback(connection_stats)
+
+
+class SlowClientError(Exception):
+    """The client did not take a frame within WEBSOCKET_SEND_TIMEOUT_SECONDS."""
+
+
+async def chat_socket(websocket):
+    global _open_connections
+    if _open_connections >= WEBSOCKET_MAX_CONNECTIONS:
+        WEBSOCKET_DISCONNECTS.inc("over_capacity")
+        await websocket.close(code=TRY_AGAIN_LATER)
+        return
+
+    _open_connections += 1
+    try:
+        validation_response = validate_history_data(RequestView(websocket))
+        await websocket.accept()
+        if not validation_response.is_valid:
+            await websocket.send_json({"type": "error", "error": validation_response.message})
+            await websocket.close(code=POLICY_VIOLATION)
+            reason = "rejected"
+        else:
+            session = ChatSession(websocket, websocket.query_params["session_id"],
+                                  validation_response.data["domain"])
+            reason = await session.run()
+    finally:
+        _open_connections -= 1
+    WEBSOCKET_DISCONNECTS.inc(reason)
+
+
+class ChatSession:
+    """One accepted socket: a receiver, a heartbeat and a worker answering messages in order."""
+
+    def __init__(self, websocket, session_id, domain):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.domain = domain
+        self._inbox = asyncio.Queue(maxsize=WEBSOCKET_MAX_PENDING_MESSAGES)
+        self._send_lock = asyncio.Lock()
+        self._loop = asyncio.get_running_loop()
+        self._last_seen = self._loop.time()
+
+    async def run(self) -> str:
+        """Serve the socket until one side ends it; returns the reason."""
+        tasks = [asyncio.create_task(self._receive()), asyncio.create_task(self._heartbeat()),
+                 asyncio.create_task(self._answer_messages())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # asyncio.wait, not gather: gather re-raises into the server's cancel scope on shutdown
+            await asyncio.wait(tasks)
+
+        try:
+            reason = done.pop().result()
+        except WebSocketDisconnect:
+            reason = "client"
+        except SlowClientError:
+            reason = "slow_client"
+        except Exception as e:
+            print(f"[WEBSOCKET] Session {self.session_id} failed: {e}")
+            print(traceback.format_exc())
+            reason = "error"
+        if reason in _CLOSE_CODES:
+            await self._close(_CLOSE_CODES[reason])
+        return reason
+
+    async def send(self, frame: dict):
+        async with self._send_lock:
+            try:
+                await asyncio.wait_for(self.websocket.send_text(json.dumps(frame)), WEBSOCKET_SEND_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                raise SlowClientError() from None
+        WEBSOCKET_FRAMES.inc("sent", frame["type"])
+
+    async def _receive(self) -> str:
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return "client"
+            self._last_seen = self._loop.time()
+            try:
+                frame = json.loads(message.get("text") or "")
+            except ValueError:
+                frame = None
+            frame_type = frame.get("type") if isinstance(frame, dict) else None
+            WEBSOCKET_FRAMES.inc("received", frame_type if frame_type in ("message", "ping", "pong") else "invalid")
+
+            if frame_type == "ping":
+                await self.send({"type": "pong"})
+            elif frame_type == "message":
+                try:
+                    self._inbox.put_nowait(frame)
+                except asyncio.QueueFull:
+                    await self.send({"type": "error", "error": "Please wait for the reply before sending more messages."})
+            elif frame_type != "pong":
+                await self.send({"type": "error", "error": "Invalid frame"})
+
+    async def _heartbeat(self) -> str:
+        while True:
+            await asyncio.sleep(WEBSOCKET_PING_INTERVAL_SECONDS)
+            if self._loop.time() - self._last_seen > WEBSOCKET_IDLE_TIMEOUT_SECONDS:
+                return "idle"
+            await self.send({"type": "ping"})
+
+    async def _answer_messages(self):
+        while True:
+            frame = await self._inbox.get()
+            request_id = uuid.uuid4().hex
+            token = bind_request_id(request_id)
+            try:
+                with start_span("WS /ws/chat message", kind="server", attributes={"session.id": self.session_id}):
+                    await self._answer(frame)
+            finally:
+                unbind_request_id(token)
+
+    async def _answer(self, frame: dict):
+        if not isinstance(frame.get("input"), str) or not isinstance(frame.get("request_type"), str):
+            await self.send({"type": "error", "error": "Invalid input"})
+            return
+        fields_validation_response = validate_chat_fields(RequestView(self.websocket, frame))
+        if not fields_validation_response.is_valid:
+            await self.send({"type": "error", "error": fields_validation_response.message})
+            return
+
+        started = self._loop.time()
+        parts = []
+        try:
+            async for text in astream_groq_response(frame["input"].strip(), self.session_id,
+                                                    fields_validation_response.data, self.domain):
+                if not parts:
+                    WEBSOCKET_FIRST_TOKEN_SECONDS.observe(self._loop.time() - started)
+                parts.append(text)
+                await self.send({"type": "token", "text": text})
+        except (SlowClientError, WebSocketDisconnect):
+            raise
+        except Exception as e:
+            print(f"Error during LLM call: {e}")
+            print(traceback.format_exc())
+            await self.send({"type": "error", "error": "Sorry, something went wrong. Please try again later."})
+            return
+        await self.send({"type": "done", "response": "".join(parts)})
+
+    async def _close(self, code: int):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), WEBSOCKET_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            # The client is gone or not reading; the server drops the connection anyway
+            pass
@@ -1,8 +1,9 @@
 # Add other constants as needed
 import os
+import json
 from dotenv import load_dotenv
 from enum import Enum
-import requests
+from functools import lru_cache
 load_dotenv()
 # Flask settings
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
@@ -11,20 +12,57 @@ DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 GROQ_MODEL_NAME = os.environ.get("GROQ_MODEL_NAME", "meta-llama/llama-4-scout-17b-16e-instruct")  # default if not set
 
+# LLM backend: "groq" (default) or "local", a deterministic offline model for load and latency tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq").lower()
+LOCAL_LLM_LATENCY_MS = float(os.getenv("LOCAL_LLM_LATENCY_MS", "0"))
+LOCAL_LLM_TOKENS_PER_SECOND = float(os.getenv("LOCAL_LLM_TOKENS_PER_SECOND", "0"))
+LOCAL_LLM_REPLY_TOKENS = int(os.getenv("LOCAL_LLM_REPLY_TOKENS", "40"))
+# Reply to the contact/name extraction prompts
+LOCAL_LLM_EXTRACTION_JSON = json.loads(os.getenv("LOCAL_LLM_EXTRACTION_JSON") or json.dumps({
+    "contact_name": "Local User", "email": "local.user@example.com", "mobile": "", "country": "",
+    "name_detected": True, "confidence": "high",
+}))
+
 # Chat input limits
 max_input_length = 10000
+max_idempotency_key_length = 255
+# Bulk chat-info updates
+max_bulk_update_size = 1000
 DEFAULT_DOMAIN = "COMMON"
 # Database and table name
-db_name = 'chatdb'
+DEFAULT_DB_NAME = 'chatdb'
 table_name  = 'chat_table'
-DATABASE_URL = os.getenv('DATABASE_URL')
+# Base server URL; the database name is appended (see get_db_name)
+DATABASE_BASE_URL = os.getenv('DATABASE_URL')
 # For cloud deployment, lets create different db for production and staging
+METADATA_URL = "http://metadata.google.internal/computeMetadata/v1/instance/attributes/BRANCH_NAME"
+
+
+def _on_google_cloud():
+    """Cheap local check (no network) for a GCE/Cloud Run host, where the metadata server exists."""
+    if os.getenv("GCE_METADATA_HOST") or os.getenv("K_SERVICE"):
+        return True
+    try:
+        with open("/sys/class/dmi/id/product_name") as f:
+            return f.read().startswith("Google")
+    except OSError:
+        return False
 
+
+@lru_cache(maxsize=None)
 def get_db_name():
-    #db based on Production and staging based on GitHub branch name
-    METADATA_URL = f"http://metadata.google.internal/computeMetadata/v1/instance/attributes/BRANCH_NAME"
+    """
+    DB_NAME when set; on Google Cloud, prod/staging db based on the instance's GitHub
+    branch name (BRANCH_NAME metadata); otherwise the local default. Resolved once, on first use.
+    """
+    if os.getenv("DB_NAME"):
+        return os.getenv("DB_NAME")
+    if not _on_google_cloud():
+        return DEFAULT_DB_NAME
     headers = {"Metadata-Flavor": "Google"}
     try:
+        # Imported here: only needed on Google Cloud, and slow to import
+        import requests
         response = requests.get(METADATA_URL, headers=headers, timeout=2)
         if response.status_code == 200:
             branch_name  = response.text.strip()
@@ -37,12 +75,134 @@ def get_db_name():
         print(f"Could not fetch metadata (defaulting to local DB): {e}")
 
     # Fallback if metadata not found or error occurs
-    return db_name
+    return DEFAULT_DB_NAME
+
+
+def _database_url():
+    return DATABASE_BASE_URL + get_db_name()
+
+
+def _replica_url():
+    # Optional read replica for read-only endpoints (same base-URL form as DATABASE_URL)
+    replica_base_url = os.getenv("DATABASE_REPLICA_URL")
+    return replica_base_url + get_db_name() if replica_base_url else None
+
+
+def _shard_urls():
+    # Optional per-domain shards for conversation data, as JSON {"shard_name": "postgresql://...:5432/"}.
+    # The primary database keeps domains, prompts and the domain -> shard map.
+    return {name: url + get_db_name() for name, url in json.loads(os.getenv("DATABASE_SHARDS") or "{}").items()}
+
+
+# Settings derived from the database name are resolved on first access (module __getattr__),
+# so importing config never waits on the metadata server.
+_LAZY_SETTINGS = {
+    "db_name": get_db_name,
+    "DATABASE_URL": _database_url,
+    "DATABASE_REPLICA_URL": _replica_url,
+    "SHARD_DATABASE_URLS": _shard_urls,
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_SETTINGS:
+        value = _LAZY_SETTINGS[name]()
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Read replica connection pool and lag limit
+REPLICA_POOL_SIZE = int(os.getenv("REPLICA_POOL_SIZE", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = 10
+
+PRIMARY_SHARD = "primary"
+SHARD_POOL_SIZE = int(os.getenv("SHARD_POOL_SIZE", "5"))
+SHARD_MAP_TTL_SECONDS = 30
+# Registered origins (domains table) are matched in memory and reloaded this often
+ORIGIN_MAP_TTL_SECONDS = float(os.getenv("ORIGIN_MAP_TTL_SECONDS", "30"))
+
+# Chat history partitioning (one partition per month) and retention
+CHAT_PARTITION_MONTHS_AHEAD = 2
+CHAT_RETENTION_ENABLED = os.getenv("CHAT_RETENTION_ENABLED", "False").lower() == "true"
+CHAT_RETENTION_MONTHS = int(os.getenv("CHAT_RETENTION_MONTHS", "12"))
+CHAT_RETENTION_INTERVAL_SECONDS = int(os.getenv("CHAT_RETENTION_INTERVAL_SECONDS", str(6 * 60 * 60)))
+CHAT_ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "archive")
+
+# Purge of soft-deleted (is_active = FALSE) sessions and their transcripts
+PURGE_ENABLED = os.getenv("PURGE_ENABLED", "False").lower() == "true"
+PURGE_INACTIVE_AFTER_DAYS = int(os.getenv("PURGE_INACTIVE_AFTER_DAYS", "90"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_BATCH_DELAY_SECONDS = float(os.getenv("PURGE_BATCH_DELAY_SECONDS", "0.5"))
+PURGE_INTERVAL_SECONDS = int(os.getenv("PURGE_INTERVAL_SECONDS", str(24 * 60 * 60)))
+
+# Request tracing: spans written as OTLP/JSON lines to a size-rotated file
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "False").lower() == "true"
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "ai-agent-boilerplate")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces/spans.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUP_COUNT = int(os.getenv("TRACE_FILE_BACKUP_COUNT", "5"))
+
+# Slow-query log: statements over the threshold are logged, a sample of them EXPLAINed
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "250"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = int(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", "300"))
+# EXPLAIN ANALYZE (re-runs the statement) instead of plain EXPLAIN, for statements without side effects
+SLOW_QUERY_EXPLAIN_ANALYZE = os.getenv("SLOW_QUERY_EXPLAIN_ANALYZE", "False").lower() == "true"
+
+# Sampling CPU profiles of requests sent with "X-Profile: <ADMIN_API_TOKEN>" or picked at PROFILE_SAMPLE_RATE
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Memory diagnostics (tracemalloc): periodic snapshots and per-endpoint allocation deltas at /admin/memory
+MEMORY_DIAGNOSTICS_ENABLED = os.getenv("MEMORY_DIAGNOSTICS_ENABLED", "False").lower() == "true"
+MEMORY_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("MEMORY_SNAPSHOT_INTERVAL_SECONDS", "300"))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+MEMORY_TOP_N = 25
+
+# Connections per shard in the async pools of the ASGI chat path (asgi.py)
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "10"))
+
+# Chat WebSocket (/ws/chat on the ASGI app, chat_socket.py), per process
+WEBSOCKET_MAX_CONNECTIONS = int(os.getenv("WEBSOCKET_MAX_CONNECTIONS", "1000"))
+WEBSOCKET_PING_INTERVAL_SECONDS = float(os.getenv("WEBSOCKET_PING_INTERVAL_SECONDS", "20"))
+WEBSOCKET_IDLE_TIMEOUT_SECONDS = float(os.getenv("WEBSOCKET_IDLE_TIMEOUT_SECONDS", "60"))
+WEBSOCKET_MAX_PENDING_MESSAGES = int(os.getenv("WEBSOCKET_MAX_PENDING_MESSAGES", "4"))
+WEBSOCKET_SEND_TIMEOUT_SECONDS = float(os.getenv("WEBSOCKET_SEND_TIMEOUT_SECONDS", "10"))
+
+# Threads per process running conversation processing (lead extraction) after the reply is sent
+BACKGROUND_WORKER_THREADS = int(os.getenv("BACKGROUND_WORKER_THREADS", "4"))
+
+# Set by gunicorn.conf.py: the app is imported once in the master and forked, so threads and
+# connections are set up per worker after the fork (worker_lifecycle.py) instead of at import
+FORKING_SERVER = os.getenv("FORKING_SERVER", "False").lower() == "true"
+
+# Deep health check (/health/deep): results are cached this long so frequent probes cost no I/O;
+# an LLM error rate above the threshold since the previous check reports "degraded"
+HEALTH_CHECK_CACHE_SECONDS = float(os.getenv("HEALTH_CHECK_CACHE_SECONDS", "10"))
+HEALTH_LLM_ERROR_RATE_THRESHOLD = float(os.getenv("HEALTH_LLM_ERROR_RATE_THRESHOLD", "0.5"))
+
+# Warm-up of pools, lookups, deferred imports and LLM clients in a background thread at start-up;
+# GET /ready answers 503 until it has finished
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "True").lower() == "true"
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+# Token required in the X-Admin-Token header by /admin endpoints; they are disabled when unset
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
 
-db_name = get_db_name()
-DATABASE_URL = DATABASE_URL + db_name
+# Idempotency-Key on POST /chat (idempotency.py): how long a key's reply is replayed, how long a
+# duplicate waits for the first request, and after how long an unfinished claim is taken over
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(60 * 60)))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "60"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "120"))
 
-print("Connecting to:", DATABASE_URL)
+# Signing keys of the session tokens /history returns and /chat accepts ("kid:secret,...", first one
+# signs; see session_token.py), and their lifetime. No tokens are issued when unset
+SESSION_TOKEN_KEYS = os.getenv("SESSION_TOKEN_KEYS", "")
+SESSION_TOKEN_TTL_SECONDS = int(os.getenv("SESSION_TOKEN_TTL_SECONDS", str(24 * 60 * 60)))
 
 class agent_type(str, Enum):
     SALES = "sales"
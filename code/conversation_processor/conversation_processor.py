@@ -1,21 +1,25 @@
 import json
 from datetime import datetime
-from db import sync_connection
-from langchain_groq import ChatGroq
-from config import GROQ_API_KEY, GROQ_MODEL_NAME, agent_type
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from sharding import resolve_shard, shard_connection
+from config import agent_type
+from llm_backend import get_chat_model
 from system_prompt import get_prompt
+from metrics import LLMMetricsCallback, timed_stage
+from tracing import LLMTracingCallback
 
-def process_conversation(user_input, session_id, request_type, domain):
+@timed_stage("process_conversation")
+def process_conversation(user_input, session_id, request_type, domain, shard=None):
     """
     Main hook function that processes each conversation exchange.
     Uses LLM to detect if user provided their contact info in the current input.
+    `shard` is the domain's shard as resolved by the request; resolved again when omitted.
     """
 
     try:
         print(f"[PROCESSOR] Processing session {session_id} for contact info detection...")  
+        shard = shard or resolve_shard(domain)
         # Update request_type for the new messages in this session
-        _update_session_request_type(session_id, request_type, domain)
+        _update_session_request_type(session_id, request_type, domain, shard)
         # Choose llm function based on request type
         info_data = _detect_info_with_llm(user_input, request_type, domain)
         
@@ -23,7 +27,7 @@ def process_conversation(user_input, session_id, request_type, domain):
             print(f"[PROCESSOR] info detected in session {session_id}")
                 
             # Save information to database
-            _save_info_to_database(session_id, info_data, user_input, request_type, domain)
+            _save_info_to_database(session_id, info_data, user_input, request_type, domain, shard)
             print(f"[PROCESSOR] information saved for session {session_id}.")
         else:
             print(f"[PROCESSOR] No Info detected in current message for session {session_id}")
@@ -33,14 +37,19 @@ def process_conversation(user_input, session_id, request_type, domain):
         print(f"[PROCESSOR] Error in conversation processor: {e}")
         # Don't let processing errors break the chat flow
 
-def _update_session_request_type(session_id, request_type, domain):
+def _update_session_request_type(session_id, request_type, domain, shard):
     """
     Insert a new chat_info row with (session_id, request_type)
     only if session_id does not already exist.
     If the session_id exists, do nothing.
     """
+    with shard_connection(shard) as conn:
+        _insert_session_request_type(conn, session_id, request_type, domain)
+
+
+def _insert_session_request_type(conn, session_id, request_type, domain):
     try:
-        with sync_connection.cursor() as cur:
+        with conn.cursor() as cur:
             insert_query = """
             INSERT INTO chat_info (
                 session_id,
@@ -51,7 +60,7 @@ def _update_session_request_type(session_id, request_type, domain):
             """
 
             cur.execute(insert_query, (session_id, request_type, domain))
-            sync_connection.commit()
+            conn.commit()
 
             if cur.rowcount and cur.rowcount > 0:
                 print(f"[CREATE] Inserted new chat_info for session_id={session_id} with request_type='{request_type}'and domain ='{domain}'")
@@ -61,7 +70,7 @@ def _update_session_request_type(session_id, request_type, domain):
     except Exception as e:
         print(f"Error inserting request_type row: {e}")
         try:
-            sync_connection.rollback()
+            conn.rollback()
         except Exception:
             pass
 
@@ -95,9 +104,12 @@ def _detect_info_with_llm(message, request_type, domain):
     Returns:
         dict: Contains Contact Us/name info 
     """
+    # Imported on first use to keep LangChain off the app's import path
+    from langchain_core.messages import SystemMessage
+
     try:
-        # Create LLM instance for contact info detection
-        llm = ChatGroq(groq_api_key=GROQ_API_KEY, model=GROQ_MODEL_NAME)
+        # LLM instance for contact info detection
+        llm = get_chat_model("extraction")
 
         # prompt based on request type
         if request_type == agent_type.SALES:
@@ -111,7 +123,7 @@ def _detect_info_with_llm(message, request_type, domain):
         full_prompt = [SystemMessage(content=prompt_content)]
 
         # Get LLM response
-        response = llm.invoke(full_prompt)
+        response = llm.invoke(full_prompt, config={"callbacks": [LLMMetricsCallback("extraction"), LLMTracingCallback("extraction")]})
         response_text = response.content.strip()
         # Clean markdown fences if present
         response_text = response_text.strip("`").replace("json\n", "")        
@@ -129,21 +141,27 @@ def _detect_info_with_llm(message, request_type, domain):
         print(f"[INFO_DETECTION] Error in LLM contact info detection: {e}")
         return {"contact_name": "", "email": "", "mobile": "", "country": ""}
     
-def _save_info_to_database(session_id, info_data, original_message, request_type, domain):
+def _save_info_to_database(session_id, info_data, original_message, request_type, domain, shard):
     """
-    Save detected info to chat_info table.
+    Save detected info to chat_info table on the domain's shard.
     
     Args:
         session_id (str): Session identifier
         info_data: Extracted info
         original_message (str): The original message where contact info was detected
         request_type: type of request
+        shard: shard holding the domain's conversation data
     """
+    with shard_connection(shard) as conn:
+        _upsert_info(conn, session_id, info_data, original_message, request_type, domain)
+
+
+def _upsert_info(conn, session_id, info_data, original_message, request_type, domain):
     try:
         # Ensure clean transaction state
-        sync_connection.rollback()
+        conn.rollback()
         
-        with sync_connection.cursor() as cur:
+        with conn.cursor() as cur:
 
             metadata = {
                 "info_detected_from_message": original_message,
@@ -210,7 +228,7 @@ def _save_info_to_database(session_id, info_data, original_message, request_type
                 datetime.now()
             ))
 
-            sync_connection.commit()            
+            conn.commit()            
             
             # Log what was updated
             updates = []
@@ -225,6 +243,6 @@ def _save_info_to_database(session_id, info_data, original_message, request_type
         print(f"[DATABASE] Error saving info to database: {e}")
         # Rollback on error to clean transaction state
         try:
-            sync_connection.rollback()
+            conn.rollback()
         except:
             pass
\ No newline at end of file
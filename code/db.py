@@ -1,9 +1,12 @@
 import os
+import sys
 import uuid
 import psycopg
-from langchain_postgres import PostgresChatMessageHistory
 from config import DATABASE_URL, db_name, table_name
 from prompts_table import check_and_insert_default_prompts
+from history_retention import create_partitioned_chat_table, ensure_partitions, table_kind
+from migrations import Migration, migrate
+from query_stats import InstrumentedCursor
 
 
 def ensure_database_exists(DATABASE_URL, db_name):
@@ -27,76 +30,86 @@ def ensure_database_exists(DATABASE_URL, db_name):
                 print(f"Database '{db_name}' already exists.")
 
 
-def create_sync_connection(DATABASE_URL):
+def create_sync_connection(DATABASE_URL, autocommit=False):
     """
     Establish a connection to the specified database.
     """
-    conn = psycopg.connect(DATABASE_URL)
-    conn.autocommit = False
+    conn = psycopg.connect(DATABASE_URL, cursor_factory=InstrumentedCursor)
+    conn.autocommit = autocommit
     return conn
 
 def ensure_chat_table_exists(sync_connection, table_name):
     """
-    Use LangChain's helper to make sure the chat history table exists.
+    Make sure the chat history table exists, range-partitioned by month on created_at.
+    A plain table created before partitioning is kept as-is until it is migrated
+    with `python history_retention.py migrate`.
     """
-    PostgresChatMessageHistory.create_tables(sync_connection, table_name)
-    print(f"Table '{table_name}' created or verified.")
+    if table_kind(sync_connection, table_name) == "r":
+        # Imported here: langchain_postgres takes about a second to import
+        from langchain_postgres import PostgresChatMessageHistory
+        PostgresChatMessageHistory.create_tables(sync_connection, table_name)
+        print(f"Table '{table_name}' verified (not partitioned, run 'python history_retention.py migrate').")
+        return
+
+    create_partitioned_chat_table(sync_connection, table_name)
+    sync_connection.commit()
+    ensure_partitions(sync_connection, table_name)
+    print(f"Table '{table_name}' created or verified (partitioned by month).")
 
 
 def ensure_summaries_table_exists(sync_connection):
     """
     Create the chat_info table for storing lead information and summaries.
     """
-    try:
-        with sync_connection.cursor() as cur:
-            # Create the chat_info table
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS chat_info (
-                id SERIAL PRIMARY KEY,
-                session_id TEXT NOT NULL,
-                contact_name TEXT,
-                email TEXT,
-                mobile TEXT,
-                country TEXT,
-                request_type TEXT,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                metadata JSONB DEFAULT '{}',
-                
-                -- Add constraint to prevent duplicate summaries for same session
-                UNIQUE(session_id)
-            );
-            
-            -- Create indexes for efficient querying
-            CREATE INDEX IF NOT EXISTS idx_chat_info_session_id 
-            ON chat_info(session_id);
-            
+    with sync_connection.cursor() as cur:
+        # Create the chat_info table
+        create_table_query = """
+        CREATE TABLE IF NOT EXISTS chat_info (
+            id SERIAL PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            contact_name TEXT,
+            email TEXT,
+            mobile TEXT,
+            country TEXT,
+            request_type TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            metadata JSONB DEFAULT '{}',
             
-            CREATE INDEX IF NOT EXISTS idx_chat_info_created_at 
-            ON chat_info(created_at);
-            """
-            
-            cur.execute(create_table_query)
+            -- Add constraint to prevent duplicate summaries for same session
+            UNIQUE(session_id)
+        );
+        
+        -- Create indexes for efficient querying
+        CREATE INDEX IF NOT EXISTS idx_chat_info_session_id 
+        ON chat_info(session_id);
+        
+        
+        CREATE INDEX IF NOT EXISTS idx_chat_info_created_at 
+        ON chat_info(created_at);
+        """
+        
+        cur.execute(create_table_query)
 
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS contact_name TEXT;")
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS email TEXT;")
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS country TEXT;")
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS mobile TEXT;")
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS request_type TEXT;")
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP;")
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS metadata JSONB DEFAULT '{}'::jsonb;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS contact_name TEXT;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS email TEXT;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS country TEXT;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS mobile TEXT;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS request_type TEXT;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS metadata JSONB DEFAULT '{}'::jsonb;")
 
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS status TEXT DEFAULT 'OPEN';")
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS remarks TEXT;")
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS domain TEXT;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS status TEXT DEFAULT 'OPEN';")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS remarks TEXT;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS domain TEXT;")
 
-            cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS is_active BOOLEAN DEFAULT TRUE;")
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS is_active BOOLEAN DEFAULT TRUE;")
 
-            sync_connection.commit()
-            print("Table 'chat_info' created/verified successfully.")
-            
-    except Exception as e:
-        print(f"Error creating chat_info table: {e}")
-        sync_connection.rollback()
+        # Lets the purge job find soft-deleted sessions without scanning live leads
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_chat_info_inactive_created_at ON chat_info(created_at) WHERE is_active IS FALSE;")
+
+        sync_connection.commit()
+        print("Table 'chat_info' created/verified successfully.")
+        
 
 def ensure_prompts_table_exists(sync_connection):
     """
@@ -106,42 +119,38 @@ def ensure_prompts_table_exists(sync_connection):
       - type -- What the prompt use for, example as name_prompt, sales prompt, info_prompt, generic
       - text -- prompt itself
     """
-    try:
-        with sync_connection.cursor() as cur:
-            create_table_sql = """
-            CREATE TABLE IF NOT EXISTS prompts (
-                id SERIAL PRIMARY KEY,
-                domain TEXT DEFAULT 'common',
-                agent_type TEXT NOT NULL,
-                type TEXT NOT NULL,
-                "text" TEXT,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE (domain, agent_type, type)
-            );
-            """
-            cur.execute(create_table_sql)
-            
-            # Add unique constraint if it doesn't exist (for existing databases)
-            alter_table_sql = """
-            DO $$ 
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM pg_constraint 
-                    WHERE conname = 'prompts_domain_agent_type_type_key'
-                ) THEN
-                    ALTER TABLE prompts 
-                    ADD CONSTRAINT prompts_domain_agent_type_type_key 
-                    UNIQUE (domain, agent_type, type);
-                END IF;
-            END $$;
-            """
-            cur.execute(alter_table_sql)
-            
-            sync_connection.commit()
-            print("Table 'prompts' created/verified successfully.")
-    except Exception as e:
-        print(f"Error creating prompts table: {e}")
-        sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS prompts (
+            id SERIAL PRIMARY KEY,
+            domain TEXT DEFAULT 'common',
+            agent_type TEXT NOT NULL,
+            type TEXT NOT NULL,
+            "text" TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (domain, agent_type, type)
+        );
+        """
+        cur.execute(create_table_sql)
+        
+        # Add unique constraint if it doesn't exist (for existing databases)
+        alter_table_sql = """
+        DO $$ 
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint 
+                WHERE conname = 'prompts_domain_agent_type_type_key'
+            ) THEN
+                ALTER TABLE prompts 
+                ADD CONSTRAINT prompts_domain_agent_type_type_key 
+                UNIQUE (domain, agent_type, type);
+            END IF;
+        END $$;
+        """
+        cur.execute(alter_table_sql)
+        
+        sync_connection.commit()
+        print("Table 'prompts' created/verified successfully.")
 
 def ensure_domains_table_exists(sync_connection):
     """
@@ -151,40 +160,168 @@ def ensure_domains_table_exists(sync_connection):
       - parent key : parent key for domain key
     Note: column name 'key' will be created quoted to avoid ambiguity; it's still a valid column name.
     """
+    with sync_connection.cursor() as cur:
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS domains (
+            id SERIAL PRIMARY KEY,
+            key TEXT NOT NULL,
+            address TEXT UNIQUE NOT NULL,
+            parent INTEGER REFERENCES domains(id) ON DELETE SET NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        -- Insert a default row if it doesn't exist
+        INSERT INTO domains (key, address, parent)
+        VALUES ('COMMON', 'example.com', NULL)
+        ON CONFLICT (address) DO NOTHING;
+        """
+        cur.execute(create_table_sql)
+        sync_connection.commit()
+        print("Table 'domains' created/verified successfully.")
+
+
+def ensure_domain_shards_table_exists(sync_connection):
+    """
+    Create or verify the 'domain_shards' map:
+      - domain_key : domain key whose conversation data lives on a shard
+      - shard : shard name from DATABASE_SHARDS ('primary' when absent)
+      - moving : set while the rebalancing tool copies the domain to another shard
+    """
+    with sync_connection.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS domain_shards (
+            domain_key TEXT PRIMARY KEY,
+            shard TEXT NOT NULL,
+            moving BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        sync_connection.commit()
+        print("Table 'domain_shards' created/verified successfully.")
+
+
+def ensure_conversation_tables_exist(sync_connection, table_name):
+    """
+    Create the per-conversation tables (chat history and chat_info); used for the primary and every shard.
+    """
+    ensure_chat_table_exists(sync_connection, table_name)
+    ensure_summaries_table_exists(sync_connection)
+
+
+def add_domains_key_index(sync_connection):
+    """Prompt fallback looks domains up by key (system_prompt.find_parent_key)."""
+    with sync_connection.cursor() as cur:
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_domains_key ON domains(key);")
+
+
+def drop_www_duplicate_domains(sync_connection):
+    """
+    The origin matcher serves www.<address> from <address>: drop the www. copies sharing its key.
+    Domains whose parent is a www. copy are moved to the bare row first (parent is ON DELETE SET NULL).
+    """
+    with sync_connection.cursor() as cur:
+        cur.execute("""
+            UPDATE domains child SET parent = bare.id
+            FROM domains www JOIN domains bare ON www.address = 'www.' || bare.address AND www.key = bare.key
+            WHERE child.parent = www.id;
+        """)
+        cur.execute("""
+            DELETE FROM domains www USING domains bare
+            WHERE www.address = 'www.' || bare.address AND www.key = bare.key;
+        """)
+
+
+def ensure_chat_idempotency_table_exists(sync_connection):
+    """
+    Idempotency keys of POST /chat (see idempotency.py):
+      - session_id, idempotency_key : the client's retry key, scoped to its session
+      - fingerprint : hash of the message the key was first used with
+      - status_code, response : the stored reply; NULL while the first request is in flight
+    """
+    with sync_connection.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS chat_idempotency (
+            session_id TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            status_code INTEGER,
+            response JSONB,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (session_id, idempotency_key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_chat_idempotency_created_at ON chat_idempotency(created_at);
+        """)
+
+
+def add_chat_info_deactivated_at(sync_connection):
+    """
+    When a lead was set inactive, so the purge job ages it from then rather than from its creation.
+    Leads already inactive start counting now: their deactivation time is unknown.
+    """
+    with sync_connection.cursor() as cur:
+        cur.execute("ALTER TABLE chat_info ADD COLUMN IF NOT EXISTS deactivated_at TIMESTAMPTZ;")
+        cur.execute("UPDATE chat_info SET deactivated_at = now() WHERE is_active IS FALSE AND deactivated_at IS NULL;")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chat_info_inactive_deactivated_at
+            ON chat_info(deactivated_at) WHERE is_active IS FALSE;
+        """)
+        cur.execute("DROP INDEX IF EXISTS idx_chat_info_inactive_created_at;")
+
+
+# Versioned schema (see migrations.py). Append new versions; never edit applied ones.
+CONVERSATION_MIGRATIONS = [
+    Migration(1, "chat history and chat_info tables",
+              lambda conn: ensure_conversation_tables_exist(conn, table_name)),
+    Migration(2, "chat_info.deactivated_at", add_chat_info_deactivated_at),
+]
+
+PRIMARY_MIGRATIONS = [
+    Migration(1, "prompts, domains and domain_shards tables, default prompts",
+              lambda conn: (ensure_prompts_table_exists(conn), ensure_domains_table_exists(conn),
+                            ensure_domain_shards_table_exists(conn), check_and_insert_default_prompts(conn))),
+    Migration(2, "index on domains.key", add_domains_key_index),
+    Migration(3, "drop www. duplicates of domains", drop_www_duplicate_domains),
+    Migration(4, "chat_idempotency table", ensure_chat_idempotency_table_exists),
+]
+
+
+def migrate_conversation_schema(sync_connection):
+    """
+    Bring the history and chat_info tables up to date and make sure the coming months'
+    history partitions exist; used for the primary and every shard.
+    """
+    applied = migrate(sync_connection, "conversation", CONVERSATION_MIGRATIONS)
+    # Not a migration: partitions are due every month whatever the schema version
+    if table_kind(sync_connection, table_name) == "p":
+        ensure_partitions(sync_connection, table_name)
+    return applied
+
+
+def migrate_primary_schema(sync_connection):
+    return migrate(sync_connection, "primary", PRIMARY_MIGRATIONS)
+
+
+def connect_creating_database(database_url, db_name):
+    """Connect to the database, creating it first if it does not exist yet."""
     try:
-        with sync_connection.cursor() as cur:
-            create_table_sql = """
-            CREATE TABLE IF NOT EXISTS domains (
-                id SERIAL PRIMARY KEY,
-                key TEXT NOT NULL,
-                address TEXT UNIQUE NOT NULL,
-                parent INTEGER REFERENCES domains(id) ON DELETE SET NULL,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            );
-            -- Insert a default row if it doesn't exist
-            INSERT INTO domains (key, address, parent)
-            VALUES ('COMMON', 'example.com', NULL);
-            """
-            cur.execute(create_table_sql)
-            sync_connection.commit()
-            print("Table 'domains' created/verified successfully.")
-    except Exception as e:
-        print(f"Error creating domains table: {e}")
-        sync_connection.rollback()
+        return create_sync_connection(database_url)
+    except psycopg.OperationalError as e:
+        if "does not exist" not in str(e):
+            raise
+    ensure_database_exists(database_url, db_name)
+    return create_sync_connection(database_url)
 
 
 def setup_database_and_table(database_url, table_name):
     """
     Orchestrates DB and table setup, returns the live connection and table name.
+    When the schema is current this is a connection and a few catalog queries.
     """
     try:
-        ensure_database_exists(DATABASE_URL, db_name)
-        sync_connection = create_sync_connection(DATABASE_URL)
+        print("Connecting to:", database_url)
+        sync_connection = connect_creating_database(database_url, db_name)
 
-        ensure_chat_table_exists(sync_connection, table_name)
-        ensure_summaries_table_exists(sync_connection)
-        ensure_prompts_table_exists(sync_connection)
-        ensure_domains_table_exists(sync_connection)
+        migrate_conversation_schema(sync_connection)
+        migrate_primary_schema(sync_connection)
 
         return sync_connection, table_name
     except Exception as e:
@@ -195,4 +332,22 @@ def setup_database_and_table(database_url, table_name):
 # Usage — get the ready connection and table name
 sync_connection, table_name = setup_database_and_table(DATABASE_URL, table_name)
 
-check_and_insert_default_prompts(sync_connection)
\ No newline at end of file
+# Connections this process inherited open from its parent; never finalised here, because
+# libpq would send Terminate over the socket the parent is still using.
+_inherited_connections = []
+
+
+def reconnect_after_fork():
+    """
+    Give a forked worker its own shared connection and rebind every module that
+    imported ``sync_connection`` by name.  Returns the new connection.
+    """
+    global sync_connection
+    inherited = sync_connection
+    if not inherited.closed:
+        _inherited_connections.append(inherited)
+    sync_connection = create_sync_connection(DATABASE_URL)
+    for module in list(sys.modules.values()):
+        if vars(module).get("sync_connection") is inherited:
+            module.sync_connection = sync_connection
+    return sync_connection
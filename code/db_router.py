@@ -0,0 +1,165 @@
+"""
+Routing of read-only queries to an optional read replica.
+
+When DATABASE_REPLICA_URL is set, ``read_connection()`` hands out connections
+from a small replica pool.  Replication lag is sampled at most every
+REPLICA_LAG_CHECK_SECONDS; while it is above REPLICA_MAX_LAG_SECONDS, or the
+replica cannot be reached, reads fall back to the primary connection.
+
+Only use this for queries that can tolerate slightly stale data.  Anything
+that reads its own writes (the chat chain, the upserts) stays on the primary.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+from config import (
+    DATABASE_REPLICA_URL,
+    REPLICA_LAG_CHECK_SECONDS,
+    REPLICA_MAX_LAG_SECONDS,
+    REPLICA_POOL_SIZE,
+)
+from db import sync_connection
+from metrics import DB_POOL_CONNECTIONS, DB_POOL_WAIT_SECONDS, pool_stats_callback
+from query_stats import InstrumentedCursor
+
+# Pools inherited open from a parent process, kept so they are never finalised here
+_inherited_pools = []
+
+# Zero when the replica has replayed everything it received, so an idle
+# primary does not look like a lagging replica.
+_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END;
+"""
+
+
+class ReplicaRouter:
+    """Chooses between the replica pool and the primary connection for reads."""
+
+    def __init__(self, replica_url, primary_connection, max_lag_seconds=REPLICA_MAX_LAG_SECONDS,
+                 check_interval_seconds=REPLICA_LAG_CHECK_SECONDS, pool_size=REPLICA_POOL_SIZE):
+        self._replica_url = replica_url
+        self._primary = primary_connection
+        self._max_lag_seconds = max_lag_seconds
+        self._check_interval_seconds = check_interval_seconds
+        self._pool_size = pool_size
+        self._pool = None
+        self._lock = threading.Lock()
+        self._lag_seconds = None
+        self._healthy = False
+        self._checked_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def connection(self):
+        """Yield a replica connection when the replica is usable, else the primary connection."""
+        conn = self._replica_connection() if self._replica_usable() else None
+        if conn is None:
+            yield self._primary
+            return
+        try:
+            yield conn
+        finally:
+            self._pool.putconn(conn)
+
+    def status(self) -> dict:
+        return {
+            "configured": bool(self._replica_url),
+            "healthy": self._healthy,
+            "lag_seconds": self._lag_seconds,
+            "max_lag_seconds": self._max_lag_seconds,
+            "checked_at": self._checked_at or None,
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def after_fork(self, primary_connection):
+        """Use *primary_connection* and open a new replica pool on demand (in a forked worker)."""
+        if self._pool is not None and not self._pool.closed:
+            # Inherited open: its connections belong to the parent (see db.reconnect_after_fork)
+            _inherited_pools.append(self._pool)
+        self._primary = primary_connection
+        self._pool = None
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._checked_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _get_pool(self) -> ConnectionPool:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # Autocommit: plain reads, never left idle in transaction on the replica
+                    self._pool = ConnectionPool(
+                        self._replica_url,
+                        min_size=1,
+                        max_size=self._pool_size,
+                        kwargs={"autocommit": True, "cursor_factory": InstrumentedCursor},
+                        open=True,
+                        name="replica",
+                    )
+        return self._pool
+
+    def _replica_usable(self) -> bool:
+        if not self._replica_url:
+            return False
+        if time.time() - self._checked_at >= self._check_interval_seconds:
+            self._check_lag()
+        return self._healthy
+
+    def _check_lag(self):
+        with self._lock:
+            if time.time() - self._checked_at < self._check_interval_seconds:
+                return
+            self._checked_at = time.time()
+        try:
+            with self._get_pool().connection(timeout=1) as conn:
+                lag = float(conn.execute(_LAG_QUERY).fetchone()[0])
+            self._lag_seconds = round(lag, 3)
+            self._healthy = lag <= self._max_lag_seconds
+            if not self._healthy:
+                print(f"[DB_ROUTER] Replica lag {lag:.1f}s above {self._max_lag_seconds}s, reading from primary")
+        except (psycopg.Error, PoolTimeout) as e:
+            self._lag_seconds = None
+            self._healthy = False
+            print(f"[DB_ROUTER] Replica unavailable, reading from primary: {e}")
+
+    def _replica_connection(self):
+        started = time.perf_counter()
+        try:
+            conn = self._get_pool().getconn(timeout=1)
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, "replica")
+            return conn
+        except (psycopg.Error, PoolTimeout) as e:
+            self._healthy = False
+            print(f"[DB_ROUTER] Could not get a replica connection, reading from primary: {e}")
+            return None
+
+
+router = ReplicaRouter(DATABASE_REPLICA_URL, sync_connection)
+DB_POOL_CONNECTIONS.add_callback(pool_stats_callback("replica", lambda: router._pool))
+
+
+def read_connection():
+    """Context manager yielding a connection suitable for read-only queries."""
+    return router.connection()
+
+
+def replica_status() -> dict:
+    return router.status()
@@ -5,8 +5,10 @@ Public surface
 --------------
 - ``DomainRepository``  – data access layer
 - ``DomainService``     – business logic layer
+- ``OriginMatcher`` / ``OriginDirectory`` – in-memory origin → domain key matching
 - Domain-specific exceptions for use in the controller layer
 """
+from domains.matcher import OriginDirectory, OriginMatcher
 from domains.repository import DomainRepository
 from domains.service import (
     DomainService,
@@ -18,6 +20,8 @@ from domains.service import (
 __all__ = [
     "DomainRepository",
     "DomainService",
+    "OriginDirectory",
+    "OriginMatcher",
     "DomainAlreadyExistsError",
     "InvalidWebsiteURLError",
     "ParentDomainNotFoundError",
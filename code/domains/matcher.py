@@ -0,0 +1,172 @@
+"""
+In-memory origin matching for the Domains resource.
+
+``OriginMatcher`` is a trie over the registered addresses, keyed by hostname
+labels from the right (``com`` -> ``client`` -> ``shop``), so resolving an
+origin walks one node per label whatever the number of domains.  An address
+matches, most specific first:
+
+  1. exactly (``shop.client.com``);
+  2. as ``www.`` + a registered address (``www.client.com`` for ``client.com``),
+     which is why no ``www.`` rows are stored any more;
+  3. through the longest wildcard suffix: ``*.client.com`` matches any
+     sub-domain of ``client.com`` (``a.b.client.com``), not ``client.com`` itself.
+
+``OriginDirectory`` keeps a matcher of the ``domains`` table, rebuilt every
+``ttl_seconds`` by a background thread on its own connection.  Lookups only
+read the current matcher, so they never wait on the database: the ASGI app
+resolves origins on its event loop.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from domains.repository import DomainRepository
+
+WILDCARD = "*"
+
+
+class _Node:
+    __slots__ = ("children", "key", "wildcard_key")
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.key = None
+        self.wildcard_key = None
+
+
+class OriginMatcher:
+    """Reversed-label trie of ``address -> domain key`` entries."""
+
+    def __init__(self, entries=()) -> None:
+        self._root = _Node()
+        for address, key in entries:
+            self.add(address, key)
+
+    def add(self, address: str, key: str) -> None:
+        """Register *address* (``client.com`` or ``*.client.com``) for *key*."""
+        labels = address.lower().split(".")
+        wildcard = labels[0] == WILDCARD
+        if wildcard:
+            labels = labels[1:]
+        node = self._root
+        for label in reversed(labels):
+            node = node.children.setdefault(label, _Node())
+        if wildcard:
+            node.wildcard_key = key
+        else:
+            node.key = key
+
+    def match(self, hostname: str) -> Optional[str]:
+        """The domain key serving *hostname*, or ``None``."""
+        labels = hostname.lower().split(".")
+        node = self._root
+        wildcard_key = None
+        www_key = None
+        for index in range(len(labels) - 1, -1, -1):
+            if index == 0 and labels[0] == "www":
+                www_key = node.key
+            # Labels are left below this node: its wildcard covers the hostname
+            if node.wildcard_key is not None:
+                wildcard_key = node.wildcard_key
+            node = node.children.get(labels[index])
+            if node is None:
+                return www_key or wildcard_key
+        return node.key or www_key or wildcard_key
+
+
+class OriginDirectory:
+    """The ``domains`` table as an ``OriginMatcher``, reloaded every *ttl_seconds* in the background."""
+
+    def __init__(self, connect, ttl_seconds: float) -> None:
+        """*connect* opens the (autocommit) connection the table is read on."""
+        self._connect = connect
+        self._ttl_seconds = ttl_seconds
+        self._reset()
+
+    def resolve(self, address: Optional[str]) -> Optional[str]:
+        """
+        The domain key for a request *address* (``host`` or ``host:port``), or ``None``.
+
+        An address with a port matches a row registered with that port, else its host.
+        """
+        if not address:
+            return None
+        matcher = self._matcher
+        if matcher is None:
+            # First lookup in this process (normally the warm-up): nothing to serve from yet
+            matcher = self.refresh()
+        self._start_refresher()
+        key = matcher.match(address)
+        if key is None and ":" in address:
+            key = matcher.match(address.rsplit(":", 1)[0])
+        return key
+
+    def refresh(self) -> OriginMatcher:
+        """Reload the table now, blocking (off the event loop: after adding a domain, in tests)."""
+        with self._lock:
+            try:
+                if self._conn is None or self._conn.closed:
+                    self._conn = self._connect()
+                entries = DomainRepository(self._conn).list_address_keys()
+            except Exception:
+                self._close_connection()
+                raise
+            # Built aside and swapped in: concurrent lookups see the old or the new trie
+            self._matcher = OriginMatcher(entries)
+            return self._matcher
+
+    def invalidate(self) -> None:
+        """Have the background thread reload the table now instead of at the next TTL."""
+        self._wake.set()
+
+    def close(self) -> None:
+        """Stop reloading and close the connection (in the master before forking)."""
+        self._stopped = True
+        self._wake.set()
+        with self._lock:
+            self._close_connection()
+
+    def after_fork(self) -> None:
+        """Start afresh in a forked worker: the parent's thread is gone and its connection is not ours."""
+        if self._conn is not None and not self._conn.closed:
+            _inherited_connections.append(self._conn)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._conn = None
+        self._matcher = None
+        self._refresher = None
+        self._stopped = False
+
+    def _start_refresher(self) -> None:
+        if self._refresher is not None or self._stopped:
+            return
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="origin-directory", daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            self._wake.wait(self._ttl_seconds)
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the last matcher; retried at the next TTL
+                print(f"[ORIGINS] Reloading domains failed: {e}")
+
+    def _close_connection(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+
+
+# Connections inherited open from a parent process; never finalised here (see db.reconnect_after_fork)
+_inherited_connections = []
@@ -57,6 +57,12 @@ class DomainRepository:
             rows = cur.fetchall()
         return [self._to_dict(row) for row in rows]
 
+    def list_address_keys(self) -> list[tuple]:
+        """Return ``(address, key)`` for every domain, to build the origin matcher."""
+        with self._conn.cursor() as cur:
+            cur.execute("SELECT address, key FROM domains WHERE address IS NOT NULL;")
+            return cur.fetchall()
+
     # ------------------------------------------------------------------
     # Mutations
     # ------------------------------------------------------------------
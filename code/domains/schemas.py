@@ -24,7 +24,9 @@ class CreateDomainRequest(Schema):
             "description": (
                 "Full or partial website address to register. "
                 "The canonical hostname is extracted automatically – scheme, path, "
-                "query-string and a leading 'www.' are all stripped. "
+                "query-string and a leading 'www.' are all stripped, and the www. "
+                "host is served by the same record. A leading '*.' (e.g. '*.example.com') "
+                "registers every sub-domain. "
                 "The domain key is auto-generated from the hostname."
             ),
             "example": "https://www.example.com/about",
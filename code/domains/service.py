@@ -2,7 +2,8 @@
 Business / Application Logic Layer for the Domains resource.
 
 Rules enforced here:
-  - URL parsing and hostname normalisation (strip scheme, path, query, leading "www.").
+  - URL parsing and hostname normalisation (strip scheme, path, query, leading "www.");
+    a leading "*." registers a wildcard for every sub-domain.
   - Auto-generation of a domain *key* from the address when none is supplied.
   - Duplicate-address guard before hitting the DB.
   - Parent-domain existence check before creating a child domain.
@@ -99,15 +100,8 @@ class DomainService:
             )
 
         resolved_key = self._resolve_key(key, address)
-        domain = self._repo.create(key=resolved_key, address=address, parent_id=parent_id)
-
-        # Auto-create the www. variant so both bare and www hostnames are registered,
-        # sharing the same key so lookups always return the same key regardless of prefix.
-        www_address = f"www.{address}"
-        if self._repo.find_by_address(www_address) is None:
-            self._repo.create(key=resolved_key, address=www_address, parent_id=parent_id)
-
-        return domain
+        # One row: the origin matcher serves www.<address> from it (domains.matcher)
+        return self._repo.create(key=resolved_key, address=address, parent_id=parent_id)
 
     def get_domain(self, domain_id: int) -> Optional[dict]:
         """Return the domain with *domain_id*, or ``None`` if not found."""
@@ -131,6 +125,7 @@ class DomainService:
         1. Prepend ``https://`` when no scheme is present so ``urlparse`` works.
         2. Read ``parsed.hostname`` (already lowercased, port stripped).
         3. Strip a single leading ``www.`` prefix (other sub-domains are kept).
+        4. Keep a leading ``*.`` wildcard, which registers every sub-domain.
 
         Examples
         --------
@@ -138,6 +133,7 @@ class DomainService:
         ``"http://api.example.com"``             →  ``"api.example.com"``
         ``"example.com"``                         →  ``"example.com"``
         ``"www.example.co.uk/page"``              →  ``"example.co.uk"``
+        ``"*.example.com"``                       →  ``"*.example.com"``
 
         Raises
         ------
@@ -164,6 +160,12 @@ class DomainService:
                 f"Extracted hostname '{hostname}' is not a valid domain (no TLD)."
             )
 
+        labels = hostname.split(".")
+        if "*" in hostname and ("*" in labels[1:] or labels[0] != "*" or len(labels) < 3):
+            raise InvalidWebsiteURLError(
+                f"'{hostname}' is not a valid wildcard: only a leading '*.' before a domain is allowed."
+            )
+
         return hostname
 
     @staticmethod
@@ -0,0 +1,56 @@
+"""
+Production server configuration.
+
+    cd code && gunicorn app:app          # this file is picked up automatically
+
+The app is preloaded in the master (imports and migrations happen once) and
+forked into GUNICORN_WORKERS processes; each worker's connections, LLM clients,
+background executor and threads are created after the fork
+(``worker_lifecycle.after_fork``).
+
+A /chat request spends seconds waiting on the LLM and little on CPU, so each
+worker runs GUNICORN_THREADS request threads (gthread): concurrency is
+workers x threads, and the worker count only needs to cover the CPU work
+(JSON, templating, LangChain) on the available cores.
+"""
+import multiprocessing
+import os
+
+# Read by config.py when the master preloads the app
+os.environ["FORKING_SERVER"] = "True"
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+preload_app = True
+
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count() + 1)))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+# Waiting requests queue in the listen backlog rather than in a worker
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+
+# Seconds a worker may go silent before it is restarted; well above the slowest LLM call
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth; jitter so they do not all restart together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    import worker_lifecycle
+    worker_lifecycle.before_fork()
+
+
+def post_fork(server, worker):
+    import worker_lifecycle
+    worker_lifecycle.after_fork()
+    server.log.info("Worker %s: connections, LLM clients and threads ready", worker.pid)
+
+
+def worker_exit(server, worker):
+    import worker_lifecycle
+    worker_lifecycle.worker_exit()
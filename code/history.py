@@ -1,44 +1,99 @@
 from http import HTTPStatus
 import uuid
+from functools import lru_cache
 from db import sync_connection, table_name
-from langchain_postgres import PostgresChatMessageHistory
+from sharding import read_shard_connection, resolve_shard, shard_connection
 from system_prompt import get_prompt
 from config import DEFAULT_DOMAIN
+from metrics import observe_stage
+from session_token import issue_token
+
+
+@lru_cache(maxsize=None)
+def _history_class():
+    """
+    PostgresChatMessageHistory that records history load/write timings. Built on first
+    use: importing langchain_postgres pulls in its vector store and takes about a second.
+    """
+    from langchain_postgres import PostgresChatMessageHistory
+
+    class InstrumentedChatMessageHistory(PostgresChatMessageHistory):
+        def get_messages(self):
+            with observe_stage("history_load"):
+                return super().get_messages()
+
+        def add_messages(self, messages):
+            with observe_stage("history_write"):
+                super().add_messages(messages)
+
+        async def aget_messages(self):
+            with observe_stage("history_load"):
+                return await super().aget_messages()
+
+        async def aadd_messages(self, messages):
+            with observe_stage("history_write"):
+                await super().aadd_messages(messages)
+
+    return InstrumentedChatMessageHistory
 
 
 # Database setup 
-def get_session_history(session_id):
-    return PostgresChatMessageHistory(
+def get_session_history(session_id, connection=None):
+    return _history_class()(
         table_name,
         session_id,
-        sync_connection=sync_connection
+        sync_connection=connection or sync_connection
     )
 
+def get_async_session_history(session_id, connection):
+    """History of *session_id* on an AsyncConnection (``aget_messages`` / ``aadd_messages``)."""
+    return _history_class()(table_name, session_id, async_connection=connection)
+
 def _message_mapping(history):
-    messages = []
-    for msg in history.messages:
-        messages.append({
+    return _message_dicts(history.messages)
+
+def _history_body(session_id, messages, domain, request_type) -> dict:
+    body = {
+        "session_id": session_id,
+        "history": messages
+    }
+    session_token = issue_token(session_id, domain, request_type)
+    if session_token:
+        body["session_token"] = session_token
+    return body
+
+
+def _message_dicts(messages):
+    mapped = []
+    for msg in messages:
+        mapped.append({
             "type": msg.type,   # "human" or "ai"
             "content": msg.content
         })
-    return messages
+    return mapped
 
-def get_history(session_id: str, domain):
-    """Retrieve chat history for a session_id as a list of dicts."""
+def get_history(session_id: str, domain, request_type="sales"):
+    """
+    Retrieve chat history for a session_id as a list of dicts, with a session token
+    for /chat binding the session, domain and request type when tokens are enabled.
+    """
     try:
-        history = get_session_history(session_id)
+        shard = resolve_shard(domain)
+        # Existing sessions are read from the replica when one is available
+        with read_shard_connection(shard) as conn:
+            messages = _message_mapping(get_session_history(session_id, conn))
         status = HTTPStatus.OK
-        if not history.messages:
-            # session exists
-            first_message = get_prompt(domain, "sales", "intro-message")
-            history.add_ai_message(first_message)
-            status = HTTPStatus.CREATED
-        messages = _message_mapping(history)
+        if not messages:
+            # Confirm on the primary before writing, a lagging replica may not have the session yet
+            with shard_connection(shard) as conn:
+                history = get_session_history(session_id, conn)
+                if not history.messages:
+                    first_message = get_prompt(domain, "sales", "intro-message")
+                    history.add_ai_message(first_message)
+                    status = HTTPStatus.CREATED
+                messages = _message_mapping(history)
 
-        return {
-            "session_id": session_id,
-            "history": messages
-        }, status
+        return _history_body(session_id, messages, domain, request_type), status
     except Exception as e:
         print(f"[get_history Error] {e}")
         return {
@@ -46,3 +101,31 @@ def get_history(session_id: str, domain):
             "session_id": session_id
         }, HTTPStatus.INTERNAL_SERVER_ERROR
 
+
+async def aget_history(session_id: str, domain, request_type="sales"):
+    """Async ``get_history`` for the ASGI app, on the shard's async pool."""
+    from langchain_core.messages import AIMessage
+    from async_db import async_shard_connection
+    from system_prompt import aget_prompt
+
+    try:
+        shard = resolve_shard(domain)
+        status = HTTPStatus.OK
+        # One pooled connection at a time: never hold one while waiting for another
+        async with async_shard_connection(shard) as conn:
+            messages = await get_async_session_history(session_id, conn).aget_messages()
+        if not messages:
+            async with async_shard_connection() as conn:
+                first_message = await aget_prompt(conn, domain, "sales", "intro-message")
+            messages = [AIMessage(content=first_message)]
+            async with async_shard_connection(shard) as conn:
+                await get_async_session_history(session_id, conn).aadd_messages(messages)
+            status = HTTPStatus.CREATED
+
+        return _history_body(session_id, _message_dicts(messages), domain, request_type), status
+    except Exception as e:
+        print(f"[get_history Error] {e}")
+        return {
+            "error": "Network issue loading history.",
+            "session_id": session_id
+        }, HTTPStatus.INTERNAL_SERVER_ERROR
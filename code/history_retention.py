@@ -0,0 +1,318 @@
+"""
+Monthly range partitioning and retention for the LangChain chat history table.
+
+The history table is partitioned on ``created_at`` with one partition per
+month, named ``<table>_pYYYYMM``, plus a DEFAULT partition that catches rows
+outside the pre-created range.  Partitions older than the retention window are
+exported to gzip NDJSON files and then detached and dropped, so index size and
+vacuum cost stay bounded by the window instead of growing forever.
+
+Upcoming partitions are created by the same background loop even when
+archival is off (CHAT_RETENTION_ENABLED); rows that reached DEFAULT while their
+month had no partition are moved into it when it is created.
+
+Usage
+-----
+    python history_retention.py migrate   # convert an existing plain table (maintenance window)
+    python history_retention.py run       # create upcoming partitions and archive expired ones
+"""
+import gzip
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg
+from psycopg import sql
+
+from config import (
+    CHAT_ARCHIVE_DIR,
+    CHAT_PARTITION_MONTHS_AHEAD,
+    CHAT_RETENTION_INTERVAL_SECONDS,
+    CHAT_RETENTION_MONTHS,
+    DATABASE_URL,
+    SHARD_DATABASE_URLS,
+    table_name,
+)
+from metrics import CHAT_PARTITION_FAILURES
+
+_retention_thread = None
+
+
+# ---------------------------------------------------------------------------
+# Naming helpers
+# ---------------------------------------------------------------------------
+
+def month_start(value: datetime, offset: int = 0) -> datetime:
+    """Return the first instant (UTC) of the month *offset* months from *value*."""
+    index = value.year * 12 + value.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table_name: str, start: datetime) -> str:
+    return f"{table_name}_p{start:%Y%m}"
+
+
+def _partition_month(table_name: str, name: str):
+    """Return the month a partition covers, or None for partitions outside the naming scheme."""
+    match = re.fullmatch(rf"{re.escape(table_name)}_p(\d{{4}})(\d{{2}})", name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+
+def table_kind(conn, table_name: str):
+    """Return 'p' for a partitioned table, 'r' for a plain table, None if it does not exist."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s);", (table_name,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def create_partitioned_chat_table(conn, table_name: str):
+    """
+    Create the history table partitioned by month, with the columns LangChain expects.
+    The id sequence is named like the one SERIAL would create, so a migrated
+    table keeps counting from where it was. The caller commits.
+    """
+    table = sql.Identifier(table_name)
+    sequence = f"{table_name}_id_seq"
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("CREATE SEQUENCE IF NOT EXISTS {};").format(sql.Identifier(sequence)))
+        cur.execute(sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER NOT NULL DEFAULT nextval({sequence}::regclass),
+                session_id UUID NOT NULL,
+                message JSONB NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at);
+        """).format(table=table, sequence=sql.Literal(sequence)))
+        cur.execute(sql.SQL("ALTER SEQUENCE {} OWNED BY {}.id;").format(sql.Identifier(sequence), table))
+        # History is read with WHERE session_id = ... ORDER BY id
+        cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} (session_id, id);").format(
+            sql.Identifier(f"idx_{table_name}_session_id"), table))
+        cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} DEFAULT;").format(
+            sql.Identifier(f"{table_name}_default"), table))
+
+
+def ensure_partitions(conn, table_name: str, months_ahead: int = CHAT_PARTITION_MONTHS_AHEAD, now=None):
+    """Create partitions for the current month and *months_ahead* months after it."""
+    now = now or datetime.now(timezone.utc)
+    months = [month_start(now, offset) for offset in range(months_ahead + 1)]
+    # One catalog query for all months: this runs on every worker start
+    with conn.cursor() as cur:
+        cur.execute("SELECT name FROM unnest(%s::text[]) AS name WHERE to_regclass(name) IS NOT NULL;",
+                    ([partition_name(table_name, start) for start in months],))
+        existing = {row[0] for row in cur.fetchall()}
+    created = []
+    for start in months:
+        name = partition_name(table_name, start)
+        if name in existing:
+            continue
+        try:
+            moved = _create_partition(conn, table_name, name, start)
+            conn.commit()
+            created.append(name)
+            if moved:
+                print(f"[RETENTION] Moved {moved} rows from the DEFAULT partition into {name}")
+        except psycopg.errors.InvalidObjectDefinition as e:
+            # Overlaps an existing partition: the month is covered by a migrated legacy table
+            conn.rollback()
+            print(f"[RETENTION] Not creating partition {name}: {e}")
+        except psycopg.Error as e:
+            conn.rollback()
+            CHAT_PARTITION_FAILURES.inc()
+            print(f"[RETENTION] ERROR: could not create partition {name}, its rows stay in DEFAULT: {e}")
+    return created
+
+
+def _create_partition(conn, table_name: str, name: str, start: datetime) -> int:
+    """
+    Create the partition for the month at *start*. Rows of that month already in
+    the DEFAULT partition (written while the partition was missing) are moved
+    into it in the same transaction. Returns the number of moved rows; the
+    caller commits.
+    """
+    table = sql.Identifier(table_name)
+    default = sql.Identifier(f"{table_name}_default")
+    bounds = (start, month_start(start, 1))
+    with conn.cursor() as cur:
+        # Writes that would land in DEFAULT wait until its rows for the month have moved
+        cur.execute(sql.SQL("LOCK TABLE {} IN SHARE ROW EXCLUSIVE MODE;").format(default))
+        cur.execute(sql.SQL("CREATE TEMP TABLE moved_history (LIKE {}) ON COMMIT DROP;").format(table))
+        cur.execute(sql.SQL("""
+            WITH moved AS (DELETE FROM {} WHERE created_at >= %s AND created_at < %s RETURNING *)
+            INSERT INTO moved_history SELECT * FROM moved;
+        """).format(default), bounds)
+        moved = cur.rowcount
+        cur.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ({}) TO ({});").format(
+            sql.Identifier(name), table, sql.Literal(bounds[0]), sql.Literal(bounds[1])))
+        if moved:
+            cur.execute(sql.SQL("INSERT INTO {} SELECT * FROM moved_history;").format(table))
+    return moved
+
+
+def list_partitions(conn, table_name: str) -> list[str]:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname;
+        """, (table_name,))
+        return [row[0] for row in cur.fetchall()]
+
+
+# ---------------------------------------------------------------------------
+# Retention
+# ---------------------------------------------------------------------------
+
+def archive_partition(conn, table_name: str, partition: str, archive_dir: str = CHAT_ARCHIVE_DIR) -> int:
+    """
+    Export *partition* to ``<archive_dir>/<partition>.ndjson.gz`` (one JSON row per line),
+    then detach and drop it. Returns the number of archived rows.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{partition}.ndjson.gz")
+    tmp_path = f"{path}.tmp"
+    rows = 0
+    try:
+        # Server-side cursor so a large month is streamed rather than loaded into memory
+        with conn.cursor(name=f"archive_{partition}") as cur, gzip.open(tmp_path, "wt", encoding="utf-8") as out:
+            cur.itersize = 5000
+            cur.execute(sql.SQL("SELECT row_to_json(t)::text FROM {} t ORDER BY id;").format(sql.Identifier(partition)))
+            for (line,) in cur:
+                out.write(line)
+                out.write("\n")
+                rows += 1
+        os.replace(tmp_path, path)
+
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {};").format(
+                sql.Identifier(table_name), sql.Identifier(partition)))
+            cur.execute(sql.SQL("DROP TABLE {};").format(sql.Identifier(partition)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    print(f"[RETENTION] Archived {rows} rows from {partition} to {path}")
+    return rows
+
+
+def apply_retention(conn, table_name: str = table_name, retention_months: int = CHAT_RETENTION_MONTHS,
+                    archive_dir: str = CHAT_ARCHIVE_DIR, now=None) -> list[str]:
+    """
+    Create upcoming partitions and archive every monthly partition that ends
+    before the retention cutoff. Returns the names of archived partitions.
+    """
+    if table_kind(conn, table_name) != "p":
+        print(f"[RETENTION] Table '{table_name}' is not partitioned; run 'python history_retention.py migrate' first.")
+        return []
+
+    now = now or datetime.now(timezone.utc)
+    ensure_partitions(conn, table_name, now=now)
+
+    cutoff = month_start(now, -retention_months)
+    archived = []
+    for partition in list_partitions(conn, table_name):
+        start = _partition_month(table_name, partition)
+        if start is not None and month_start(start, 1) <= cutoff:
+            archive_partition(conn, table_name, partition, archive_dir)
+            archived.append(partition)
+    return archived
+
+
+def run_retention_once(archive: bool = True):
+    """
+    Run one maintenance pass on the primary and every shard, each on a dedicated
+    connection: create upcoming partitions and, with *archive*, archive expired ones.
+    """
+    archived = []
+    for database_url in [DATABASE_URL, *SHARD_DATABASE_URLS.values()]:
+        with psycopg.connect(database_url) as conn:
+            if archive:
+                archived.extend(apply_retention(conn))
+            elif table_kind(conn, table_name) == "p":
+                ensure_partitions(conn, table_name)
+    return archived
+
+
+def start_retention_worker(interval_seconds: int = CHAT_RETENTION_INTERVAL_SECONDS, archive: bool = True):
+    """Start the background partition maintenance loop (once per process); *archive* also archives expired months."""
+    global _retention_thread
+    if _retention_thread is not None and _retention_thread.is_alive():
+        return _retention_thread
+
+    def loop():
+        while True:
+            try:
+                run_retention_once(archive)
+            except Exception as e:
+                print(f"[RETENTION] Retention pass failed: {e}")
+            time.sleep(interval_seconds)
+
+    _retention_thread = threading.Thread(target=loop, name="history-retention", daemon=True)
+    _retention_thread.start()
+    return _retention_thread
+
+
+# ---------------------------------------------------------------------------
+# Migration of an existing, unpartitioned table
+# ---------------------------------------------------------------------------
+
+def migrate_to_partitioned(conn, table_name: str = table_name, now=None):
+    """
+    Convert a plain history table into the partitioned layout.
+
+    The old table is renamed and attached as the partition for everything up
+    to the end of the current month, so it is archived as a whole once that
+    month leaves the retention window. Attaching scans the old table once and
+    blocks chat writes while it runs: use a maintenance window.
+    """
+    if table_kind(conn, table_name) != "r":
+        print(f"[RETENTION] Table '{table_name}' is missing or already partitioned; nothing to migrate.")
+        return None
+
+    now = now or datetime.now(timezone.utc)
+    legacy = partition_name(table_name, month_start(now))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {};").format(sql.Identifier(table_name), sql.Identifier(legacy)))
+            # Both are superseded by the partitioned (id, created_at) key and (session_id, id) index built on attach
+            cur.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT IF EXISTS {};").format(
+                sql.Identifier(legacy), sql.Identifier(f"{table_name}_pkey")))
+            cur.execute(sql.SQL("DROP INDEX IF EXISTS {};").format(sql.Identifier(f"idx_{table_name}_session_id")))
+        create_partitioned_chat_table(conn, table_name)
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (MINVALUE) TO ({});").format(
+                sql.Identifier(table_name), sql.Identifier(legacy), sql.Literal(month_start(now, 1))))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    ensure_partitions(conn, table_name, now=now)
+    print(f"[RETENTION] Migrated '{table_name}' to a partitioned table; existing rows live in {legacy}.")
+    return legacy
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if command == "migrate":
+        with psycopg.connect(DATABASE_URL) as connection:
+            migrate_to_partitioned(connection)
+    elif command == "run":
+        print(f"[RETENTION] Archived partitions: {run_retention_once()}")
+    else:
+        sys.exit("usage: python history_retention.py [migrate|run]")
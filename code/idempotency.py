@@ -0,0 +1,229 @@
+"""
+Idempotency keys for ``POST /chat``.
+
+A widget retrying a timed-out ``/chat`` sends the same ``Idempotency-Key``
+header.  The first request with a key (per session) computes the reply;
+duplicates arriving while it runs wait for it, and later ones get the stored
+reply back with ``Idempotent-Replayed: true``: no second LLM call, history
+write or lead extraction.
+
+Keys live in the primary database (``chat_idempotency``), so a retry that the
+load balancer sends to another worker is deduplicated too:
+
+* a key reused with a different message is refused (422);
+* a duplicate still waiting after IDEMPOTENCY_WAIT_SECONDS gets a 409;
+* only successful replies are stored: a failed request releases its key, so
+  the retry computes again;
+* keys are forgotten after IDEMPOTENCY_TTL_SECONDS, and a claim left
+  unfinished by a dead worker is taken over after IDEMPOTENCY_LOCK_SECONDS.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from http import HTTPStatus
+
+import psycopg
+from psycopg.types.json import Jsonb
+
+from config import IDEMPOTENCY_LOCK_SECONDS, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_WAIT_SECONDS
+from metrics import IDEMPOTENT_REQUESTS
+from sharding import shard_connection
+
+# Waiting duplicates poll the key, backing off from the first to the second delay
+_POLL_SECONDS = (0.05, 0.5)
+
+# Insert the key, or take over one that expired or whose claim was abandoned; returns a row when claimed
+_CLAIM = """
+    INSERT INTO chat_idempotency (session_id, idempotency_key, fingerprint)
+    VALUES (%(session_id)s, %(key)s, %(fingerprint)s)
+    ON CONFLICT (session_id, idempotency_key) DO UPDATE
+    SET fingerprint = EXCLUDED.fingerprint, status_code = NULL, response = NULL, created_at = now()
+    WHERE chat_idempotency.created_at < now() - make_interval(secs => %(ttl)s)
+       OR (chat_idempotency.status_code IS NULL
+           AND chat_idempotency.created_at < now() - make_interval(secs => %(lock)s))
+    RETURNING 1;
+"""
+_FIND = """
+    SELECT fingerprint, status_code, response FROM chat_idempotency
+    WHERE session_id = %s AND idempotency_key = %s;
+"""
+_COMPLETE = """
+    UPDATE chat_idempotency SET status_code = %s, response = %s
+    WHERE session_id = %s AND idempotency_key = %s;
+"""
+_RELEASE = "DELETE FROM chat_idempotency WHERE session_id = %s AND idempotency_key = %s;"
+_PURGE_EXPIRED = "DELETE FROM chat_idempotency WHERE created_at < now() - make_interval(secs => %s);"
+
+_CLAIMED = "claimed"
+
+_last_purge = 0.0
+
+
+def request_fingerprint(input_text: str, request_type: str) -> str:
+    """Hash of the message a key is used with, to refuse reuse for another message."""
+    payload = json.dumps({"input": input_text.strip(), "request_type": request_type}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def run_once(session_id, key, fingerprint, compute):
+    """
+    ``compute()`` -> (body, status) once per (*session_id*, *key*).
+
+    Returns (body, status, replayed); duplicates wait for the first request's
+    result or get it from the store.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    delay = _POLL_SECONDS[0]
+    while True:
+        with shard_connection() as conn:
+            state = _claim(conn, session_id, key, fingerprint)
+        if state == _CLAIMED:
+            break
+        result = _settled(state, fingerprint)
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            return _still_running()
+        if state is not None:
+            time.sleep(delay)
+            delay = min(delay * 2, _POLL_SECONDS[1])
+
+    IDEMPOTENT_REQUESTS.inc("computed")
+    try:
+        body, status = compute()
+    except BaseException:
+        with shard_connection() as conn:
+            _finish(conn, session_id, key, None, None)
+        raise
+    with shard_connection() as conn:
+        _finish(conn, session_id, key, body, status)
+    return body, status, False
+
+
+async def arun_once(session_id, key, fingerprint, acompute):
+    """``run_once`` for the ASGI app: ``await acompute()``, key state on the async pool."""
+    from async_db import async_shard_connection
+
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    delay = _POLL_SECONDS[0]
+    while True:
+        async with async_shard_connection() as conn:
+            state = await _aclaim(conn, session_id, key, fingerprint)
+        if state == _CLAIMED:
+            break
+        result = _settled(state, fingerprint)
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            return _still_running()
+        if state is not None:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _POLL_SECONDS[1])
+
+    IDEMPOTENT_REQUESTS.inc("computed")
+    try:
+        body, status = await acompute()
+    except BaseException:
+        async with async_shard_connection() as conn:
+            await _afinish(conn, session_id, key, None, None)
+        raise
+    async with async_shard_connection() as conn:
+        await _afinish(conn, session_id, key, body, status)
+    return body, status, False
+
+
+def _claim(conn, session_id, key, fingerprint):
+    """_CLAIMED, the key's (fingerprint, status_code, response), or None if it was just released."""
+    try:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(_CLAIM, _claim_params(session_id, key, fingerprint))
+            if cur.fetchone():
+                if _purge_due():
+                    cur.execute(_PURGE_EXPIRED, (IDEMPOTENCY_TTL_SECONDS,))
+                state = _CLAIMED
+            else:
+                cur.execute(_FIND, (session_id, key))
+                state = cur.fetchone()
+        conn.commit()
+        return state
+    except psycopg.Error:
+        # Leave the shared connection usable for the next request
+        conn.rollback()
+        raise
+
+
+async def _aclaim(conn, session_id, key, fingerprint):
+    try:
+        cur = await conn.execute(_CLAIM, _claim_params(session_id, key, fingerprint))
+        if await cur.fetchone():
+            if _purge_due():
+                await conn.execute(_PURGE_EXPIRED, (IDEMPOTENCY_TTL_SECONDS,))
+            return _CLAIMED
+        cur = await conn.execute(_FIND, (session_id, key))
+        return await cur.fetchone()
+    except psycopg.Error:
+        await conn.rollback()
+        raise
+
+
+def _finish(conn, session_id, key, body, status):
+    try:
+        conn.rollback()
+        with conn.cursor() as cur:
+            if status == HTTPStatus.OK:
+                cur.execute(_COMPLETE, (status, Jsonb(body), session_id, key))
+            else:
+                cur.execute(_RELEASE, (session_id, key))
+        conn.commit()
+    except psycopg.Error:
+        conn.rollback()
+        raise
+
+
+async def _afinish(conn, session_id, key, body, status):
+    try:
+        if status == HTTPStatus.OK:
+            await conn.execute(_COMPLETE, (status, Jsonb(body), session_id, key))
+        else:
+            await conn.execute(_RELEASE, (session_id, key))
+    except psycopg.Error:
+        await conn.rollback()
+        raise
+
+
+def _claim_params(session_id, key, fingerprint) -> dict:
+    return {"session_id": session_id, "key": key, "fingerprint": fingerprint,
+            "ttl": IDEMPOTENCY_TTL_SECONDS, "lock": IDEMPOTENCY_LOCK_SECONDS}
+
+
+def _settled(state, fingerprint):
+    """The response for a key another request holds, or None while it is still running."""
+    if state is None:
+        # Released by a failed first request: claim it again
+        return None
+    stored_fingerprint, status_code, response = state
+    if stored_fingerprint != fingerprint:
+        IDEMPOTENT_REQUESTS.inc("mismatch")
+        return ({"success": False, "error": "This Idempotency-Key was already used for a different message."},
+                HTTPStatus.UNPROCESSABLE_ENTITY, False)
+    if status_code is None:
+        return None
+    IDEMPOTENT_REQUESTS.inc("replayed")
+    return response, status_code, True
+
+
+def _still_running():
+    IDEMPOTENT_REQUESTS.inc("timeout")
+    return ({"success": False, "error": "This message is still being answered, please retry shortly."},
+            HTTPStatus.CONFLICT, False)
+
+
+def _purge_due() -> bool:
+    """Whether a new claim should delete expired keys too: at most once per TTL per process."""
+    global _last_purge
+    if time.monotonic() - _last_purge < IDEMPOTENCY_TTL_SECONDS:
+        return False
+    _last_purge = time.monotonic()
+    return True
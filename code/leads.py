@@ -1,31 +1,37 @@
 from typing import List, Dict, Any, Tuple
 from psycopg.rows import dict_row
-from db import sync_connection  
+from sharding import read_shard_connection, router
 from http import HTTPStatus
 
 def get_all_chat_info() -> Tuple[List[Dict[str, Any]], HTTPStatus]:
     """
-    Retrieve all stored chat info records.
+    Retrieve all stored chat info records from every shard, newest first
+    (the primary shard is served from the read replica when available).
     """
     try:
-        with sync_connection.cursor(row_factory=dict_row) as cur:
-            cur.execute("""
-                SELECT 
-                    session_id,
-                    COALESCE(contact_name, '') as name,
-                    COALESCE(email, '') as email,
-                    COALESCE(mobile, '') as mobile_number,
-                    COALESCE(country, '') as country,
-                    COALESCE(status, 'OPEN') as status,
-                    COALESCE(remarks, '') as remarks,
-                    COALESCE(domain) as domain,
-                    COALESCE(created_at) as time                        
-                FROM chat_info
-                WHERE is_active is TRUE
-                ORDER BY created_at DESC;
-            """)
-            records = cur.fetchall()
+        records = []
+        shards = router.all_shards()
+        for shard in shards:
+            with read_shard_connection(shard) as conn, conn.cursor(row_factory=dict_row) as cur:
+                cur.execute("""
+                    SELECT 
+                        session_id,
+                        COALESCE(contact_name, '') as name,
+                        COALESCE(email, '') as email,
+                        COALESCE(mobile, '') as mobile_number,
+                        COALESCE(country, '') as country,
+                        COALESCE(status, 'OPEN') as status,
+                        COALESCE(remarks, '') as remarks,
+                        COALESCE(domain) as domain,
+                        COALESCE(created_at) as time                        
+                    FROM chat_info
+                    WHERE is_active is TRUE
+                    ORDER BY created_at DESC;
+                """)
+                records.extend(cur.fetchall())
 
+        if len(shards) > 1:
+            records.sort(key=lambda record: record["time"], reverse=True)
         return records, HTTPStatus.OK
 
     except Exception as e:
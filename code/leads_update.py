@@ -1,13 +1,21 @@
-from db import sync_connection
+from sharding import each_shard_connection
 
 def update_contact_info(session_id: str, name: str = None, email: str = None, mobile: str = None, country: str = None):
     """
     Update contact details (name, email, mobile, country) for a session in chat_info.
+    The session may live on any shard, so each shard is updated in turn.
     """
+    updated = False
+    for conn in each_shard_connection():
+        updated = _update_contact_info(conn, session_id, name, email, mobile, country) or updated
+    return updated
+
+
+def _update_contact_info(conn, session_id, name, email, mobile, country):
     try:
-        sync_connection.rollback()
+        conn.rollback()
 
-        with sync_connection.cursor() as cur:
+        with conn.cursor() as cur:
             update_query = """
                 UPDATE chat_info
                 SET
@@ -21,7 +29,7 @@ def update_contact_info(session_id: str, name: str = None, email: str = None, mo
 
             cur.execute(update_query, (name, email, mobile, country, session_id))
             updated_row = cur.fetchone()
-            sync_connection.commit()
+            conn.commit()
 
             updates = []
             if name:    updates.append(f"name='{name}'")
@@ -33,7 +41,7 @@ def update_contact_info(session_id: str, name: str = None, email: str = None, mo
             return bool(updated_row)
 
     except Exception as e:
-        sync_connection.rollback()
+        conn.rollback()
         print(f"[DATABASE ERROR] Failed to update contact for {session_id}: {str(e)}")
         raise
 
@@ -41,17 +49,30 @@ def update_contact_info(session_id: str, name: str = None, email: str = None, mo
 def update_chat_info(session_id: str, status: str = None, remarks: str = None, is_active: bool = None):
     """
     Insert or update a row in chat_info and return the updated row.
+    The session may live on any shard, so each shard is updated in turn.
     """
+    updated = False
+    for conn in each_shard_connection():
+        updated = _update_chat_info(conn, session_id, status, remarks, is_active) or updated
+    return updated
+
+
+def _update_chat_info(conn, session_id, status, remarks, is_active):
     try:
-        sync_connection.rollback()
+        conn.rollback()
         
-        with sync_connection.cursor() as cur:
+        with conn.cursor() as cur:
             update_query = """
                 UPDATE chat_info 
                 SET
                     status = COALESCE(%s, status),
                     remarks = COALESCE(%s, remarks),
-                    is_active = COALESCE(%s, is_active)
+                    is_active = COALESCE(%s, is_active),
+                    deactivated_at = CASE
+                        WHEN %s::boolean IS FALSE AND is_active IS NOT FALSE THEN now()
+                        WHEN %s::boolean IS TRUE THEN NULL
+                        ELSE deactivated_at
+                    END
                 WHERE session_id = %s
                 RETURNING *;
             """
@@ -60,11 +81,13 @@ def update_chat_info(session_id: str, status: str = None, remarks: str = None, i
                 status,
                 remarks,
                 is_active,
+                is_active,
+                is_active,
                 session_id
             ))
 
             updated_row = cur.fetchone() 
-            sync_connection.commit()            
+            conn.commit()            
             
             # Log what was updated
             updates = []
@@ -77,6 +100,54 @@ def update_chat_info(session_id: str, status: str = None, remarks: str = None, i
 
     
     except Exception as e:
-        sync_connection.rollback()
+        conn.rollback()
         print(f"[DATABASE ERROR] Failed to update lead for {session_id}: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def bulk_update_chat_info(updates):
+    """
+    Apply status/remarks/is_active changes to many leads in a single UPDATE ... FROM (VALUES ...).
+    `updates` is a list of (session_id, status, remarks, is_active) tuples, already validated.
+    Returns the session_ids that matched an existing row, across all shards.
+    """
+    if not updates:
+        return []
+    updated_session_ids = []
+    for conn in each_shard_connection():
+        updated_session_ids.extend(_bulk_update_chat_info(conn, updates))
+    return updated_session_ids
+
+
+def _bulk_update_chat_info(conn, updates):
+    try:
+        conn.rollback()
+
+        with conn.cursor() as cur:
+            values_sql = ", ".join(["(%s::text, %s::text, %s::text, %s::boolean)"] * len(updates))
+            update_query = f"""
+                UPDATE chat_info AS c
+                SET
+                    status = COALESCE(v.status, c.status),
+                    remarks = COALESCE(v.remarks, c.remarks),
+                    is_active = COALESCE(v.is_active, c.is_active),
+                    deactivated_at = CASE
+                        WHEN v.is_active IS FALSE AND c.is_active IS NOT FALSE THEN now()
+                        WHEN v.is_active IS TRUE THEN NULL
+                        ELSE c.deactivated_at
+                    END
+                FROM (VALUES {values_sql}) AS v(session_id, status, remarks, is_active)
+                WHERE c.session_id = v.session_id
+                RETURNING c.session_id;
+            """
+
+            cur.execute(update_query, [value for row in updates for value in row])
+            updated_session_ids = [row[0] for row in cur.fetchall()]
+            conn.commit()
+
+            print(f"[DATABASE] Bulk info update: {len(updated_session_ids)}/{len(updates)} sessions updated")
+            return updated_session_ids
+
+    except Exception as e:
+        conn.rollback()
+        print(f"[DATABASE ERROR] Failed to bulk update {len(updates)} leads: {str(e)}")
+        raise
@@ -1,14 +1,69 @@
+import threading
 from concurrent.futures import ThreadPoolExecutor
-from langchain_groq import ChatGroq
-from config import GROQ_API_KEY, GROQ_MODEL_NAME, agent_type
+from config import BACKGROUND_WORKER_THREADS, agent_type
+from llm_backend import get_chat_model
 from system_prompt import get_prompt
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from conversation_processor.conversation_processor import process_conversation
 from history import get_session_history
+from metrics import BACKGROUND_QUEUE_DEPTH, LLMMetricsCallback
+from tracing import LLMTracingCallback, bind_request_id, current_request_id, current_span, start_span
+from sharding import resolve_shard, shard_connection
+
+# Conversation-processing jobs submitted and not yet finished (background_queue_depth)
+_pending_lock = threading.Lock()
+_pending_conversations = 0
+
+
+def _pending_conversation_jobs() -> dict:
+    return {("conversation",): _pending_conversations}
+
+
+BACKGROUND_QUEUE_DEPTH.add_callback(_pending_conversation_jobs)
+
+
+def _track_pending(delta: int):
+    global _pending_conversations
+    with _pending_lock:
+        _pending_conversations += delta
+
+
+# Per-process pool running conversation processing after the reply has been returned
+_executor_lock = threading.Lock()
+_executor = None
+
+
+def background_executor() -> ThreadPoolExecutor:
+    """This process's conversation-processing pool (created on first use)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKER_THREADS,
+                                               thread_name_prefix="conversation")
+    return _executor
+
+
+def drain_background_jobs():
+    """Wait for submitted conversation processing to finish (worker shutdown, tests)."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def reset_background_executor_after_fork():
+    """Forget the parent's pool in a forked worker: its threads do not exist here."""
+    global _executor, _executor_lock, _pending_lock, _pending_conversations
+    _executor_lock = threading.Lock()
+    _pending_lock = threading.Lock()
+    _executor = None
+    _pending_conversations = 0
 
 
 def get_groq_response(input_text, session_id, request_type, domain):
+    # Imported on first use: LangChain's runnables take a large part of app start-up
+    from langchain_core.runnables.history import RunnableWithMessageHistory
     
     # Choose prompt based on request type & domain
     prompt_type = "system"
@@ -16,11 +71,7 @@ def get_groq_response(input_text, session_id, request_type, domain):
 
     
     # Rest of your existing code...
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "{system}"),
-        MessagesPlaceholder(variable_name="history"),
-        ("human", "{input}")
-    ])
+    prompt = _chat_prompt()
 
 
     """
@@ -33,30 +84,33 @@ def get_groq_response(input_text, session_id, request_type, domain):
     """
 
 
-    # Create the LLM
-    llm = ChatGroq(groq_api_key=GROQ_API_KEY, model=GROQ_MODEL_NAME)
+    # Shared LLM of the configured backend (LLM_BACKEND)
+    llm = get_chat_model("chat")
     # Create the chain
     chain = prompt | llm
     
-    # Wrap the chain with message history
-    chain_with_history = RunnableWithMessageHistory(
-        chain,
-        get_session_history,
-        input_messages_key="input",
-        history_messages_key="history",
-    )
-    
-    # Configure the session
-    config = {"configurable": {"session_id": session_id}}
-    
-    # Get response with history
-    response = chain_with_history.invoke(
-        {
-            "input": input_text,
-            "system": system_prompt
-        },
-        config=config
-    )
+    # History lives on the domain's shard (resolved once per request)
+    shard = resolve_shard(domain)
+    with shard_connection(shard) as connection:
+        # Wrap the chain with message history
+        chain_with_history = RunnableWithMessageHistory(
+            chain,
+            lambda history_session_id: get_session_history(history_session_id, connection),
+            input_messages_key="input",
+            history_messages_key="history",
+        )
+
+        # Configure the session
+        config = {"configurable": {"session_id": session_id}, "callbacks": [LLMMetricsCallback("chat"), LLMTracingCallback("chat")]}
+
+        # Get response with history
+        response = chain_with_history.invoke(
+            {
+                "input": input_text,
+                "system": system_prompt
+            },
+            config=config
+        )
 
 
     bot_response = response.content
@@ -64,7 +118,7 @@ def get_groq_response(input_text, session_id, request_type, domain):
 
     # Handle conversation processing
     # Process conversation asynchronously to avoid blocking the response
-    _process_conversation_async(input_text, session_id, request_type, domain)
+    _process_conversation_async(input_text, session_id, request_type, domain, shard)
 
 
 
@@ -72,15 +126,102 @@ def get_groq_response(input_text, session_id, request_type, domain):
 
 
 
-def _process_conversation_async(input_text, session_id, request_type, domain):
-    """Process conversation asynchronously using ThreadPoolExecutor."""
+async def aget_groq_response(input_text, session_id, request_type, domain):
+    """
+    Async ``get_groq_response`` for the ASGI app (``ainvoke`` on the LLM).
+
+    The prompt and history are read, and the new turn written, on the async pools in
+    short steps, so no database connection is held while waiting for the LLM.
+    """
+    system_prompt, history, shard = await _aload_chat_context(session_id, request_type, domain)
+
+    chain = _chat_prompt() | get_chat_model("chat")
+    response = await chain.ainvoke({"input": input_text, "system": system_prompt, "history": history},
+                                   config=_chat_callbacks())
+
+    await _asave_turn(input_text, session_id, request_type, domain, shard, response)
+    return response.content
+
+
+async def astream_groq_response(input_text, session_id, request_type, domain):
+    """
+    Streaming ``aget_groq_response``: yields the reply's text as the LLM produces it.
+
+    The turn is stored once the reply is complete; a stream closed early stores nothing.
+    """
+    from langchain_core.messages import message_chunk_to_message
+
+    system_prompt, history, shard = await _aload_chat_context(session_id, request_type, domain)
+
+    chain = _chat_prompt() | get_chat_model("chat")
+    reply = None
+    async for chunk in chain.astream({"input": input_text, "system": system_prompt, "history": history},
+                                     config=_chat_callbacks()):
+        reply = chunk if reply is None else reply + chunk
+        if chunk.content:
+            yield chunk.content
+
+    await _asave_turn(input_text, session_id, request_type, domain, shard, message_chunk_to_message(reply))
+
+
+async def _aload_chat_context(session_id, request_type, domain):
+    """System prompt, history and shard of a chat turn, each read on the async pools."""
+    from async_db import async_shard_connection
+    from history import get_async_session_history
+    from system_prompt import aget_prompt
+
+    async with async_shard_connection() as conn:
+        system_prompt = await aget_prompt(conn, domain, request_type, "system")
+    shard = resolve_shard(domain)
+    async with async_shard_connection(shard) as conn:
+        history = await get_async_session_history(session_id, conn).aget_messages()
+    return system_prompt, history, shard
+
+
+async def _asave_turn(input_text, session_id, request_type, domain, shard, response):
+    from langchain_core.messages import HumanMessage
+    from async_db import async_shard_connection
+    from history import get_async_session_history
+
+    async with async_shard_connection(shard) as conn:
+        await get_async_session_history(session_id, conn).aadd_messages([HumanMessage(content=input_text), response])
+
+    # Lead extraction stays on the background executor (sync connections, off the event loop)
+    _process_conversation_async(input_text, session_id, request_type, domain, shard)
+
+
+def _chat_callbacks() -> dict:
+    return {"callbacks": [LLMMetricsCallback("chat"), LLMTracingCallback("chat")]}
+
+
+def _chat_prompt():
+    # Imported on first use: LangChain's runnables take a large part of app start-up
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+    return ChatPromptTemplate.from_messages([
+        ("system", "{system}"),
+        MessagesPlaceholder(variable_name="history"),
+        ("human", "{input}")
+    ])
+
+
+def _process_conversation_async(input_text, session_id, request_type, domain, shard):
+    """Process conversation asynchronously on the process's background executor."""
+    # Spans of the background work join the trace of the request that triggered it
+    parent = current_span()
+    request_id = current_request_id()
+
     def process_in_background():
+        bind_request_id(request_id)
         try:
-            process_conversation(input_text, session_id, request_type, domain)
+            with start_span("background.process_conversation", parent=parent, attributes={"session.id": session_id}):
+                process_conversation(input_text, session_id, request_type, domain, shard)
             print("[LLM_API] Async conversation processing completed")
         except Exception as processing_error:
             print(f"[LLM_API] Warning: Async conversation processing failed: {processing_error}")
+        finally:
+            _track_pending(-1)
     
     # Submit to thread pool for background processing
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        executor.submit(process_in_background)
+    _track_pending(1)
+    return background_executor().submit(process_in_background)
@@ -0,0 +1,65 @@
+"""
+LLM backend selection.
+
+``get_chat_model(purpose)`` returns the LangChain chat model used for a
+purpose ("chat" for replies, "extraction" for contact/name detection).  The
+backend is chosen with LLM_BACKEND:
+
+* ``groq`` (default): ``ChatGroq`` with GROQ_API_KEY / GROQ_MODEL_NAME.
+* ``local``: ``LocalChatModel`` (local_llm.py), a deterministic offline model
+  with configurable latency and token cadence that answers extraction prompts
+  with canned JSON.  Used for load, soak and latency-injection tests.
+
+Models are built once per purpose and reused across requests.  Both backends
+are imported on first use, so importing this module stays cheap.
+"""
+import json
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from config import (
+    GROQ_API_KEY,
+    GROQ_MODEL_NAME,
+    LLM_BACKEND,
+    LOCAL_LLM_EXTRACTION_JSON,
+    LOCAL_LLM_LATENCY_MS,
+    LOCAL_LLM_REPLY_TOKENS,
+    LOCAL_LLM_TOKENS_PER_SECOND,
+)
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+LLM_PURPOSES = ("chat", "extraction")
+
+
+class UnknownLLMBackendError(Exception):
+    """Raised when LLM_BACKEND names a backend that does not exist."""
+
+
+def create_chat_model(purpose: str = "chat", backend: str = None) -> "BaseChatModel":
+    """Build a new chat model for *purpose* on *backend* (default LLM_BACKEND)."""
+    if purpose not in LLM_PURPOSES:
+        raise ValueError(f"Unknown LLM purpose '{purpose}', expected one of {LLM_PURPOSES}")
+    backend = (backend or LLM_BACKEND).lower()
+    if backend == "groq":
+        # Imported here: slow to import, and the local backend works without the Groq client installed
+        from langchain_groq import ChatGroq
+        return ChatGroq(groq_api_key=GROQ_API_KEY, model=GROQ_MODEL_NAME)
+    if backend == "local":
+        from local_llm import LocalChatModel
+        return LocalChatModel(
+            latency_ms=LOCAL_LLM_LATENCY_MS,
+            tokens_per_second=LOCAL_LLM_TOKENS_PER_SECOND,
+            reply_tokens=LOCAL_LLM_REPLY_TOKENS,
+            extraction_json=json.dumps(LOCAL_LLM_EXTRACTION_JSON) if purpose == "extraction" else None,
+        )
+    raise UnknownLLMBackendError(f"Unknown LLM_BACKEND '{backend}', expected 'groq' or 'local'")
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(purpose: str = "chat") -> "BaseChatModel":
+    """The shared chat model for *purpose* on the configured backend."""
+    model = create_chat_model(purpose)
+    print(f"[LLM_BACKEND] Using {LLM_BACKEND} backend for {purpose}")
+    return model
@@ -0,0 +1,90 @@
+"""
+Deterministic offline chat model, the ``local`` LLM backend (see llm_backend).
+
+Kept out of llm_backend because subclassing BaseChatModel imports LangChain's
+chat model stack, which takes a noticeable part of a second.
+"""
+import time
+import zlib
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORDS = ("sure", "we", "can", "help", "with", "that", "and", "our", "team", "will", "follow", "up",
+          "on", "your", "request", "shortly")
+
+
+class LocalChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model.
+
+    Replies are derived from the last message, so the same conversation always
+    gets the same answer. ``latency_ms`` is the time to first token and
+    ``tokens_per_second`` the cadence of the remaining tokens (0 = instant).
+    With ``extraction_json`` set, every reply is that JSON instead.
+    """
+
+    latency_ms: float = 0.0
+    tokens_per_second: float = 0.0
+    reply_tokens: int = 40
+    extraction_json: Optional[str] = None
+    model_name: str = "local-deterministic"
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-deterministic"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name, "latency_ms": self.latency_ms,
+                "tokens_per_second": self.tokens_per_second}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._reply_tokens(messages)
+        self._sleep(self.latency_ms / 1000 + self._token_delay() * len(tokens))
+        usage = self._usage(messages, tokens)
+        message = AIMessage(content=" ".join(tokens), usage_metadata=usage)
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": {"prompt_tokens": usage["input_tokens"],
+                                        "completion_tokens": usage["output_tokens"],
+                                        "total_tokens": usage["total_tokens"]},
+                        "model_name": self.model_name},
+        )
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self._reply_tokens(messages)
+        self._sleep(self.latency_ms / 1000)
+        for index, token in enumerate(tokens):
+            self._sleep(self._token_delay())
+            text = token if index == 0 else f" {token}"
+            usage = self._usage(messages, tokens) if index == len(tokens) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=usage))
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    def _reply_tokens(self, messages) -> list[str]:
+        if self.extraction_json is not None:
+            return [self.extraction_json]
+        seed = zlib.crc32(str(messages[-1].content if messages else "").encode())
+        return [_WORDS[(seed + index) % len(_WORDS)] for index in range(self.reply_tokens)]
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    @staticmethod
+    def _usage(messages, tokens) -> dict:
+        prompt_tokens = sum(len(str(message.content).split()) for message in messages)
+        return {"input_tokens": prompt_tokens, "output_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens)}
+
+    @staticmethod
+    def _sleep(seconds):
+        if seconds > 0:
+            time.sleep(seconds)
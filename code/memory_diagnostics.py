@@ -0,0 +1,180 @@
+"""
+Memory diagnostics: periodic tracemalloc snapshots and per-endpoint allocation deltas.
+
+When MEMORY_DIAGNOSTICS_ENABLED, ``start_memory_diagnostics`` starts
+tracemalloc and a thread that takes a snapshot every
+MEMORY_SNAPSHOT_INTERVAL_SECONDS.  The first snapshot is kept as the baseline;
+comparing the latest one against it (and against the one before) gives the
+allocation sites whose memory keeps growing.
+
+For every request, the change in traced memory between its start and end is
+recorded under its route.  The figure is process-wide, so concurrent requests
+and background threads blur it; it is meant to point at endpoints that retain
+memory, not to account bytes exactly.
+
+Everything is served at ``GET /admin/memory``.  tracemalloc slows allocation
+noticeably: enable it on one worker while investigating, not permanently.
+"""
+import linecache
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime, timezone
+
+from config import MEMORY_SNAPSHOT_INTERVAL_SECONDS, MEMORY_TOP_N, MEMORY_TRACE_FRAMES
+
+SNAPSHOTS_KEPT = 3
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_lock = threading.Lock()
+_baseline = None
+_snapshots = deque(maxlen=SNAPSHOTS_KEPT)
+_endpoints = {}
+_snapshot_thread = None
+
+
+def is_tracing() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def start_memory_diagnostics(interval_seconds: int = MEMORY_SNAPSHOT_INTERVAL_SECONDS, frames: int = MEMORY_TRACE_FRAMES):
+    """Start tracemalloc and the periodic snapshot thread (once per process)."""
+    global _snapshot_thread
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        print(f"[MEMORY] tracemalloc started ({frames} frame(s) per allocation)")
+    take_snapshot()
+    if _snapshot_thread is not None and _snapshot_thread.is_alive():
+        return _snapshot_thread
+
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                take_snapshot()
+            except Exception as e:
+                print(f"[MEMORY] Snapshot failed: {e}")
+
+    _snapshot_thread = threading.Thread(target=loop, name="memory-snapshots", daemon=True)
+    _snapshot_thread.start()
+    return _snapshot_thread
+
+
+def stop_memory_diagnostics():
+    """Stop tracemalloc and forget all snapshots and endpoint stats (the thread idles)."""
+    global _baseline
+    tracemalloc.stop()
+    with _lock:
+        _baseline = None
+        _snapshots.clear()
+        _endpoints.clear()
+
+
+def take_snapshot():
+    """Take a filtered snapshot; the first one becomes the baseline."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    taken_at = datetime.now(timezone.utc).isoformat()
+    with _lock:
+        if _baseline is None:
+            _baseline = (taken_at, snapshot)
+        _snapshots.append((taken_at, snapshot))
+    return snapshot
+
+
+# ---------------------------------------------------------------------------
+# Per-request deltas
+# ---------------------------------------------------------------------------
+
+def request_started():
+    """Traced bytes at the start of a request, or None when tracemalloc is off."""
+    if not tracemalloc.is_tracing():
+        return None
+    return tracemalloc.get_traced_memory()[0]
+
+
+def request_finished(endpoint: str, started_bytes):
+    if started_bytes is None or not tracemalloc.is_tracing():
+        return
+    delta = tracemalloc.get_traced_memory()[0] - started_bytes
+    with _lock:
+        stats = _endpoints.setdefault(endpoint, {"requests": 0, "total_delta_bytes": 0, "max_delta_bytes": 0})
+        stats["requests"] += 1
+        stats["total_delta_bytes"] += delta
+        stats["max_delta_bytes"] = max(stats["max_delta_bytes"], delta)
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def memory_report(limit: int = MEMORY_TOP_N) -> dict:
+    """Traced/RSS totals, top allocation sites, growth since baseline and last snapshot, per-endpoint deltas."""
+    report = {
+        "tracing": tracemalloc.is_tracing(),
+        "rss_bytes": _rss_bytes(),
+        "max_rss_bytes": _max_rss_bytes(),
+    }
+    if not tracemalloc.is_tracing():
+        return report
+
+    current, peak = tracemalloc.get_traced_memory()
+    with _lock:
+        baseline = _baseline
+        snapshots = list(_snapshots)
+        endpoints = {name: dict(stats) for name, stats in _endpoints.items()}
+
+    report.update({"traced_current_bytes": current, "traced_peak_bytes": peak})
+    report["snapshots"] = [{"taken_at": taken_at, "traced_bytes": _total(snapshot)} for taken_at, snapshot in snapshots]
+    if snapshots:
+        latest = snapshots[-1][1]
+        report["top_allocations"] = [_stat(stat) for stat in latest.statistics("lineno")[:limit]]
+        report["growth_since_baseline"] = {"since": baseline[0], "sites": _diff(latest, baseline[1], limit)}
+        if len(snapshots) > 1:
+            report["growth_since_previous"] = {"since": snapshots[-2][0], "sites": _diff(latest, snapshots[-2][1], limit)}
+
+    for stats in endpoints.values():
+        stats["mean_delta_bytes"] = round(stats["total_delta_bytes"] / stats["requests"])
+    report["endpoints"] = dict(sorted(endpoints.items(), key=lambda item: item[1]["total_delta_bytes"], reverse=True))
+    return report
+
+
+def _diff(snapshot, previous, limit):
+    growing = [stat for stat in snapshot.compare_to(previous, "lineno") if stat.size_diff > 0]
+    return [{**_stat(stat), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff} for stat in growing[:limit]]
+
+
+def _stat(stat) -> dict:
+    frame = stat.traceback[0]
+    return {"site": f"{frame.filename}:{frame.lineno}", "size_bytes": stat.size, "count": stat.count}
+
+
+def _total(snapshot) -> int:
+    return sum(trace.size for trace in snapshot.traces)
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _max_rss_bytes():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
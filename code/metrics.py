@@ -0,0 +1,299 @@
+"""
+In-process metrics exposed in the Prometheus text format at ``/metrics``.
+
+Recording is lock-free: every thread accumulates into its own slot and the
+slots are only summed when ``/metrics`` is scraped.  A thread takes the
+registry lock once, the first time it records into a metric.  Slots of
+threads that have finished are folded into a retired total at scrape time, so
+short-lived threads do not pile up.
+
+Stages of a ``/chat`` request are recorded in ``chat_stage_duration_seconds``
+(see ``observe_stage`` and ``timed_stage``, which also open a tracing span
+per stage); LLM latency and token counts come
+from ``LLMMetricsCallback``.
+"""
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from tracing import export_queue_depth, start_span
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+class _Metric:
+    """Base class: per-thread value slots keyed by label values."""
+
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._slots = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _slot(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._slots.append((threading.current_thread(), values))
+            return values
+
+    def _values(self) -> list[dict]:
+        """The slots of live threads and the retired total, into which finished threads' slots are folded."""
+        with self._lock:
+            live = []
+            for thread, values in self._slots:
+                if thread.is_alive():
+                    live.append((thread, values))
+                else:
+                    self._merge(self._retired, values)
+            self._slots = live
+            return [self._retired] + [values for _, values in live]
+
+    def _merge(self, totals: dict, values: dict) -> None:
+        raise NotImplementedError
+
+    def collect(self) -> dict:
+        totals = {}
+        for values in self._values():
+            self._merge(totals, values)
+        return totals
+
+    def _label_text(self, label_values, extra=()):
+        pairs = list(zip(self.labelnames, label_values)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+        return "{" + escaped + "}"
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        values = self._slot()
+        values[label_values] = values.get(label_values, 0) + amount
+
+    def _merge(self, totals, values):
+        for labels, value in list(values.items()):
+            totals[labels] = totals.get(labels, 0) + value
+
+    def render(self):
+        lines = self._header()
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{self._label_text(labels)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        values = self._slot()
+        counts = values.get(label_values)
+        if counts is None:
+            # One counter per bucket (the last one is +Inf), then sum
+            counts = values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _merge(self, totals, values):
+        for labels, counts in list(values.items()):
+            total = totals.setdefault(labels, [0] * len(counts))
+            for index, count in enumerate(counts):
+                total[index] += count
+
+    def render(self):
+        lines = self._header()
+        for labels, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A gauge read at scrape time from *callback*, which returns {label_values: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), callback=None):
+        super().__init__(name, help_text, labelnames)
+        self._callbacks = [callback] if callback else []
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def collect(self) -> dict:
+        values = {}
+        for callback in self._callbacks:
+            try:
+                values.update(callback())
+            except Exception as e:
+                print(f"[METRICS] Gauge {self.name} callback failed: {e}")
+        return values
+
+    def render(self):
+        lines = self._header()
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{self._label_text(labels)} {_number(value)}")
+        return lines
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time spent serving HTTP requests.", ("endpoint", "method", "status"))
+CHAT_STAGE_SECONDS = Histogram(
+    "chat_stage_duration_seconds", "Time spent in each stage of chat handling.", ("stage",))
+CHAT_STAGE_ERRORS = Counter(
+    "chat_stage_errors_total", "Stages that raised an exception.", ("stage",))
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_duration_seconds", "Latency of LLM calls.", ("call",))
+LLM_CALL_ERRORS = Counter(
+    "llm_call_errors_total", "LLM calls that failed.", ("call",))
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported by the LLM provider.", ("call", "kind"))
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled database connection.", ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Pooled database connections by state.", ("pool", "state"))
+CHAT_PARTITION_FAILURES = Counter(
+    "chat_history_partition_failures_total", "Monthly chat history partitions that could not be created.")
+IDEMPOTENT_REQUESTS = Counter(
+    "idempotent_chat_requests_total", "Chat requests sent with an Idempotency-Key, by outcome.", ("outcome",))
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections", "Open chat WebSocket connections in this process.")
+WEBSOCKET_FRAMES = Counter(
+    "websocket_frames_total", "Chat WebSocket frames by direction and type.", ("direction", "type"))
+WEBSOCKET_DISCONNECTS = Counter(
+    "websocket_disconnects_total", "Chat WebSocket connections ended, by reason.", ("reason",))
+WEBSOCKET_FIRST_TOKEN_SECONDS = Histogram(
+    "websocket_first_token_seconds", "Time from a chat WebSocket message to the first streamed token.")
+BACKGROUND_QUEUE_DEPTH = Gauge(
+    "background_queue_depth", "Work queued or running in background threads.", ("queue",),
+    callback=export_queue_depth)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Record the duration of the enclosed block as *stage* (and trace it as a span)."""
+    started = time.perf_counter()
+    try:
+        with start_span(stage):
+            yield
+    except BaseException:
+        CHAT_STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        CHAT_STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+
+def timed_stage(stage: str):
+    """Decorator form of ``observe_stage``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with observe_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def pool_stats_callback(name: str, pool_getter):
+    """Gauge callback reporting max/size/idle/waiting connections of the pool returned by *pool_getter*."""
+    def callback():
+        pool = pool_getter()
+        if pool is None:
+            return {}
+        stats = pool.get_stats()
+        return {
+            (name, "max"): stats.get("pool_max", 0),
+            (name, "size"): stats.get("pool_size", 0),
+            (name, "idle"): stats.get("pool_available", 0),
+            (name, "waiting"): stats.get("requests_waiting", 0),
+        }
+    return callback
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """LangChain callback recording latency, failures and token usage of LLM calls."""
+
+    def __init__(self, call: str):
+        self.call = call
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started, self.call)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None:
+            # Providers that only report usage on the message itself
+            usage_metadata = getattr(getattr(_first_generation(response), "message", None), "usage_metadata", None) or {}
+            prompt_tokens = usage_metadata.get("input_tokens")
+            completion_tokens = usage_metadata.get("output_tokens")
+        if prompt_tokens is not None:
+            LLM_TOKENS.inc(self.call, "prompt", amount=prompt_tokens)
+            LLM_TOKENS.inc(self.call, "completion", amount=completion_tokens or 0)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        LLM_CALL_ERRORS.inc(self.call)
+
+
+def _first_generation(response):
+    try:
+        return response.generations[0][0]
+    except (IndexError, TypeError):
+        return None
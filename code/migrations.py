@@ -0,0 +1,102 @@
+"""
+Versioned schema migrations.
+
+Each database keeps one ``schema_version`` row per component ("primary" for
+the domains/prompts directory, "conversation" for the history and chat_info
+tables that live on the primary and on every shard).  ``migrate`` reads that
+row and returns immediately when it is current, so a worker start costs one
+query instead of re-running every CREATE/ALTER.  Pending migrations run in
+version order under an advisory lock, so workers starting together do not
+race; each one is committed together with its version bump.  Migrations run on
+plain cursors, not the connection's ``InstrumentedCursor``: a slow
+``pg_advisory_lock`` wait must never be re-run by a sampled EXPLAIN.
+
+Migrations must stay idempotent (``IF NOT EXISTS`` and friends): the first
+version of each component is the baseline that was run at every start before
+versioning existed, and re-runs over existing databases.
+"""
+from dataclasses import dataclass
+from typing import Callable
+
+import psycopg
+
+# Arbitrary key for pg_advisory_lock, shared by every worker migrating the same database
+MIGRATION_LOCK_ID = 724_310_041
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable  # apply(conn); may commit
+
+
+def ensure_schema_version_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                component TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+    conn.commit()
+
+
+def current_version(conn, component: str) -> int:
+    """The applied schema version of *component*, 0 when never migrated."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version FROM schema_version WHERE component = %s;", (component,))
+            row = cur.fetchone()
+    except psycopg.errors.UndefinedTable:
+        conn.rollback()
+        return 0
+    conn.rollback()
+    return row[0] if row else 0
+
+
+def migrate(conn, component: str, migrations: list[Migration]) -> list[int]:
+    """Apply the pending *migrations* of *component*; returns the versions applied."""
+    cursor_factory = conn.cursor_factory
+    conn.cursor_factory = psycopg.Cursor
+    try:
+        return _migrate(conn, component, migrations)
+    finally:
+        conn.cursor_factory = cursor_factory
+
+
+def _migrate(conn, component, migrations):
+    latest = migrations[-1].version
+    if current_version(conn, component) >= latest:
+        return []
+
+    ensure_schema_version_table(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+    applied = []
+    try:
+        # Another worker may have migrated while we waited for the lock
+        version = current_version(conn, component)
+        for migration in migrations:
+            if migration.version <= version:
+                continue
+            print(f"[MIGRATIONS] {component}: applying {migration.version} ({migration.description})")
+            migration.apply(conn)
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO schema_version (component, version) VALUES (%s, %s)
+                    ON CONFLICT (component)
+                    DO UPDATE SET version = EXCLUDED.version, updated_at = CURRENT_TIMESTAMP;
+                """, (component, migration.version))
+            conn.commit()
+            applied.append(migration.version)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+        conn.commit()
+    print(f"[MIGRATIONS] {component} schema at version {latest}")
+    return applied
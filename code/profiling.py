@@ -0,0 +1,142 @@
+"""
+On-demand sampling CPU profiles of live requests.
+
+A request is profiled when it carries ``X-Profile: <ADMIN_API_TOKEN>`` or is
+picked at random with probability PROFILE_SAMPLE_RATE.  While it runs, a
+sampler thread reads the request thread's stack every PROFILE_INTERVAL_MS via
+``sys._current_frames()``; the request itself runs uninstrumented, so the
+overhead is one stack walk per interval and nothing for unprofiled requests.
+
+Each profile is written to PROFILE_DIR in the collapsed-stack format
+(``frame;frame;frame count`` per line) read by flamegraph.pl, speedscope and
+inferno.  The newest PROFILE_MAX_FILES profiles are kept and listed at
+``GET /admin/profiles``.
+"""
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from config import ADMIN_API_TOKEN, PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES, PROFILE_SAMPLE_RATE
+
+PROFILE_SUFFIX = ".folded"
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class RequestProfiler:
+    """Samples one thread's call stack at a fixed interval from a background thread."""
+
+    def __init__(self, thread_id: int, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.stacks[_collapse(frame)] += 1
+            self.samples += 1
+
+
+def should_profile(header_value, sample_rate: float = PROFILE_SAMPLE_RATE) -> bool:
+    """True when the X-Profile header carries the admin token, or the request is sampled."""
+    if header_value and ADMIN_API_TOKEN and hmac.compare_digest(header_value.encode(), ADMIN_API_TOKEN.encode()):
+        return True
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def profile_name(endpoint: str, request_id: str) -> str:
+    """File name for a profile: sortable timestamp, endpoint and request ID."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    endpoint = _UNSAFE_CHARS.sub("_", endpoint).strip("_") or "root"
+    return f"{stamp}_{endpoint}_{_UNSAFE_CHARS.sub('_', request_id)[:64]}{PROFILE_SUFFIX}"
+
+
+def write_profile(profiler: RequestProfiler, name: str, directory: str = None,
+                  max_files: int = PROFILE_MAX_FILES) -> str:
+    """Write *profiler*'s stacks as ``<directory>/<name>`` (default PROFILE_DIR) and prune old profiles."""
+    directory = directory or PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as out:
+        out.write(f"# samples={profiler.samples} interval_ms={profiler.interval * 1000:g} "
+                  f"elapsed_ms={profiler.elapsed * 1000:.1f}\n")
+        for stack, count in profiler.stacks.most_common():
+            out.write(f"{stack} {count}\n")
+    _prune(directory, max_files)
+    return path
+
+
+def list_profiles(directory: str = None, limit: int = 50) -> list[dict]:
+    """Newest profiles first, with their size and sample count."""
+    directory = directory or PROFILE_DIR
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(_profile_files(directory), reverse=True)[:limit]:
+        path = os.path.join(directory, name)
+        with open(path, encoding="utf-8") as f:
+            header = f.readline()
+        match = re.search(r"samples=(\d+).*elapsed_ms=([\d.]+)", header)
+        profiles.append({
+            "name": name,
+            "size_bytes": os.path.getsize(path),
+            "samples": int(match.group(1)) if match else None,
+            "elapsed_ms": float(match.group(2)) if match else None,
+            "created_at": datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).isoformat(),
+        })
+    return profiles
+
+
+def profile_path(name: str, directory: str = None):
+    """Path of the profile called *name*, or None if there is no such profile."""
+    directory = directory or PROFILE_DIR
+    if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name}@{os.path.basename(code.co_filename)}:{code.co_firstlineno}")
+        frame = frame.f_back
+    # Root first; ';' and ' ' separate frames and the count in the collapsed format
+    return ";".join(reversed(names)).replace(" ", "_")
+
+
+def _profile_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIX)]
+
+
+def _prune(directory, max_files):
+    for name in sorted(_profile_files(directory))[:-max_files or None]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
@@ -27,49 +27,44 @@ def check_and_insert_default_prompts(sync_connection):
     """
     Check if the prompts table is empty, and insert default rows only if empty.
     """
-    try:
-        with sync_connection.cursor() as cur:
-            # Check if the table is empty
-            cur.execute("SELECT COUNT(*) FROM prompts;")
-            count = cur.fetchone()[0]
-            if count == 0:
-                print("Prompts table is empty. Inserting default prompts...")
-
-                default_prompts = [
-                    (DEFAULT_DOMAIN, 'generic', 'fetch-name', Path("prompts/name_prompt.txt")),
-                    (DEFAULT_DOMAIN, 'sales', 'fetch-contact-info',  Path("prompts/info_prompt.txt")),
-                    (DEFAULT_DOMAIN, 'sales', 'base-prompt', Path("prompts/sales_prompt.txt")),
-                    (DEFAULT_DOMAIN, 'sales', 'company', Path("prompts/company.txt")),
-                    (DEFAULT_DOMAIN, 'sales', 'intro-message', Path("prompts/intro_message.txt")),
-                    (DEFAULT_DOMAIN, 'generic', 'system', Path("prompts/generic_prompt.txt")),
-                ]
+    with sync_connection.cursor() as cur:
+        # Check if the table is empty
+        cur.execute("SELECT COUNT(*) FROM prompts;")
+        count = cur.fetchone()[0]
+        if count == 0:
+            print("Prompts table is empty. Inserting default prompts...")
 
-                for domain, agent_type, prompt_type, text in default_prompts:
+            default_prompts = [
+                (DEFAULT_DOMAIN, 'generic', 'fetch-name', Path("prompts/name_prompt.txt")),
+                (DEFAULT_DOMAIN, 'sales', 'fetch-contact-info',  Path("prompts/info_prompt.txt")),
+                (DEFAULT_DOMAIN, 'sales', 'base-prompt', Path("prompts/sales_prompt.txt")),
+                (DEFAULT_DOMAIN, 'sales', 'company', Path("prompts/company.txt")),
+                (DEFAULT_DOMAIN, 'sales', 'intro-message', Path("prompts/intro_message.txt")),
+                (DEFAULT_DOMAIN, 'generic', 'system', Path("prompts/generic_prompt.txt")),
+            ]
 
-                    # If text is a file path → load JSON
-                    if isinstance(text, Path):
-                        text_json = load_json(text)
-                        if text_json is None:
-                            print(f"Skipping insertion for {text}")
-                            continue
-                        text_to_insert = text_json
-                    else:
-                        text_to_insert = text
+            for domain, agent_type, prompt_type, text in default_prompts:
 
+                # If text is a file path → load JSON
+                if isinstance(text, Path):
+                    text_json = load_json(text)
+                    if text_json is None:
+                        print(f"Skipping insertion for {text}")
+                        continue
+                    text_to_insert = text_json
+                else:
+                    text_to_insert = text
 
-                    cur.execute("""
-                        INSERT INTO prompts (domain, agent_type, type, text)
-                        VALUES (%s, %s, %s, %s);
-                    """, (domain, agent_type, prompt_type, text_to_insert))
 
-                sync_connection.commit()
-                print("Default prompts inserted successfully.")
-            else:
-                print("Prompts table already contains data. No insertion needed.")
+                cur.execute("""
+                    INSERT INTO prompts (domain, agent_type, type, text)
+                    VALUES (%s, %s, %s, %s);
+                """, (domain, agent_type, prompt_type, text_to_insert))
 
-    except Exception as e:
-        print(f"Error inserting prompts: {e}")
-        sync_connection.rollback()
+            sync_connection.commit()
+            print("Default prompts inserted successfully.")
+        else:
+            print("Prompts table already contains data. No insertion needed.")
 
 
 def check_and_insert_default_domains(sync_connection):
@@ -99,8 +94,8 @@ def get_all_prompts():
     Returns a list of dicts.
     """
     try:
-        from db import sync_connection
-        with sync_connection.cursor() as cur:
+        from db_router import read_connection
+        with read_connection() as conn, conn.cursor() as cur:
             cur.execute("SELECT id, domain, agent_type, type, text, created_at FROM prompts;")
             rows = cur.fetchall()
             columns = [desc[0] for desc in cur.description]
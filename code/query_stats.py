@@ -0,0 +1,286 @@
+"""
+Per-statement timing, slow-query log and sampled EXPLAIN capture.
+
+``InstrumentedCursor`` is the cursor factory of every application connection
+and pool.  It times each statement and records the duration under the
+statement's fingerprint (the SQL with literals and placeholders replaced by
+``?``), so ``SELECT ... WHERE key = 'a'`` and ``... = 'b'`` share one entry.
+The async pools of the ASGI app use ``AsyncInstrumentedCursor`` likewise.
+Timings are kept per thread and merged only when stats are read, so the query
+path takes no lock; finished threads' timings are folded into a retired total
+then.
+
+Statements slower than SLOW_QUERY_THRESHOLD_MS are logged.  For a sample of
+slow, read-only statements (SLOW_QUERY_EXPLAIN_SAMPLE_RATE, at most once per
+fingerprint every SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS) the plan is captured
+with ``EXPLAIN`` on the same connection.  Writes are never explained.  With
+SLOW_QUERY_EXPLAIN_ANALYZE the plan is ``EXPLAIN (ANALYZE, BUFFERS)``, which
+runs the statement a second time, so only for statements without function
+calls (``pg_advisory_lock``, ``nextval``, ...) or locking clauses; other
+statements still get the plain plan.  Either way the EXPLAIN runs in a
+savepoint that is rolled back.
+
+Stats are served at ``GET /admin/query-stats``.
+"""
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import psycopg
+from psycopg import sql
+from psycopg.pq import TransactionStatus
+
+from config import (
+    SLOW_QUERY_EXPLAIN_ANALYZE,
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    SLOW_QUERY_THRESHOLD_MS,
+)
+from tracing import TracedCursor, query_span, statement_text
+
+# Durations kept per fingerprint and thread for percentiles
+SAMPLES_PER_FINGERPRINT = 500
+SLOW_QUERY_LOG_SIZE = 100
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%(?:\(\w+\))?s|\$\d+")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*(?:::\s*\w+)?\s*,\s*\?)*(?:\s*::\s*\w+)?\s*\)(?:\s*,\s*\(\s*\?[^()]*\))*")
+_WHITESPACE = re.compile(r"\s+")
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+# Side effects ANALYZE would repeat: function calls (bar aggregates and syntax) and row locks
+_CALL = re.compile(r"\b(\w+)\s*\(")
+_SYNTAX_CALLS = frozenset({
+    "ALL", "AND", "ANY", "ARRAY", "AS", "AVG", "CAST", "COALESCE", "COUNT", "EXISTS", "FILTER", "FROM",
+    "IN", "JOIN", "LOWER", "MAX", "MIN", "NOT", "NULLIF", "ON", "OR", "OVER", "ROW", "SELECT", "SUM",
+    "UPPER", "USING", "VALUES", "WHERE",
+})
+_LOCKING = re.compile(r"\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b", re.IGNORECASE)
+
+
+def fingerprint(statement: str) -> str:
+    """Normalise *statement* so executions that differ only in values group together."""
+    text = _STRING_LITERAL.sub("?", statement)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _VALUE_LIST.sub("(...)", text)
+    return _WHITESPACE.sub(" ", text).strip().rstrip(";").strip()
+
+
+class _Entry:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLES_PER_FINGERPRINT)
+
+
+class QueryStats:
+    """Statement timings by fingerprint plus a log of recent slow statements."""
+
+    def __init__(self, threshold_ms=SLOW_QUERY_THRESHOLD_MS, explain_sample_rate=SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+                 explain_interval_seconds=SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+                 explain_analyze=SLOW_QUERY_EXPLAIN_ANALYZE):
+        self.threshold_ms = threshold_ms
+        self.explain_analyze = explain_analyze
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval_seconds = explain_interval_seconds
+        self._local = threading.local()
+        self._slots = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        self._slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self._explained_at = {}
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def record(self, cursor, query, params, seconds: float, explain: bool = True):
+        statement = statement_text(query, cursor)
+        key = fingerprint(statement)
+        entry = self._slot().get(key)
+        if entry is None:
+            entry = self._slot()[key] = _Entry()
+        entry.count += 1
+        entry.total += seconds
+        entry.max = max(entry.max, seconds)
+        entry.samples.append(seconds)
+
+        duration_ms = seconds * 1000
+        if duration_ms >= self.threshold_ms:
+            print(f"[SLOW_QUERY] {duration_ms:.1f}ms {key[:200]}")
+            self._slow.append({
+                "fingerprint": key,
+                "statement": statement,
+                "duration_ms": round(duration_ms, 3),
+                "at": datetime.now(timezone.utc).isoformat(),
+                "plan": self._maybe_explain(cursor, key, statement, query, params) if explain else None,
+            })
+
+    def summary(self, limit: int = 50) -> list[dict]:
+        """Per-fingerprint count, total, mean, p50, p99 and max (ms), by total time descending."""
+        merged = {}
+        for values in self._values():
+            for key, entry in list(values.items()):
+                total = merged.setdefault(key, {"count": 0, "total": 0.0, "max": 0.0, "samples": []})
+                total["count"] += entry.count
+                total["total"] += entry.total
+                total["max"] = max(total["max"], entry.max)
+                total["samples"].extend(entry.samples)
+
+        rows = []
+        for key, total in merged.items():
+            samples = sorted(total["samples"])
+            rows.append({
+                "fingerprint": key,
+                "count": total["count"],
+                "total_ms": _ms(total["total"]),
+                "mean_ms": _ms(total["total"] / total["count"]),
+                "p50_ms": _ms(_percentile(samples, 50)),
+                "p99_ms": _ms(_percentile(samples, 99)),
+                "max_ms": _ms(total["max"]),
+            })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows[:limit]
+
+    def slow_queries(self) -> list[dict]:
+        """Recent slow statements, newest first."""
+        return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            for _, values in self._slots:
+                values.clear()
+            self._retired.clear()
+        self._slow.clear()
+        self._explained_at.clear()
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _slot(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._slots.append((threading.current_thread(), values))
+            return values
+
+    def _values(self) -> list[dict]:
+        """Per-thread entries; those of finished threads are folded into the retired entries."""
+        with self._lock:
+            live = []
+            for thread, values in self._slots:
+                if thread.is_alive():
+                    live.append((thread, values))
+                    continue
+                for key, entry in values.items():
+                    retired = self._retired.get(key)
+                    if retired is None:
+                        retired = self._retired[key] = _Entry()
+                    retired.count += entry.count
+                    retired.total += entry.total
+                    retired.max = max(retired.max, entry.max)
+                    retired.samples.extend(entry.samples)
+            self._slots = live
+            return [self._retired] + [values for _, values in live]
+
+    def _maybe_explain(self, cursor, key, statement, query, params):
+        if not _READ_ONLY.match(statement) or _WRITES.search(statement):
+            return None
+        if random.random() >= self.explain_sample_rate:
+            return None
+        now = time.monotonic()
+        if now - self._explained_at.get(key, float("-inf")) < self.explain_interval_seconds:
+            return None
+        conn = cursor.connection
+        if conn.info.transaction_status not in (TransactionStatus.IDLE, TransactionStatus.INTRANS):
+            return None
+        self._explained_at[key] = now
+        explain_sql = "EXPLAIN (ANALYZE, BUFFERS) " if self.explain_analyze and _safe_to_analyze(statement) else "EXPLAIN "
+        plan = None
+        try:
+            # Savepoint so a failing EXPLAIN does not abort the caller's transaction, always rolled
+            # back; a plain cursor because the caller still fetches from its own and EXPLAIN must
+            # not be recorded
+            with conn.transaction(), psycopg.Cursor(conn) as explain:
+                explain.execute(sql.SQL(explain_sql) + _as_composable(query), params)
+                plan = "\n".join(row[0] for row in explain.fetchall())
+                raise psycopg.Rollback()
+        except psycopg.Error as e:
+            print(f"[SLOW_QUERY] EXPLAIN failed: {e}")
+        return plan
+
+
+class InstrumentedCursor(TracedCursor):
+    """TracedCursor that also records every statement's duration in ``query_stats``."""
+
+    def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        result = super().execute(query, params, **kwargs)
+        query_stats.record(self, query, params, time.perf_counter() - started)
+        return result
+
+    def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        result = super().executemany(query, params_seq, **kwargs)
+        query_stats.record(self, query, None, time.perf_counter() - started)
+        return result
+
+
+class AsyncInstrumentedCursor(psycopg.AsyncCursor):
+    """Async counterpart of InstrumentedCursor (slow statements are logged but not EXPLAINed)."""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        with query_span(self, query):
+            result = await super().execute(query, params, **kwargs)
+        query_stats.record(self, query, params, time.perf_counter() - started, explain=False)
+        return result
+
+    async def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        with query_span(self, query):
+            result = await super().executemany(query, params_seq, **kwargs)
+        query_stats.record(self, query, None, time.perf_counter() - started, explain=False)
+        return result
+
+
+query_stats = QueryStats()
+
+
+def _safe_to_analyze(statement: str) -> bool:
+    """Whether running *statement* again under EXPLAIN ANALYZE has no side effects."""
+    if _LOCKING.search(statement):
+        return False
+    return all(name.upper() in _SYNTAX_CALLS for name in _CALL.findall(statement))
+
+
+def _as_composable(query):
+    if isinstance(query, sql.Composable):
+        return query
+    if isinstance(query, bytes):
+        query = query.decode("utf-8")
+    return sql.SQL(query)
+
+
+def _percentile(samples, percent):
+    if not samples:
+        return 0.0
+    # Nearest-rank
+    index = max(0, math.ceil(percent / 100 * len(samples)) - 1)
+    return samples[index]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
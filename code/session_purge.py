@@ -0,0 +1,186 @@
+"""
+Batched purge of soft-deleted sessions and their transcripts.
+
+Leads closed from the dashboard with ``is_active = FALSE`` keep their
+``chat_info`` row and every ``chat_table`` message.  This job removes sessions
+that have been inactive for longer than PURGE_INACTIVE_AFTER_DAYS, counted from
+``deactivated_at`` (set when the lead is switched inactive).
+
+Deletes run in small batches, each in its own short transaction with a lock
+timeout, with a pause between batches, so the purge never holds long locks or
+produces WAL bursts on the live tables.  Transcripts are deleted before the
+``chat_info`` row, so an interrupted run is picked up again by the next one.
+
+Usage
+-----
+    python session_purge.py            # purge
+    python session_purge.py --dry-run  # only count what would be purged
+"""
+import sys
+import threading
+import time
+import uuid
+
+import psycopg
+from psycopg import sql
+
+from config import (
+    DATABASE_URL,
+    PURGE_BATCH_DELAY_SECONDS,
+    PURGE_BATCH_SIZE,
+    PURGE_INACTIVE_AFTER_DAYS,
+    PURGE_INTERVAL_SECONDS,
+    SHARD_DATABASE_URLS,
+    table_name,
+)
+
+_purge_thread = None
+
+# Aged from when the lead was set inactive (deactivated_at), not from its creation
+_CANDIDATES_WHERE = "is_active IS FALSE AND deactivated_at < NOW() - make_interval(days => %s)"
+
+
+def count_purge_candidates(conn, older_than_days: int = PURGE_INACTIVE_AFTER_DAYS, history_table: str = table_name) -> dict:
+    """Return how many sessions and messages a purge would delete."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT session_id FROM chat_info WHERE {_CANDIDATES_WHERE};", (older_than_days,))
+        session_ids = [row[0] for row in cur.fetchall()]
+        cur.execute(sql.SQL("SELECT COUNT(*) FROM {} WHERE session_id = ANY(%s::uuid[]);").format(
+            sql.Identifier(history_table)), (valid_uuids(session_ids),))
+        messages = cur.fetchone()[0]
+    conn.rollback()
+    return {"sessions": len(session_ids), "messages": messages}
+
+
+def purge_inactive_sessions(conn, older_than_days: int = PURGE_INACTIVE_AFTER_DAYS, batch_size: int = PURGE_BATCH_SIZE,
+                            delay_seconds: float = PURGE_BATCH_DELAY_SECONDS, max_batches: int = None,
+                            history_table: str = table_name) -> dict:
+    """
+    Delete inactive sessions older than *older_than_days*, *batch_size* rows per statement.
+
+    Returns progress metrics: sessions/messages deleted, number of delete
+    batches and elapsed seconds.
+    """
+    stats = {"sessions_deleted": 0, "messages_deleted": 0, "batches": 0, "elapsed_seconds": 0.0}
+    started = time.monotonic()
+
+    def limit_reached():
+        return max_batches is not None and stats["batches"] >= max_batches
+
+    while not limit_reached():
+        session_ids = _next_sessions(conn, older_than_days, batch_size)
+        if not session_ids:
+            break
+
+        # Transcripts first, in ctid-addressed chunks so no single DELETE touches too many rows
+        uuids = valid_uuids(session_ids)
+        while uuids:
+            if limit_reached():
+                break
+            deleted = _run_batch(conn, sql.SQL("""
+                DELETE FROM {table}
+                WHERE (tableoid, ctid) IN (
+                    SELECT tableoid, ctid FROM {table}
+                    WHERE session_id = ANY(%s::uuid[])
+                    LIMIT %s
+                );
+            """).format(table=sql.Identifier(history_table)), (uuids, batch_size))
+            stats["messages_deleted"] += deleted
+            stats["batches"] += 1
+            if deleted < batch_size:
+                break
+            time.sleep(delay_seconds)
+        if limit_reached():
+            break
+
+        stats["sessions_deleted"] += _run_batch(conn, f"""
+            DELETE FROM chat_info
+            WHERE ctid IN (
+                SELECT ctid FROM chat_info
+                WHERE session_id = ANY(%s) AND {_CANDIDATES_WHERE}
+            );
+        """, (session_ids, older_than_days))
+        stats["batches"] += 1
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        print(f"[PURGE] {stats['sessions_deleted']} sessions, {stats['messages_deleted']} messages deleted "
+              f"in {stats['batches']} batches ({stats['elapsed_seconds']}s)")
+        time.sleep(delay_seconds)
+
+    stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    return stats
+
+
+def run_purge_once() -> list[dict]:
+    """Run one purge pass on the primary and every shard, each on a dedicated connection."""
+    stats = []
+    for database_url in [DATABASE_URL, *SHARD_DATABASE_URLS.values()]:
+        with psycopg.connect(database_url) as conn:
+            stats.append(purge_inactive_sessions(conn))
+    return stats
+
+
+def start_purge_worker(interval_seconds: int = PURGE_INTERVAL_SECONDS):
+    """Start the background purge loop (once per process)."""
+    global _purge_thread
+    if _purge_thread is not None and _purge_thread.is_alive():
+        return _purge_thread
+
+    def loop():
+        while True:
+            try:
+                run_purge_once()
+            except Exception as e:
+                print(f"[PURGE] Purge pass failed: {e}")
+            time.sleep(interval_seconds)
+
+    _purge_thread = threading.Thread(target=loop, name="session-purge", daemon=True)
+    _purge_thread.start()
+    return _purge_thread
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _next_sessions(conn, older_than_days, batch_size):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT session_id FROM chat_info WHERE {_CANDIDATES_WHERE} ORDER BY deactivated_at LIMIT %s;",
+                    (older_than_days, batch_size))
+        session_ids = [row[0] for row in cur.fetchall()]
+    conn.rollback()
+    return session_ids
+
+
+def _run_batch(conn, query, params) -> int:
+    """Execute one delete in its own short transaction and return the affected row count."""
+    try:
+        with conn.cursor() as cur:
+            # Give up on the batch rather than queue behind (and in front of) live traffic
+            cur.execute("SET LOCAL lock_timeout = '2s';")
+            cur.execute(query, params)
+            deleted = cur.rowcount
+        conn.commit()
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def valid_uuids(session_ids):
+    # chat_table.session_id is a UUID column; anything else has no transcript to delete
+    valid = []
+    for session_id in session_ids:
+        try:
+            valid.append(str(uuid.UUID(session_id)))
+        except (ValueError, TypeError, AttributeError):
+            continue
+    return valid
+
+
+if __name__ == "__main__":
+    if "--dry-run" in sys.argv:
+        for url in [DATABASE_URL, *SHARD_DATABASE_URLS.values()]:
+            with psycopg.connect(url) as connection:
+                print(f"[PURGE] Would delete: {count_purge_candidates(connection)}")
+    else:
+        print(f"[PURGE] Done: {run_purge_once()}")
@@ -0,0 +1,89 @@
+"""
+Signed session tokens.  ``/history`` hands one out and ``/chat`` accepts it in
+place of the session id and origin: verifying it is an HMAC over a few dozen
+bytes, with no UUID parsing and no ``domains`` lookup.
+
+A token is ``<payload>.<signature>``, both base64url.  The payload is JSON
+binding the session id, domain key and agent type, with an expiry and the id
+of the key that signed it:
+
+    {"sid": "<uuid>", "dom": "<domain key>", "typ": "sales", "exp": 1767225600, "kid": "k2"}
+
+Keys come from ``SESSION_TOKEN_KEYS``, comma-separated ``kid:secret`` pairs.
+The first key signs and every key verifies, so a key is rotated by putting the
+new one first, deploying, and removing the old one once the tokens it signed
+have expired (``SESSION_TOKEN_TTL_SECONDS``).  Without keys no tokens are
+issued and ``/chat`` keeps validating session and origin on every request.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from config import SESSION_TOKEN_KEYS, SESSION_TOKEN_TTL_SECONDS
+
+
+class SessionTokenError(Exception):
+    """The token is malformed, signed with an unknown key, tampered with or expired."""
+
+
+def parse_keys(spec: str) -> list:
+    """``"k2:secret2,k1:secret1"`` -> [("k2", b"secret2"), ("k1", b"secret1")]."""
+    keys = []
+    for pair in spec.split(","):
+        if not pair.strip():
+            continue
+        kid, separator, secret = pair.strip().partition(":")
+        if not separator or not kid or not secret:
+            raise ValueError("SESSION_TOKEN_KEYS must be comma-separated kid:secret pairs")
+        keys.append((kid, secret.encode()))
+    return keys
+
+
+_keys = parse_keys(SESSION_TOKEN_KEYS)
+
+
+def tokens_enabled() -> bool:
+    return bool(_keys)
+
+
+def issue_token(session_id: str, domain: str, agent_type: str, now=None):
+    """A token for the session, signed with the current key; None when no keys are configured."""
+    if not _keys:
+        return None
+    kid, secret = _keys[0]
+    issued_at = int(time.time() if now is None else now)
+    payload = json.dumps({"sid": session_id, "dom": domain, "typ": agent_type,
+                          "exp": issued_at + SESSION_TOKEN_TTL_SECONDS, "kid": kid},
+                         separators=(",", ":")).encode()
+    return f"{_encode(payload)}.{_encode(_sign(secret, payload))}"
+
+
+def verify_token(token: str, now=None) -> dict:
+    """The token's claims (``sid``, ``dom``, ``typ``, ``exp``, ``kid``); raises SessionTokenError."""
+    try:
+        encoded_payload, encoded_signature = token.split(".")
+        payload = _decode(encoded_payload)
+        signature = _decode(encoded_signature)
+        claims = json.loads(payload)
+        secret = dict(_keys).get(claims.get("kid"))
+    except (AttributeError, ValueError, TypeError):
+        raise SessionTokenError("Invalid session token") from None
+    if secret is None or not hmac.compare_digest(signature, _sign(secret, payload)):
+        raise SessionTokenError("Invalid session token")
+    if not isinstance(claims.get("exp"), int) or claims["exp"] <= (time.time() if now is None else now):
+        raise SessionTokenError("Session token expired")
+    return claims
+
+
+def _sign(secret: bytes, payload: bytes) -> bytes:
+    return hmac.new(secret, payload, hashlib.sha256).digest()
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
@@ -0,0 +1,304 @@
+"""
+Per-domain sharding of conversation data.
+
+The primary database (DATABASE_URL) stays the directory: it holds ``domains``,
+``prompts`` and the ``domain_shards`` map.  Conversation data for a domain
+(``chat_table`` history and ``chat_info`` leads) lives on the shard its key is
+mapped to; keys without an entry live on the primary.
+
+Shards are configured with DATABASE_SHARDS.  The map is cached in memory and
+reloaded every SHARD_MAP_TTL_SECONDS, so resolving a shard costs a dict lookup.
+
+Usage
+-----
+    python sharding.py move <DOMAIN_KEY> <SHARD>   # move a domain's rows to another shard
+"""
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg
+from flask import g, has_app_context
+from psycopg_pool import ConnectionPool
+
+from config import (
+    DATABASE_URL,
+    PRIMARY_SHARD,
+    SHARD_DATABASE_URLS,
+    SHARD_MAP_TTL_SECONDS,
+    SHARD_POOL_SIZE,
+    table_name,
+)
+from db import migrate_conversation_schema, sync_connection
+from db_router import read_connection
+from metrics import DB_POOL_CONNECTIONS, DB_POOL_WAIT_SECONDS
+from session_purge import valid_uuids
+from query_stats import InstrumentedCursor
+
+# Pools inherited open from a parent process, kept so they are never finalised here
+_inherited_pools = []
+
+_CHAT_INFO_COLUMNS = (
+    "session_id, contact_name, email, mobile, country, request_type, created_at, "
+    "metadata, status, remarks, domain, is_active, deactivated_at"
+)
+
+
+class ShardMovingError(Exception):
+    """Raised while a domain is being copied to another shard."""
+
+
+class UnknownShardError(Exception):
+    """Raised when a shard name is not configured in DATABASE_SHARDS."""
+
+
+class ShardRouter:
+    """Resolves domain keys to shards and hands out connections to them."""
+
+    def __init__(self, shard_urls: dict, directory_connection, ttl_seconds=SHARD_MAP_TTL_SECONDS,
+                 pool_size=SHARD_POOL_SIZE):
+        self._shard_urls = dict(shard_urls)
+        self._directory = directory_connection
+        self._ttl_seconds = ttl_seconds
+        self._pool_size = pool_size
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._map = {}
+        self._loaded_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def all_shards(self) -> list[str]:
+        return [PRIMARY_SHARD, *self._shard_urls]
+
+    def shard_for(self, domain_key) -> str:
+        """Return the shard holding *domain_key*'s conversation data."""
+        if not self._shard_urls:
+            return PRIMARY_SHARD
+        if time.time() - self._loaded_at >= self._ttl_seconds:
+            self._load_map()
+        shard, moving = self._map.get(domain_key, (PRIMARY_SHARD, False))
+        if moving:
+            raise ShardMovingError(f"Domain '{domain_key}' is being moved to another shard.")
+        return shard
+
+    @contextmanager
+    def connection(self, shard=PRIMARY_SHARD):
+        """Yield a connection to *shard*; the primary shard uses the shared connection."""
+        if shard == PRIMARY_SHARD:
+            yield sync_connection
+            return
+        pool = self._get_pool(shard)
+        started = time.perf_counter()
+        conn = pool.getconn()
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, shard)
+        try:
+            yield conn
+        finally:
+            pool.putconn(conn)
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def pool_stats(self) -> dict:
+        """Gauge callback: max/size/idle/waiting connections of every open shard pool."""
+        values = {}
+        for shard, pool in list(self._pools.items()):
+            stats = pool.get_stats()
+            values[(shard, "max")] = stats.get("pool_max", 0)
+            values[(shard, "size")] = stats.get("pool_size", 0)
+            values[(shard, "idle")] = stats.get("pool_available", 0)
+            values[(shard, "waiting")] = stats.get("requests_waiting", 0)
+        return values
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
+        self._pools = {}
+
+    def after_fork(self, directory_connection):
+        """Use *directory_connection* and open new shard pools on demand (in a forked worker)."""
+        # Pools inherited open hold the parent's connections (see db.reconnect_after_fork)
+        _inherited_pools.extend(pool for pool in self._pools.values() if not pool.closed)
+        self._directory = directory_connection
+        self._pools = {}
+        self._lock = threading.Lock()
+        self.invalidate()
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _load_map(self):
+        with self._lock:
+            if time.time() - self._loaded_at < self._ttl_seconds:
+                return
+            self._directory.rollback()
+            with self._directory.cursor() as cur:
+                cur.execute("SELECT domain_key, shard, moving FROM domain_shards;")
+                self._map = {key: (shard, moving) for key, shard, moving in cur.fetchall()}
+            self._directory.rollback()
+            self._loaded_at = time.time()
+
+    def _get_pool(self, shard) -> ConnectionPool:
+        if shard not in self._shard_urls:
+            raise UnknownShardError(f"Shard '{shard}' is not configured.")
+        if shard not in self._pools:
+            with self._lock:
+                if shard not in self._pools:
+                    with psycopg.connect(self._shard_urls[shard]) as conn:
+                        migrate_conversation_schema(conn)
+                    self._pools[shard] = ConnectionPool(
+                        self._shard_urls[shard], min_size=1, max_size=self._pool_size, open=True, name=shard,
+                        kwargs={"cursor_factory": InstrumentedCursor},
+                    )
+        return self._pools[shard]
+
+
+router = ShardRouter(SHARD_DATABASE_URLS, sync_connection)
+DB_POOL_CONNECTIONS.add_callback(router.pool_stats)
+
+
+def resolve_shard(domain_key) -> str:
+    """Resolve the shard for *domain_key* once per request (cached on ``flask.g``)."""
+    if has_app_context():
+        if g.get("shard_domain") != domain_key:
+            g.shard = router.shard_for(domain_key)
+            g.shard_domain = domain_key
+        return g.shard
+    return router.shard_for(domain_key)
+
+
+def shard_connection(shard=PRIMARY_SHARD):
+    """Context manager yielding a connection to *shard*."""
+    return router.connection(shard)
+
+
+def read_shard_connection(shard=PRIMARY_SHARD):
+    """Like ``shard_connection`` but for read-only queries: the primary shard reads from the replica."""
+    return read_connection() if shard == PRIMARY_SHARD else router.connection(shard)
+
+
+def each_shard_connection():
+    """Yield a connection to every shard in turn (for dashboard reads and updates keyed by session_id)."""
+    for shard in router.all_shards():
+        with router.connection(shard) as conn:
+            yield conn
+
+
+# ---------------------------------------------------------------------------
+# Rebalancing
+# ---------------------------------------------------------------------------
+
+def _database_url(shard):
+    if shard == PRIMARY_SHARD:
+        return DATABASE_URL
+    if shard not in SHARD_DATABASE_URLS:
+        raise UnknownShardError(f"Shard '{shard}' is not configured.")
+    return SHARD_DATABASE_URLS[shard]
+
+
+def _set_mapping(directory, domain_key, shard, moving):
+    with directory.cursor() as cur:
+        cur.execute("""
+            INSERT INTO domain_shards (domain_key, shard, moving) VALUES (%s, %s, %s)
+            ON CONFLICT (domain_key)
+            DO UPDATE SET shard = EXCLUDED.shard, moving = EXCLUDED.moving, updated_at = CURRENT_TIMESTAMP;
+        """, (domain_key, shard, moving))
+    directory.commit()
+
+
+def copy_domain_rows(source, target, domain_key, history_table=table_name) -> dict:
+    """
+    Copy *domain_key*'s leads and transcripts from *source* to *target* in one
+    target transaction. Rows already on the target for those sessions are
+    replaced, so a failed move can simply be re-run.
+    """
+    with source.cursor() as cur:
+        cur.execute("SELECT session_id FROM chat_info WHERE domain = %s;", (domain_key,))
+        session_ids = [row[0] for row in cur.fetchall()]
+    uuids = valid_uuids(session_ids)
+
+    try:
+        with target.cursor() as tgt:
+            tgt.execute("DELETE FROM chat_info WHERE session_id = ANY(%s);", (session_ids,))
+            tgt.execute(f"DELETE FROM {history_table} WHERE session_id = ANY(%s::uuid[]);", (uuids,))
+            with source.cursor() as src:
+                with src.copy(f"COPY (SELECT {_CHAT_INFO_COLUMNS} FROM chat_info WHERE domain = %s) TO STDOUT",
+                              (domain_key,)) as reader, \
+                        tgt.copy(f"COPY chat_info ({_CHAT_INFO_COLUMNS}) FROM STDIN") as writer:
+                    for data in reader:
+                        writer.write(data)
+                # New ids on the target; ORDER BY id keeps each session's message order
+                with src.copy(f"COPY (SELECT session_id, message, created_at FROM {history_table} "
+                              f"WHERE session_id = ANY(%s::uuid[]) ORDER BY id) TO STDOUT", (uuids,)) as reader, \
+                        tgt.copy(f"COPY {history_table} (session_id, message, created_at) FROM STDIN") as writer:
+                    for data in reader:
+                        writer.write(data)
+            tgt.execute(f"SELECT COUNT(*) FROM {history_table} WHERE session_id = ANY(%s::uuid[]);", (uuids,))
+            messages = tgt.fetchone()[0]
+        target.commit()
+    except Exception:
+        target.rollback()
+        raise
+    finally:
+        source.rollback()
+    return {"sessions": len(session_ids), "messages": messages, "session_ids": uuids}
+
+
+def delete_domain_rows(conn, domain_key, session_ids, history_table=table_name):
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {history_table} WHERE session_id = ANY(%s::uuid[]);", (session_ids,))
+            cur.execute("DELETE FROM chat_info WHERE domain = %s;", (domain_key,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def move_domain(domain_key, target_shard, directory=None, wait_seconds=SHARD_MAP_TTL_SECONDS) -> dict:
+    """
+    Move *domain_key*'s conversation data to *target_shard*.
+
+    The domain is marked as moving and the tool waits one map TTL so every
+    worker stops serving it; chat requests for that domain are rejected for
+    the duration of the copy. Transcripts of sessions that never produced a
+    chat_info row cannot be attributed to a domain and stay on the source.
+    """
+    directory = directory or sync_connection
+    directory.rollback()
+    with directory.cursor() as cur:
+        cur.execute("SELECT shard FROM domain_shards WHERE domain_key = %s;", (domain_key,))
+        row = cur.fetchone()
+    source_shard = row[0] if row else PRIMARY_SHARD
+    if source_shard == target_shard:
+        print(f"[SHARDING] '{domain_key}' already lives on '{target_shard}'.")
+        return {"sessions": 0, "messages": 0}
+    target_url = _database_url(target_shard)
+
+    _set_mapping(directory, domain_key, source_shard, moving=True)
+    time.sleep(wait_seconds)
+    try:
+        with psycopg.connect(_database_url(source_shard)) as source, psycopg.connect(target_url) as target:
+            migrate_conversation_schema(target)
+            stats = copy_domain_rows(source, target, domain_key)
+            _set_mapping(directory, domain_key, target_shard, moving=False)
+            delete_domain_rows(source, domain_key, stats.pop("session_ids"))
+    except Exception:
+        _set_mapping(directory, domain_key, source_shard, moving=False)
+        raise
+    router.invalidate()
+
+    print(f"[SHARDING] Moved '{domain_key}' from '{source_shard}' to '{target_shard}': "
+          f"{stats['sessions']} sessions, {stats['messages']} messages")
+    return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "move":
+        sys.exit("usage: python sharding.py move <DOMAIN_KEY> <SHARD>")
+    move_domain(sys.argv[2], sys.argv[3])
@@ -3,6 +3,7 @@ from pathlib import Path
 from functools import lru_cache
 from db import sync_connection
 from config import DEFAULT_DOMAIN, agent_type
+from metrics import observe_stage, timed_stage
 
 FORMATTING_INSTRUCTION = """
 
@@ -16,6 +17,7 @@ Formatting Rules:
 """
 
 
+@timed_stage("prompt_resolution")
 def get_prompt(domain, agent_type, prompt_type):
     # Load both prompts from DB
     if prompt_type == "system" and agent_type == "sales":
@@ -28,19 +30,23 @@ def get_prompt(domain, agent_type, prompt_type):
         # if company_data is None:
         #     company_data = load_prompt_from_db(DEFAULT_DOMAIN, agent_type, "company") 
             
-        parts = []
-        if common_prompt:
-            parts.append(common_prompt)
-        if company_prompt:
-            parts.append(company_prompt)
-
-        # Join them into one prompt string and append formatting instructions
-        return "\n\n".join(parts) + FORMATTING_INSTRUCTION
+        return _sales_system_prompt(common_prompt, company_prompt)
 
     prompt =  load_prompt_from_db(domain, agent_type, prompt_type)
     return prompt or ""
 
 
+def _sales_system_prompt(common_prompt, company_prompt):
+    parts = []
+    if common_prompt:
+        parts.append(common_prompt)
+    if company_prompt:
+        parts.append(company_prompt)
+
+    # Join them into one prompt string and append formatting instructions
+    return "\n\n".join(parts) + FORMATTING_INSTRUCTION
+
+
 
 def load_prompt_from_db(domain: str, agent_type: str, prompt_type: str):
     """
@@ -62,29 +68,67 @@ def load_prompt_from_db(domain: str, agent_type: str, prompt_type: str):
     except Exception as e:
         raise RuntimeError(f"Failed to load prompt from DB: {e}")
 
+_FIND_PARENT_KEY = """
+    SELECT parent.key
+    FROM domains child
+    LEFT JOIN domains parent ON child.parent = parent.id
+    WHERE child.key = %s;
+"""
+
+_FIND_PROMPT = """
+    SELECT text 
+    FROM prompts
+    WHERE domain = %s AND agent_type = %s AND type = %s
+    LIMIT 1;
+"""
+
+
 def find_parent_key(key):
     with sync_connection.cursor() as cur:
-        cur.execute("""
-            SELECT parent.key
-            FROM domains child
-            LEFT JOIN domains parent ON child.parent = parent.id
-            WHERE child.key = %s;
-        """, (key,))
+        cur.execute(_FIND_PARENT_KEY, (key,))
         row = cur.fetchone()
         return row[0] if row else None
 
 def find_prompt(domain, agent_type, prompt_type):
     try:
         with sync_connection.cursor() as cur:
-            cur.execute("""
-                SELECT text 
-                FROM prompts
-                WHERE domain = %s AND agent_type = %s AND type = %s
-                LIMIT 1;
-            """, (domain, agent_type, prompt_type))
+            cur.execute(_FIND_PROMPT, (domain, agent_type, prompt_type))
 
             row = cur.fetchone()
             return row
         
+    except Exception as e:
+        raise RuntimeError(f"Failed to load prompt from DB: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Async variants for the ASGI chat path: same lookups on an AsyncConnection
+# ---------------------------------------------------------------------------
+
+async def aget_prompt(conn, domain, agent_type, prompt_type):
+    with observe_stage("prompt_resolution"):
+        if prompt_type == "system" and agent_type == "sales":
+            common_prompt = await aload_prompt_from_db(conn, domain, agent_type, "base-prompt")
+            company_prompt = await aload_prompt_from_db(conn, domain, agent_type, "company")
+            return _sales_system_prompt(common_prompt, company_prompt)
+
+        prompt = await aload_prompt_from_db(conn, domain, agent_type, prompt_type)
+        return prompt or ""
+
+
+async def aload_prompt_from_db(conn, domain: str, agent_type: str, prompt_type: str):
+    try:
+        async with conn.cursor() as cur:
+            await cur.execute(_FIND_PROMPT, (domain, agent_type, prompt_type))
+            row = await cur.fetchone()
+            if row is None:
+                await cur.execute(_FIND_PARENT_KEY, (domain,))
+                parent = await cur.fetchone()
+                await cur.execute(_FIND_PROMPT, (parent[0] if parent else None, agent_type, prompt_type))
+                row = await cur.fetchone()
+                if row is None:
+                    print(f"Prompt not found in DB for parent Domain: {domain}/{agent_type}/{prompt_type}")
+                    return None
+        return row[0]
     except Exception as e:
         raise RuntimeError(f"Failed to load prompt from DB: {e}")
\ No newline at end of file
@@ -6,6 +6,10 @@ import pytest
 # This allows pytest to find and import the 'app' module.
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# No background warm-up during tests: its queries would land in the query-stats and plan
+# tests. test_warmup.py runs the warm-up steps explicitly.
+os.environ.setdefault("WARMUP_ENABLED", "False")
+
 # Now that the path is set, we can import the app
 from app import app as flask_app
 
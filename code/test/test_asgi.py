@@ -0,0 +1,115 @@
+import asyncio
+import time
+import uuid
+from http import HTTPStatus
+
+import httpx
+import pytest
+from langchain_core.messages import HumanMessage
+from starlette.testclient import TestClient
+
+import llm_api
+import llm_backend
+from asgi import create_asgi_app
+from async_db import close_async_pools
+from conversation_processor import conversation_processor
+from db import sync_connection
+from local_llm import LocalChatModel
+
+ORIGIN = {"Origin": "http://example.com"}
+
+
+@pytest.fixture
+def asgi_client():
+    with TestClient(create_asgi_app()) as client:
+        yield client
+
+
+@pytest.fixture
+def local_models(monkeypatch):
+    models = {purpose: llm_backend.create_chat_model(purpose, "local") for purpose in llm_backend.LLM_PURPOSES}
+    monkeypatch.setattr(llm_api, "get_chat_model", models.get)
+    monkeypatch.setattr(conversation_processor, "get_chat_model", models.get)
+    return models
+
+
+def test_history_creates_then_returns_session(asgi_client):
+    session_id = str(uuid.uuid4())
+
+    created = asgi_client.get("/history", params={"session_id": session_id}, headers=ORIGIN)
+    assert created.status_code == HTTPStatus.CREATED
+    assert created.json()["session_id"] == session_id
+    assert [message["type"] for message in created.json()["history"]] == ["ai"]
+    assert "X-Request-ID" in created.headers
+
+    again = asgi_client.get("/history", params={"session_id": session_id}, headers=ORIGIN)
+    assert again.status_code == HTTPStatus.OK
+    assert again.json()["history"] == created.json()["history"]
+
+
+def test_history_validation_matches_flask(asgi_client):
+    invalid = asgi_client.get("/history", params={"session_id": "invalid-uuid-format"}, headers=ORIGIN)
+    assert invalid.status_code == HTTPStatus.BAD_REQUEST
+    assert invalid.json() == {"success": False, "error": "Invalid session id format"}
+
+    unknown = asgi_client.get("/history", params={"session_id": str(uuid.uuid4())},
+                              headers={"Origin": "http://unknown.invalid"})
+    assert unknown.json()["error"] == "Incorrect Address"
+
+
+def test_chat_runs_on_async_path(asgi_client, local_models):
+    session_id = str(uuid.uuid4())
+    response = asgi_client.post("/chat", headers=ORIGIN, json={
+        "input": "Hi, I'm Local User", "session_id": session_id, "request_type": "sales"})
+    llm_api.drain_background_jobs()
+
+    assert response.status_code == HTTPStatus.OK
+    expected = local_models["chat"].invoke([HumanMessage(content="Hi, I'm Local User")]).content
+    assert response.json() == {"success": True, "response": expected}
+    assert response.headers["access-control-allow-origin"] == "*"
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM chat_table WHERE session_id = %s;", (session_id,))
+        assert cur.fetchone()[0] == 2
+        cur.execute("SELECT contact_name FROM chat_info WHERE session_id = %s;", (session_id,))
+        assert cur.fetchone() == ("Local User",)
+    sync_connection.rollback()
+
+
+def test_chat_validation_error(asgi_client):
+    response = asgi_client.post("/chat", headers=ORIGIN, json={
+        "input": "  ", "session_id": str(uuid.uuid4()), "request_type": "sales"})
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json()["error"] == "Please enter a message before sending."
+
+
+def test_other_routes_are_served_by_flask(asgi_client):
+    assert asgi_client.get("/health").json()["status"] == "alive"
+    assert asgi_client.get("/api/openapi.json").status_code == HTTPStatus.OK
+
+
+def test_concurrent_chats_wait_on_the_llm_together(monkeypatch):
+    # 40 chats against a model answering after 0.5s: concurrent on one event loop, not one by one
+    model = LocalChatModel(latency_ms=500, reply_tokens=5)
+    monkeypatch.setattr(llm_api, "get_chat_model", lambda purpose: model)
+    monkeypatch.setattr(llm_api, "_process_conversation_async", lambda *args: None)
+
+    async def run():
+        transport = httpx.ASGITransport(app=create_asgi_app())
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                started = time.perf_counter()
+                responses = await asyncio.gather(*[
+                    client.post("/chat", headers=ORIGIN, json={
+                        "input": f"question {n}", "session_id": str(uuid.uuid4()), "request_type": "sales"})
+                    for n in range(40)
+                ])
+                return time.perf_counter() - started, responses
+        finally:
+            await close_async_pools()
+
+    elapsed, responses = asyncio.run(run())
+
+    assert all(response.status_code == HTTPStatus.OK for response in responses)
+    assert elapsed < 5
@@ -0,0 +1,92 @@
+import uuid
+import pytest
+from http import HTTPStatus
+from app import app
+from db import sync_connection
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def leads():
+    # Two throwaway leads, removed again after each test
+    session_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        for session_id in session_ids:
+            cur.execute("INSERT INTO chat_info (session_id, remarks) VALUES (%s, 'original');", (session_id,))
+        sync_connection.commit()
+    yield session_ids
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute("DELETE FROM chat_info WHERE session_id = ANY(%s);", (session_ids,))
+        sync_connection.commit()
+
+def _fetch_lead(session_id):
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute("SELECT status, remarks, is_active FROM chat_info WHERE session_id = %s;", (session_id,))
+        return cur.fetchone()
+
+def test_bulk_update_applies_each_row(client, leads):
+    payload = {"updates": [
+        {"session_id": leads[0], "status": "CLOSED"},
+        {"session_id": leads[1], "remarks": "stale", "is_active": False},
+    ]}
+    response = client.patch('/chat-info/bulk', json=payload)
+    assert response.status_code == HTTPStatus.OK
+    data = response.get_json()
+    assert data["success"] is True
+    assert data["updated"] == 2
+    assert data["not_found"] == []
+
+    assert _fetch_lead(leads[0]) == ("CLOSED", "original", True)
+    assert _fetch_lead(leads[1]) == ("OPEN", "stale", False)
+
+def test_bulk_update_reports_unknown_sessions(client, leads):
+    unknown = str(uuid.uuid4())
+    payload = {"updates": [
+        {"session_id": leads[0], "status": "QUALIFYING"},
+        {"session_id": unknown, "status": "CLOSED"},
+    ]}
+    response = client.patch('/chat-info/bulk', json=payload)
+    assert response.status_code == HTTPStatus.OK
+    data = response.get_json()
+    assert data["updated"] == 1
+    assert data["not_found"] == [unknown]
+
+def test_bulk_update_rejects_whole_batch_on_invalid_row(client, leads):
+    payload = {"updates": [
+        {"session_id": leads[0], "status": "CLOSED"},
+        {"session_id": leads[1], "status": "NOT_A_STATUS"},
+    ]}
+    response = client.patch('/chat-info/bulk', json=payload)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.get_json()["error"] == "updates[1]: Status not allowed"
+    # Nothing is written when any row fails validation
+    assert _fetch_lead(leads[0])[0] == "OPEN"
+
+@pytest.mark.parametrize("payload, error", [
+    ({}, "data is required"),
+    ({"updates": []}, "updates must be a non-empty list"),
+    ({"updates": [{"status": "CLOSED"}]}, "updates[0]: session_id is required"),
+    ({"updates": [{"session_id": "not-a-uuid"}]}, "updates[0]: Invalid session id format"),
+    ({"updates": [{"session_id": "123e4567-e89b-12d3-a456-426614174000", "is_active": "no"}]}, "updates[0]: Invalid input"),
+    ({"updates": [{"session_id": "123e4567-e89b-12d3-a456-426614174000"},
+                  {"session_id": "123e4567-e89b-12d3-a456-426614174000"}]}, "updates[1]: Duplicate session id"),
+])
+def test_bulk_update_validation_errors(client, payload, error):
+    response = client.patch('/chat-info/bulk', json=payload)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.get_json()["error"] == error
+
+@pytest.mark.parametrize("is_active", [0, "", "false", 1])
+def test_single_update_rejects_non_boolean_is_active(client, leads, is_active):
+    # Falsy non-booleans used to pass validation and fail in the database (500)
+    response = client.patch('/chat-info', json={"session_id": leads[0], "is_active": is_active})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.get_json()["error"] == "Invalid input"
+    assert _fetch_lead(leads[0]) == ("OPEN", "original", True)
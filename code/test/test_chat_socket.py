@@ -0,0 +1,126 @@
+import uuid
+
+import pytest
+from langchain_core.messages import HumanMessage
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import chat_socket
+import llm_api
+import llm_backend
+from asgi import create_asgi_app
+from conversation_processor import conversation_processor
+from db import sync_connection
+from local_llm import LocalChatModel
+
+ORIGIN = {"Origin": "http://example.com"}
+
+
+@pytest.fixture
+def asgi_client():
+    with TestClient(create_asgi_app()) as client:
+        yield client
+
+
+@pytest.fixture
+def local_models(monkeypatch):
+    models = {purpose: llm_backend.create_chat_model(purpose, "local") for purpose in llm_backend.LLM_PURPOSES}
+    monkeypatch.setattr(llm_api, "get_chat_model", models.get)
+    monkeypatch.setattr(conversation_processor, "get_chat_model", models.get)
+    return models
+
+
+def _connect(client, session_id=None, headers=ORIGIN):
+    return client.websocket_connect(f"/ws/chat?session_id={session_id or uuid.uuid4()}", headers=headers)
+
+
+def _receive_reply(ws) -> tuple[list, dict]:
+    tokens = []
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] != "token":
+            return tokens, frame
+        tokens.append(frame["text"])
+
+
+def test_reply_is_streamed_and_stored(asgi_client, local_models):
+    session_id = str(uuid.uuid4())
+    with _connect(asgi_client, session_id) as ws:
+        ws.send_json({"type": "message", "input": "Hi, I'm Local User", "request_type": "sales"})
+        tokens, done = _receive_reply(ws)
+    llm_api.drain_background_jobs()
+
+    expected = local_models["chat"].invoke([HumanMessage(content="Hi, I'm Local User")]).content
+    assert done == {"type": "done", "response": expected}
+    assert len(tokens) == local_models["chat"].reply_tokens and "".join(tokens) == expected
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute("SELECT message FROM chat_table WHERE session_id = %s ORDER BY id;", (session_id,))
+        messages = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT contact_name FROM chat_info WHERE session_id = %s;", (session_id,))
+        assert cur.fetchone() == ("Local User",)
+    sync_connection.rollback()
+    assert [(m["type"], m["data"]["content"]) for m in messages] == [("human", "Hi, I'm Local User"), ("ai", expected)]
+
+
+def test_connect_is_rejected_for_unknown_origin(asgi_client):
+    with _connect(asgi_client, headers={"Origin": "http://unknown.invalid"}) as ws:
+        assert ws.receive_json() == {"type": "error", "error": "Incorrect Address"}
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == chat_socket.POLICY_VIOLATION
+
+
+def test_ping_invalid_frames_and_connection_gauge(asgi_client):
+    with _connect(asgi_client) as ws:
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+        assert chat_socket.connection_stats() == {(): 1}
+
+        ws.send_text("not json")
+        assert ws.receive_json() == {"type": "error", "error": "Invalid frame"}
+        ws.send_json({"type": "message", "input": "   ", "request_type": "sales"})
+        assert ws.receive_json() == {"type": "error", "error": "Please enter a message before sending."}
+        # Errors leave the socket open
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+    assert chat_socket.connection_stats() == {(): 0}
+
+
+def test_messages_beyond_the_pending_limit_are_refused(asgi_client, monkeypatch):
+    model = LocalChatModel(latency_ms=300, reply_tokens=3)
+    monkeypatch.setattr(llm_api, "get_chat_model", lambda purpose: model)
+    monkeypatch.setattr(llm_api, "_process_conversation_async", lambda *args: None)
+    monkeypatch.setattr(chat_socket, "WEBSOCKET_MAX_PENDING_MESSAGES", 1)
+
+    with _connect(asgi_client) as ws:
+        for n in range(3):
+            ws.send_json({"type": "message", "input": f"question {n}", "request_type": "sales"})
+        frames = [ws.receive_json()]
+        while sum(frame["type"] == "done" for frame in frames) < 2:
+            frames.append(ws.receive_json())
+
+    # The first is answered, the second waits for it and the third finds the queue full
+    assert frames[0]["type"] == "error" and "wait for the reply" in frames[0]["error"]
+    assert [frame["type"] for frame in frames[1:]] == ["token"] * 3 + ["done"] + ["token"] * 3 + ["done"]
+
+
+def test_idle_socket_is_pinged_then_closed(asgi_client, monkeypatch):
+    monkeypatch.setattr(chat_socket, "WEBSOCKET_PING_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(chat_socket, "WEBSOCKET_IDLE_TIMEOUT_SECONDS", 0.2)
+
+    with _connect(asgi_client) as ws:
+        assert ws.receive_json() == {"type": "ping"}
+        with pytest.raises(WebSocketDisconnect) as closed:
+            while True:
+                ws.receive_json()
+    assert closed.value.code == chat_socket.GOING_AWAY
+
+
+def test_connections_over_capacity_are_refused(asgi_client, monkeypatch):
+    monkeypatch.setattr(chat_socket, "WEBSOCKET_MAX_CONNECTIONS", 0)
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with _connect(asgi_client):
+            pass
+    assert closed.value.code == chat_socket.TRY_AGAIN_LATER
@@ -0,0 +1,61 @@
+import psycopg
+import pytest
+
+from api.validators import origin_directory
+from benchmarks import datagen
+from config import DATABASE_URL
+
+
+@pytest.fixture
+def synthetic():
+    datagen.delete_synthetic_data(DATABASE_URL)
+    yield
+    datagen.delete_synthetic_data(DATABASE_URL)
+
+
+def test_generate_seeds_domains_with_parent_chains(synthetic):
+    summary = datagen.generate(DATABASE_URL, messages=200, leads=30, domains=40, max_depth=3, seed=1)
+
+    assert (summary["domains"], summary["leads"]) == (40, 30)
+    assert 0 < summary["messages"] <= 200
+    assert datagen.synthetic_counts(DATABASE_URL) == {key: summary[key] for key in ("domains", "leads", "messages")}
+
+    with psycopg.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        cur.execute("""
+            WITH RECURSIVE chain AS (
+                SELECT id, parent, 1 AS depth FROM domains WHERE address LIKE %s
+                UNION ALL
+                SELECT chain.id, domains.parent, chain.depth + 1
+                FROM chain JOIN domains ON domains.id = chain.parent
+                WHERE domains.address LIKE %s
+            )
+            SELECT max(depth), bool_and(parent IS NOT NULL) FROM chain;
+        """, (f"%.{datagen.SYNTHETIC_SUFFIX}",) * 2)
+        max_depth, every_parent_exists = cur.fetchone()
+        cur.execute("SELECT count(*) FROM chat_info c LEFT JOIN domains d ON d.key = c.domain "
+                    "WHERE c.metadata ? 'synthetic' AND d.id IS NULL;")
+        orphan_leads = cur.fetchone()[0]
+    assert 1 < max_depth <= 3
+    assert every_parent_exists
+    assert orphan_leads == 0
+
+
+def test_generated_sessions_are_served_by_history(client, synthetic):
+    datagen.generate(DATABASE_URL, messages=50, leads=10, domains=3, seed=2)
+    session_id, address = datagen.sample_sessions(DATABASE_URL, 1)[0]
+    # Domains inserted behind the app's back are seen after ORIGIN_MAP_TTL_SECONDS, or at once after this
+    origin_directory.refresh()
+
+    response = client.get("/history", query_string={"session_id": session_id},
+                          headers={"Origin": f"https://{address}"})
+    assert response.status_code == 200
+    assert len(response.get_json()["history"]) >= 1
+
+
+def test_delete_removes_only_synthetic_rows(synthetic):
+    datagen.generate(DATABASE_URL, messages=20, leads=5, domains=2, seed=3)
+    assert datagen.delete_synthetic_data(DATABASE_URL)["leads"] == 5
+    assert datagen.synthetic_counts(DATABASE_URL) == {"domains": 0, "leads": 0, "messages": 0}
+    with psycopg.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        cur.execute("SELECT key FROM domains WHERE id = 1;")
+        assert cur.fetchone() == ("COMMON",)
@@ -0,0 +1,62 @@
+import pytest
+from config import DATABASE_URL
+from db import sync_connection
+from db_router import ReplicaRouter
+
+
+@pytest.fixture
+def make_router():
+    routers = []
+
+    def factory(replica_url, **kwargs):
+        router = ReplicaRouter(replica_url, sync_connection, **kwargs)
+        routers.append(router)
+        return router
+
+    yield factory
+    for router in routers:
+        router.close()
+
+
+def test_without_replica_reads_use_primary(make_router):
+    router = make_router(None)
+    with router.connection() as conn:
+        assert conn is sync_connection
+    assert router.status()["configured"] is False
+
+
+def test_healthy_replica_serves_reads(make_router):
+    # A primary is never "in recovery", so it reports zero lag and can stand in for a replica
+    router = make_router(DATABASE_URL)
+    with router.connection() as conn:
+        assert conn is not sync_connection
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+    status = router.status()
+    assert status["healthy"] is True
+    assert status["lag_seconds"] == 0
+
+
+def test_lag_above_threshold_falls_back_to_primary(make_router):
+    router = make_router(DATABASE_URL, max_lag_seconds=-1)
+    with router.connection() as conn:
+        assert conn is sync_connection
+    assert router.status()["healthy"] is False
+
+
+def test_unreachable_replica_falls_back_to_primary(make_router):
+    router = make_router("postgresql://postgres@127.0.0.1:1/chatdb")
+    with router.connection() as conn:
+        assert conn is sync_connection
+    status = router.status()
+    assert status["healthy"] is False
+    assert status["lag_seconds"] is None
+
+
+def test_lag_is_rechecked_only_after_interval(make_router):
+    router = make_router(DATABASE_URL, check_interval_seconds=3600)
+    with router.connection():
+        pass
+    checked_at = router.status()["checked_at"]
+    with router.connection():
+        pass
+    assert router.status()["checked_at"] == checked_at
@@ -87,6 +87,14 @@ class TestExtractAddress:
         with pytest.raises(InvalidWebsiteURLError):
             DomainService.extract_address("   ")
 
+    def test_leading_wildcard_is_kept(self):
+        assert DomainService.extract_address("https://*.example.com/about") == "*.example.com"
+
+    @pytest.mark.parametrize("url", ["*.com", "shop.*.example.com", "*shop.example.com"])
+    def test_misplaced_or_bare_tld_wildcard_raises(self, url):
+        with pytest.raises(InvalidWebsiteURLError):
+            DomainService.extract_address(url)
+
 
 # ---------------------------------------------------------------------------
 # DomainService.generate_key
@@ -146,6 +154,16 @@ class TestAddDomain:
         _, kwargs = mock_repo.create.call_args_list[0]
         assert kwargs["address"] == "example.com"
 
+    def test_no_www_row_is_created(self, service, mock_repo):
+        # www.example.com is matched from the example.com row (domains.matcher)
+        service.add_domain("https://www.example.com/page")
+        assert mock_repo.create.call_count == 1
+
+    def test_wildcard_shares_the_key_of_its_domain(self, service, mock_repo):
+        service.add_domain("*.example.com")
+        _, kwargs = mock_repo.create.call_args
+        assert (kwargs["address"], kwargs["key"]) == ("*.example.com", "EXAMPLE_COM")
+
 
 # ---------------------------------------------------------------------------
 # DomainService.add_domain – error paths
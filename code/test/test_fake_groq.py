@@ -0,0 +1,39 @@
+import json
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_groq import ChatGroq
+
+from benchmarks.fake_groq import CONTACT_JSON, NAME_JSON, FakeGroqServer
+
+
+@pytest.fixture
+def fake():
+    server = FakeGroqServer(latency_ms=0, tokens_per_second=0, reply_tokens=5).start()
+    yield server
+    server.stop()
+
+
+def _llm(fake, **kwargs):
+    return ChatGroq(groq_api_key="test", model="fake-model", base_url=fake.url, **kwargs)
+
+
+def test_chat_reply_and_token_usage(fake):
+    response = _llm(fake).invoke([HumanMessage(content="hello there")])
+
+    assert len(response.content.split()) == 5
+    assert response.usage_metadata["output_tokens"] == 5
+    assert fake.calls == {"chat": 1, "extraction": 0}
+
+
+def test_extraction_prompts_get_canned_json(fake):
+    llm = _llm(fake)
+    assert json.loads(llm.invoke([SystemMessage(content="Respond ONLY with valid JSON")]).content) == CONTACT_JSON
+    assert json.loads(llm.invoke([SystemMessage(content='{"name_detected": true}')]).content) == NAME_JSON
+    assert fake.calls["extraction"] == 2
+
+
+def test_streaming_reply(fake):
+    chunks = [chunk.content for chunk in _llm(fake, streaming=True).stream([HumanMessage(content="hi")])]
+
+    assert len([chunk for chunk in chunks if chunk]) == 5
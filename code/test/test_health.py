@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+
+import pytest
+
+import sharding
+from api import health
+from metrics import LLM_CALL_ERRORS, LLM_CALL_SECONDS
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    health._cache.update({"report": None, "checked_at": 0.0})
+    yield
+    health._cache.update({"report": None, "checked_at": 0.0})
+
+
+@pytest.fixture
+def database_down(monkeypatch):
+    @contextmanager
+    def unreachable(shard):
+        raise ConnectionError("connection refused")
+        yield
+
+    monkeypatch.setattr(sharding, "shard_connection", unreachable)
+
+
+def test_liveness_does_no_io(client, database_down):
+    response = client.get("/health")
+
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "alive"
+
+
+def test_deep_check_reports_dependencies(client):
+    response = client.get("/health/deep")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["status"] == "ok"
+    assert body["databases"]["primary"]["ok"] is True
+    assert body["databases"]["primary"]["latency_ms"] >= 0
+    assert body["replica"]["configured"] is False
+    assert body["background_queues"]["conversation"] == 0
+    assert set(body["llm"]) >= {"calls", "errors", "error_rate"}
+
+
+def test_deep_check_is_cached(client, monkeypatch):
+    calls = []
+    check = health.check_dependencies
+    monkeypatch.setattr(health, "check_dependencies", lambda: calls.append(1) or check())
+
+    client.get("/health/deep")
+    assert client.get("/health/deep").get_json()["age_seconds"] >= 0
+    assert len(calls) == 1
+
+    health._cache["checked_at"] -= health.HEALTH_CHECK_CACHE_SECONDS
+    client.get("/health/deep")
+    assert len(calls) == 2
+
+
+def test_unreachable_database_is_down(client, database_down):
+    response = client.get("/health/deep")
+
+    assert response.status_code == 503
+    body = response.get_json()
+    assert body["status"] == "down"
+    assert body["databases"]["primary"] == {"ok": False, "latency_ms": None, "error": "connection refused"}
+
+
+def test_llm_error_rate_since_previous_check_degrades(client):
+    health.cached_health_report()
+    LLM_CALL_SECONDS.observe(0.2, "health-test")
+    for _ in range(3):
+        LLM_CALL_ERRORS.inc("health-test")
+
+    report = health.cached_health_report(max_age_seconds=0)
+    assert report["llm"]["calls"] == 4
+    assert report["llm"]["errors"] == 3
+    assert report["llm"]["error_rate"] == 0.75
+    assert report["status"] == "degraded"
+
+    # The next window has no calls, so no rate
+    assert health.cached_health_report(max_age_seconds=0)["llm"]["error_rate"] is None
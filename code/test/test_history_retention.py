@@ -0,0 +1,142 @@
+import gzip
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+import worker_lifecycle
+from db import sync_connection
+from history_retention import (
+    apply_retention,
+    create_partitioned_chat_table,
+    ensure_partitions,
+    list_partitions,
+    migrate_to_partitioned,
+    month_start,
+    table_kind,
+)
+
+TEST_TABLE = "test_retention_chat"
+NOW = datetime(2025, 6, 15, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def history_table():
+    sync_connection.rollback()
+    yield TEST_TABLE
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TEST_TABLE} CASCADE;")
+        cur.execute(f"DROP SEQUENCE IF EXISTS {TEST_TABLE}_id_seq;")
+    sync_connection.commit()
+
+
+def _insert(created_at, session_id):
+    with sync_connection.cursor() as cur:
+        cur.execute(
+            f"INSERT INTO {TEST_TABLE} (session_id, message, created_at) VALUES (%s, %s, %s);",
+            (session_id, json.dumps({"type": "human", "data": {"content": "hi\\nthere"}}), created_at),
+        )
+    sync_connection.commit()
+
+
+def test_month_start_rolls_over_years():
+    assert month_start(datetime(2025, 12, 31, tzinfo=timezone.utc), 1) == datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert month_start(datetime(2025, 1, 5, tzinfo=timezone.utc), -13) == datetime(2023, 12, 1, tzinfo=timezone.utc)
+
+
+def test_partitions_are_created_ahead(history_table):
+    create_partitioned_chat_table(sync_connection, history_table)
+    sync_connection.commit()
+    ensure_partitions(sync_connection, history_table, months_ahead=2, now=NOW)
+
+    assert table_kind(sync_connection, history_table) == "p"
+    assert list_partitions(sync_connection, history_table) == [
+        f"{history_table}_default",
+        f"{history_table}_p202506",
+        f"{history_table}_p202507",
+        f"{history_table}_p202508",
+    ]
+
+
+def test_rows_in_default_move_to_the_new_partition(history_table):
+    create_partitioned_chat_table(sync_connection, history_table)
+    sync_connection.commit()
+    ensure_partitions(sync_connection, history_table, months_ahead=0, now=NOW)
+    # Written after the pre-created window ran out
+    session_id = str(uuid.uuid4())
+    _insert(datetime(2025, 8, 3, tzinfo=timezone.utc), session_id)
+    _insert(datetime(2025, 9, 1, tzinfo=timezone.utc), session_id)
+
+    created = ensure_partitions(sync_connection, history_table, months_ahead=0, now=datetime(2025, 8, 1, tzinfo=timezone.utc))
+
+    assert created == [f"{history_table}_p202508"]
+    with sync_connection.cursor() as cur:
+        cur.execute(f"SELECT created_at, tableoid::regclass::text FROM {history_table} ORDER BY id;")
+        rows = cur.fetchall()
+    sync_connection.commit()
+    assert [partition for _, partition in rows] == [f"{history_table}_p202508", f"{history_table}_default"]
+
+
+def test_partitions_are_maintained_with_archival_off(monkeypatch):
+    started = []
+    monkeypatch.setattr(worker_lifecycle, "CHAT_RETENTION_ENABLED", False)
+    monkeypatch.setattr(worker_lifecycle, "PURGE_ENABLED", False)
+    monkeypatch.setattr(worker_lifecycle, "start_retention_worker", lambda **kwargs: started.append(kwargs))
+
+    worker_lifecycle.start_maintenance_workers()
+
+    assert started == [{"archive": False}]
+
+
+def test_expired_partitions_are_archived_and_dropped(history_table, tmp_path):
+    create_partitioned_chat_table(sync_connection, history_table)
+    sync_connection.commit()
+    ensure_partitions(sync_connection, history_table, months_ahead=0, now=datetime(2024, 3, 1, tzinfo=timezone.utc))
+    session_id = str(uuid.uuid4())
+    _insert(datetime(2024, 3, 10, tzinfo=timezone.utc), session_id)
+    _insert(datetime(2024, 3, 11, tzinfo=timezone.utc), session_id)
+
+    archived = apply_retention(sync_connection, history_table, retention_months=12, archive_dir=str(tmp_path), now=NOW)
+
+    assert archived == [f"{history_table}_p202403"]
+    assert f"{history_table}_p202403" not in list_partitions(sync_connection, history_table)
+    with gzip.open(tmp_path / f"{history_table}_p202403.ndjson.gz", "rt", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["session_id"] for row in rows] == [session_id, session_id]
+    assert rows[0]["message"]["data"]["content"] == "hi\\nthere"
+
+
+def test_recent_partitions_are_kept(history_table, tmp_path):
+    create_partitioned_chat_table(sync_connection, history_table)
+    sync_connection.commit()
+    _insert(datetime(2025, 6, 1, tzinfo=timezone.utc), str(uuid.uuid4()))
+
+    assert apply_retention(sync_connection, history_table, retention_months=12, archive_dir=str(tmp_path), now=NOW) == []
+    assert not list(tmp_path.iterdir())
+
+
+def test_migrate_plain_table_keeps_rows_and_ids(history_table):
+    with sync_connection.cursor() as cur:
+        cur.execute(f"""
+            CREATE TABLE {history_table} (
+                id SERIAL PRIMARY KEY,
+                session_id UUID NOT NULL,
+                message JSONB NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            CREATE INDEX idx_{history_table}_session_id ON {history_table} (session_id);
+        """)
+    sync_connection.commit()
+    session_id = str(uuid.uuid4())
+    _insert(datetime(2023, 1, 1, tzinfo=timezone.utc), session_id)
+
+    legacy = migrate_to_partitioned(sync_connection, history_table, now=NOW)
+
+    assert legacy == f"{history_table}_p202506"
+    assert table_kind(sync_connection, history_table) == "p"
+    _insert(datetime(2025, 7, 2, tzinfo=timezone.utc), session_id)
+    with sync_connection.cursor() as cur:
+        cur.execute(f"SELECT id, tableoid::regclass::text FROM {history_table} WHERE session_id = %s ORDER BY id;", (session_id,))
+        rows = cur.fetchall()
+    assert rows == [(1, legacy), (2, f"{history_table}_p202507")]
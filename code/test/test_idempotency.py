@@ -0,0 +1,162 @@
+import threading
+import time
+import uuid
+from http import HTTPStatus
+
+import psycopg
+import pytest
+from starlette.testclient import TestClient
+
+import api.chat
+import asgi
+import idempotency
+import llm_api
+import llm_backend
+from asgi import create_asgi_app
+from db import sync_connection
+from idempotency import request_fingerprint, run_once
+
+ORIGIN = {"Origin": "http://example.com"}
+
+
+@pytest.fixture
+def local_chat(monkeypatch):
+    model = llm_backend.create_chat_model("chat", "local")
+    monkeypatch.setattr(llm_api, "get_chat_model", lambda purpose: model)
+    monkeypatch.setattr(llm_api, "_process_conversation_async", lambda *args: None)
+
+
+def _counting(monkeypatch, module, name):
+    calls = []
+    original = getattr(module, name)
+
+    def counted(*args):
+        calls.append(args)
+        return original(*args)
+    monkeypatch.setattr(module, name, counted)
+    return calls
+
+
+def _chat(client, session_id, key, message="Hello"):
+    return client.post("/chat", json={"input": message, "request_type": "sales", "session_id": session_id},
+                       headers={**ORIGIN, "Idempotency-Key": key})
+
+
+def test_retry_replays_without_a_second_llm_call(client, local_chat, monkeypatch):
+    calls = _counting(monkeypatch, api.chat, "get_groq_response")
+    session_id, key = str(uuid.uuid4()), str(uuid.uuid4())
+
+    first = _chat(client, session_id, key)
+    retry = _chat(client, session_id, key)
+    other = _chat(client, session_id, str(uuid.uuid4()))
+
+    assert first.status_code == retry.status_code == HTTPStatus.OK
+    assert retry.get_json() == first.get_json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers and "Idempotent-Replayed" not in other.headers
+    assert len(calls) == 2
+    history = client.get("/history", query_string={"session_id": session_id}, headers=ORIGIN).get_json()["history"]
+    assert [turn["content"] for turn in history if turn["type"] == "human"] == ["Hello", "Hello"]
+
+
+def test_key_reuse_for_another_message_and_bad_keys(client, local_chat):
+    session_id, key = str(uuid.uuid4()), str(uuid.uuid4())
+    _chat(client, session_id, key)
+
+    reused = _chat(client, session_id, key, message="Something else")
+    assert reused.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert not reused.get_json()["success"]
+    for bad in ("", "   ", "k" * 256):
+        response = _chat(client, session_id, bad)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert response.get_json()["error"] == "Invalid Idempotency-Key"
+
+
+def test_keyed_request_without_session_id_leaves_the_store_usable(client, local_chat):
+    response = client.post("/chat", json={"input": "Hello", "request_type": "sales"},
+                           headers={**ORIGIN, "Idempotency-Key": "abc"})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert "session_id" in response.get_json()["error"]
+
+    assert _chat(client, str(uuid.uuid4()), "k2").status_code == HTTPStatus.OK
+
+
+def test_store_errors_roll_back_the_connection():
+    fingerprint = request_fingerprint("Hello", "sales")
+    with pytest.raises(psycopg.errors.NotNullViolation):
+        run_once(None, "abc", fingerprint, lambda: ({"success": True}, HTTPStatus.OK))
+
+    ok = run_once(str(uuid.uuid4()), "k2", fingerprint, lambda: ({"success": True}, HTTPStatus.OK))
+    assert ok == ({"success": True}, HTTPStatus.OK, False)
+
+
+def test_concurrent_duplicates_wait_for_the_first():
+    session_id, key = str(uuid.uuid4()), str(uuid.uuid4())
+    fingerprint = request_fingerprint("Hello", "sales")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        # Duplicates arrive while the first request is in flight
+        time.sleep(0.3)
+        return {"success": True, "response": "Hi"}, HTTPStatus.OK
+
+    results = []
+    def send():
+        results.append(run_once(session_id, key, fingerprint, compute))
+    threads = [threading.Thread(target=send) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert {(body["response"], status) for body, status, _ in results} == {("Hi", HTTPStatus.OK)}
+    assert sorted(replayed for _, _, replayed in results) == [False, True, True, True, True]
+
+
+def test_failures_release_the_key():
+    session_id, key = str(uuid.uuid4()), str(uuid.uuid4())
+    fingerprint = request_fingerprint("Hello", "sales")
+
+    failed = run_once(session_id, key, fingerprint, lambda: ({"success": False}, HTTPStatus.INTERNAL_SERVER_ERROR))
+    assert failed == ({"success": False}, HTTPStatus.INTERNAL_SERVER_ERROR, False)
+
+    def boom():
+        raise RuntimeError("LLM down")
+    with pytest.raises(RuntimeError):
+        run_once(session_id, key, fingerprint, boom)
+
+    retried = run_once(session_id, key, fingerprint, lambda: ({"success": True}, HTTPStatus.OK))
+    assert retried == ({"success": True}, HTTPStatus.OK, False)
+
+
+def test_asgi_chat_replays(local_chat, monkeypatch):
+    calls = _counting(monkeypatch, asgi, "aget_groq_response")
+    session_id, key = str(uuid.uuid4()), str(uuid.uuid4())
+    with TestClient(create_asgi_app()) as asgi_client:
+        first = _chat(asgi_client, session_id, key)
+        retry = _chat(asgi_client, session_id, key)
+
+    assert first.status_code == retry.status_code == HTTPStatus.OK
+    assert retry.json() == first.json() and retry.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+
+def test_asgi_claims_purge_expired_keys(local_chat, monkeypatch):
+    stale_session = str(uuid.uuid4())
+    with sync_connection.cursor() as cur:
+        cur.execute("""
+            INSERT INTO chat_idempotency (session_id, idempotency_key, fingerprint, status_code, response, created_at)
+            VALUES (%s, 'stale', 'x', 200, '{}', now() - make_interval(secs => %s));
+        """, (stale_session, idempotency.IDEMPOTENCY_TTL_SECONDS + 60))
+    sync_connection.commit()
+    monkeypatch.setattr(idempotency, "_last_purge", float("-inf"))
+
+    with TestClient(create_asgi_app()) as asgi_client:
+        assert _chat(asgi_client, str(uuid.uuid4()), str(uuid.uuid4())).status_code == HTTPStatus.OK
+
+    with sync_connection.cursor() as cur:
+        cur.execute("SELECT count(*) FROM chat_idempotency WHERE session_id = %s;", (stale_session,))
+        assert cur.fetchone() == (0,)
+    sync_connection.commit()
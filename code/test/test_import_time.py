@@ -0,0 +1,22 @@
+from benchmarks import import_time
+
+
+def test_parse_importtime():
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |     _io\n"
+              "import time:      3000 |       5000 |   flask\n"
+              "import time:       900 |       9000 | app\n")
+    modules = import_time.parse_importtime(stderr)
+    assert modules["app"] == (900, 9000, 0)
+    assert modules["flask"] == (3000, 5000, 1)
+    assert import_time.deferred_modules_imported({"langchain_postgres.v2": (1, 1, 2), "flask": (1, 1, 1)}) == [
+        "langchain_postgres.v2"]
+
+
+def test_app_import_defers_heavy_modules_and_meets_budget():
+    result = import_time.measure_import("app", runs=2)
+
+    assert import_time.deferred_modules_imported(result["modules"]) == []
+    assert result["total_ms"] <= import_time.IMPORT_TIME_BUDGET_MS, (
+        f"import app took {result['total_ms']} ms, budget {import_time.IMPORT_TIME_BUDGET_MS} ms; "
+        "run python -m benchmarks.import_time to see the slowest imports")
@@ -0,0 +1,65 @@
+import json
+import time
+import uuid
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_groq import ChatGroq
+
+import llm_api
+import llm_backend
+from conversation_processor import conversation_processor
+from db import sync_connection
+from llm_backend import UnknownLLMBackendError, create_chat_model
+from local_llm import LocalChatModel
+
+
+def test_local_model_is_deterministic_and_reports_usage():
+    model = LocalChatModel(reply_tokens=8)
+    first = model.invoke([HumanMessage(content="What do you sell?")])
+    second = model.invoke([HumanMessage(content="What do you sell?")])
+    other = model.invoke([HumanMessage(content="Where are you based?")])
+
+    assert first.content == second.content != other.content
+    assert len(first.content.split()) == 8
+    assert first.usage_metadata["output_tokens"] == 8
+
+
+def test_local_model_latency_and_stream_cadence():
+    model = LocalChatModel(latency_ms=50, tokens_per_second=100, reply_tokens=5)
+    started = time.perf_counter()
+    chunks = [chunk.content for chunk in model.stream([HumanMessage(content="hi")]) if chunk.content]
+
+    assert time.perf_counter() - started >= 0.05 + 5 * 0.01
+    assert len(chunks) == 5
+    assert "".join(chunks) == model.invoke([HumanMessage(content="hi")]).content
+
+
+def test_backend_selection():
+    assert isinstance(create_chat_model("chat", "groq"), ChatGroq)
+    extraction = create_chat_model("extraction", "local")
+    assert json.loads(extraction.invoke([SystemMessage(content="extract")]).content)["contact_name"] == "Local User"
+    with pytest.raises(UnknownLLMBackendError):
+        create_chat_model("chat", "openai")
+    with pytest.raises(ValueError):
+        create_chat_model("summary", "local")
+
+
+def test_chat_flow_runs_offline_on_local_backend(monkeypatch):
+    models = {purpose: create_chat_model(purpose, "local") for purpose in llm_backend.LLM_PURPOSES}
+    monkeypatch.setattr(llm_api, "get_chat_model", models.get)
+    monkeypatch.setattr(conversation_processor, "get_chat_model", models.get)
+    session_id = str(uuid.uuid4())
+
+    reply = llm_api.get_groq_response("Hi, I'm Local User", session_id, "sales", "COMMON")
+    # Lead extraction runs on the background executor after the reply
+    llm_api.drain_background_jobs()
+
+    assert reply == models["chat"].invoke([HumanMessage(content="Hi, I'm Local User")]).content
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute("SELECT contact_name, email FROM chat_info WHERE session_id = %s;", (session_id,))
+        assert cur.fetchone() == ("Local User", "local.user@example.com")
+        cur.execute("SELECT COUNT(*) FROM chat_table WHERE session_id = %s;", (session_id,))
+        assert cur.fetchone()[0] == 2
+    sync_connection.rollback()
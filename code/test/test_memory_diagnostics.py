@@ -0,0 +1,45 @@
+import pytest
+
+import api.admin
+import memory_diagnostics
+
+
+@pytest.fixture
+def diagnostics(monkeypatch):
+    monkeypatch.setattr(api.admin, "ADMIN_API_TOKEN", "secret")
+    memory_diagnostics.start_memory_diagnostics(interval_seconds=3600)
+    yield
+    memory_diagnostics.stop_memory_diagnostics()
+
+
+def test_report_without_tracemalloc_only_has_rss():
+    report = memory_diagnostics.memory_report()
+    assert report["tracing"] is False
+    assert report["rss_bytes"] > 0
+    assert "top_allocations" not in report
+
+
+def test_growth_between_snapshots_points_at_allocation_site(diagnostics):
+    retained = [bytearray(1024) for _ in range(2000)]
+    memory_diagnostics.take_snapshot()
+
+    report = memory_diagnostics.memory_report(limit=10)
+    sites = report["growth_since_baseline"]["sites"]
+    assert any("test_memory_diagnostics.py" in site["site"] and site["size_diff_bytes"] >= 2000 * 1024
+               for site in sites)
+    assert report["growth_since_previous"]["sites"]
+    assert retained
+
+
+def test_endpoint_deltas_and_admin_dump(client, diagnostics):
+    client.get("/chat-info")
+    client.get("/chat-info")
+    assert client.post("/admin/memory/snapshot", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+    response = client.get("/admin/memory", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["tracing"] is True
+    assert data["endpoints"]["/chat-info"]["requests"] == 2
+    assert len(data["snapshots"]) >= 2
+    assert data["top_allocations"]
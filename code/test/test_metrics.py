@@ -0,0 +1,79 @@
+import threading
+import uuid
+
+from metrics import CHAT_STAGE_ERRORS, CHAT_STAGE_SECONDS, Counter, Gauge, Histogram, observe_stage
+
+
+def test_counter_sums_values_recorded_on_other_threads():
+    counter = Counter("test_events_total", "Test events.", ("kind",))
+    threads = [threading.Thread(target=lambda: [counter.inc("a") for _ in range(100)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc("b", amount=5)
+
+    assert counter.collect() == {("a",): 400, ("b",): 5}
+    assert 'test_events_total{kind="a"} 400' in counter.render()
+
+
+def test_slots_of_finished_threads_are_folded_into_a_retired_total():
+    histogram = Histogram("test_retired_seconds", "Test retired.", buckets=(1.0,))
+    for finished in (10, 20, 30):
+        threads = [threading.Thread(target=histogram.observe, args=(0.5,)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert histogram.collect() == {(): [finished, 0, 0.5 * finished]}
+        assert histogram._slots == []
+    histogram.observe(2.0)
+    assert histogram.collect() == {(): [30, 1, 17.0]}
+    assert len(histogram._slots) == 1
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_latency_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, "load")
+
+    lines = histogram.render()
+    assert 'test_latency_seconds_bucket{stage="load",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{stage="load",le="1.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{stage="load",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_sum{stage="load"} 4.05' in lines
+    assert 'test_latency_seconds_count{stage="load"} 4' in lines
+
+
+def test_gauge_reads_callbacks_at_scrape_time():
+    state = {"idle": 1}
+    gauge = Gauge("test_pool_connections", "Test pool.", ("pool", "state"))
+    gauge.add_callback(lambda: {("main", "idle"): state["idle"]})
+    state["idle"] = 3
+
+    assert 'test_pool_connections{pool="main",state="idle"} 3' in gauge.render()
+
+
+def test_observe_stage_counts_errors():
+    try:
+        with observe_stage("test_failing_stage"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    assert CHAT_STAGE_ERRORS.collect()[("test_failing_stage",)] == 1
+    # Failed stages are still timed
+    assert sum(CHAT_STAGE_SECONDS.collect()[("test_failing_stage",)][:-1]) == 1
+
+
+def test_metrics_endpoint_exposes_request_and_stage_metrics(client):
+    client.get("/history", query_string={"session_id": str(uuid.uuid4())}, headers={"Origin": "http://example.com"})
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'endpoint="/history",method="GET"' in body
+    assert 'chat_stage_duration_seconds_count{stage="history_load"}' in body
+    assert "# TYPE db_pool_connections gauge" in body
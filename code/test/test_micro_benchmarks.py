@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from benchmarks import micro
+
+
+@pytest.mark.parametrize("name", sorted(micro._benchmarks))
+def test_benchmark_runs(name):
+    result = micro.run_benchmark(micro._benchmarks[name], repeat=1, number=1)
+    assert result["seconds_per_call"] > 0
+
+
+def test_committed_baseline_covers_every_benchmark():
+    assert set(micro.load_baseline()["benchmarks"]) == set(micro._benchmarks)
+
+
+def test_regression_beyond_threshold_fails_the_run(tmp_path, monkeypatch):
+    baseline = tmp_path / "micro.json"
+    micro.save_baseline({"validators.is_valid_uuid": {"seconds_per_call": 1e-6}}, str(baseline))
+    saved = json.loads(baseline.read_text())
+    assert saved["benchmarks"] == {"validators.is_valid_uuid": {"seconds_per_call": 1e-6}}
+
+    rows = micro.compare_with_baseline({"validators.is_valid_uuid": {"seconds_per_call": 1.2e-6},
+                                        "DomainService.generate_key": {"seconds_per_call": 5e-6}},
+                                       saved, threshold=0.25)
+    assert [(row["name"], row["regressed"]) for row in rows] == [
+        ("validators.is_valid_uuid", False), ("DomainService.generate_key", False)]
+    assert rows[1]["change"] is None
+
+    monkeypatch.setattr(micro, "run_benchmarks", lambda pattern, repeat: {
+        "validators.is_valid_uuid": {"seconds_per_call": 2e-6}})
+    assert micro.main(["--baseline", str(baseline), "-k", "uuid"]) == 1
+    assert micro.main(["--baseline", str(baseline), "-k", "uuid", "--threshold", "1.5"]) == 0
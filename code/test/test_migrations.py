@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+import uuid
+
+import psycopg
+import pytest
+
+import config
+import db
+from config import DATABASE_URL
+from migrations import MIGRATION_LOCK_ID, Migration, current_version, migrate
+
+COMPONENT = "test_migrations"
+
+
+@pytest.fixture
+def conn():
+    with psycopg.connect(DATABASE_URL) as conn:
+        yield conn
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM schema_version WHERE component = %s;", (COMPONENT,))
+            cur.execute("DROP TABLE IF EXISTS migration_probe;")
+        conn.commit()
+
+
+def _create_probe(conn):
+    with conn.cursor() as cur:
+        cur.execute("CREATE TABLE IF NOT EXISTS migration_probe (id INTEGER);")
+
+
+def _add_probe_column(conn):
+    with conn.cursor() as cur:
+        cur.execute("ALTER TABLE migration_probe ADD COLUMN IF NOT EXISTS note TEXT;")
+
+
+def test_app_schema_is_current():
+    assert current_version(db.sync_connection, "conversation") == db.CONVERSATION_MIGRATIONS[-1].version
+    assert current_version(db.sync_connection, "primary") == db.PRIMARY_MIGRATIONS[-1].version
+    assert db.migrate_primary_schema(db.sync_connection) == []
+
+
+def test_pending_migrations_apply_in_order_once(conn):
+    migrations = [Migration(1, "probe table", _create_probe)]
+    assert current_version(conn, COMPONENT) == 0
+    assert migrate(conn, COMPONENT, migrations) == [1]
+
+    migrations.append(Migration(2, "probe note column", _add_probe_column))
+    assert migrate(conn, COMPONENT, migrations) == [2]
+    assert migrate(conn, COMPONENT, migrations) == []
+    assert current_version(conn, COMPONENT) == 2
+
+
+def test_failed_migration_keeps_version_and_releases_lock(conn):
+    def broken(conn):
+        with conn.cursor() as cur:
+            cur.execute("ALTER TABLE migration_probe ADD COLUMN oops no_such_type;")
+
+    migrations = [Migration(1, "probe table", _create_probe), Migration(2, "broken", broken)]
+    with pytest.raises(psycopg.errors.UndefinedObject):
+        migrate(conn, COMPONENT, migrations)
+    assert current_version(conn, COMPONENT) == 1
+
+    with psycopg.connect(DATABASE_URL) as other, other.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+        assert cur.fetchone()[0] is True
+
+
+def test_failing_app_baseline_keeps_version(conn):
+    # A stale "domains" table without the address column: the baseline's default-domain insert fails
+    with conn.cursor() as cur:
+        cur.execute("CREATE SCHEMA migration_probe_schema; SET search_path TO migration_probe_schema;")
+        cur.execute("CREATE TABLE domains (id SERIAL PRIMARY KEY, key TEXT NOT NULL);")
+    conn.commit()
+    try:
+        with pytest.raises(psycopg.errors.UndefinedColumn):
+            migrate(conn, COMPONENT, db.PRIMARY_MIGRATIONS[:1])
+        assert current_version(conn, COMPONENT) == 0
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("DROP SCHEMA migration_probe_schema CASCADE; SET search_path TO DEFAULT;")
+        conn.commit()
+
+
+def test_www_duplicates_are_dropped_keeping_children(conn):
+    bare = f"{uuid.uuid4().hex[:12]}.test"
+    addresses = (bare, f"www.{bare}", f"shop.{bare}")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO domains (key, address) VALUES ('WWW_TEST', %s) RETURNING id;", (bare,))
+            bare_id = cur.fetchone()[0]
+            cur.execute("INSERT INTO domains (key, address) VALUES ('WWW_TEST', %s) RETURNING id;", (f"www.{bare}",))
+            www_id = cur.fetchone()[0]
+            cur.execute("INSERT INTO domains (key, address, parent) VALUES ('WWW_TEST_SHOP', %s, %s);",
+                        (f"shop.{bare}", www_id))
+            db.drop_www_duplicate_domains(conn)
+            cur.execute("SELECT address, parent FROM domains WHERE address = ANY(%s) ORDER BY id;", (list(addresses),))
+            assert cur.fetchall() == [(bare, None), (f"shop.{bare}", bare_id)]
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM domains WHERE address = ANY(%s);", (list(addresses),))
+        conn.commit()
+
+
+def test_config_resolves_database_settings_lazily():
+    code = ("import config; assert 'DATABASE_URL' not in vars(config); "
+            "print(config.DATABASE_URL); assert 'DATABASE_URL' in vars(config)")
+    env = {**os.environ, "DB_NAME": "lazy_db"}
+    output = subprocess.check_output([sys.executable, "-c", code], env=env, text=True,
+                                     cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert output.strip().endswith("/lazy_db")
+
+
+def test_db_name_skips_metadata_server_off_google_cloud(monkeypatch):
+    monkeypatch.delenv("DB_NAME", raising=False)
+    monkeypatch.setattr(config, "_on_google_cloud", lambda: False)
+    config.get_db_name.cache_clear()
+    try:
+        assert config.get_db_name() == config.DEFAULT_DB_NAME
+    finally:
+        config.get_db_name.cache_clear()
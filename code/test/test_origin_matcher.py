@@ -0,0 +1,107 @@
+import time
+import uuid
+from http import HTTPStatus
+
+import pytest
+
+from api.validators import origin_directory
+from config import DATABASE_URL
+from db import create_sync_connection, sync_connection
+from domains import OriginDirectory, OriginMatcher
+
+ENTRIES = [
+    ("client.com", "CLIENT"),
+    ("*.client.com", "CLIENT_ANY"),
+    ("shop.client.com", "SHOP"),
+    ("*.eu.shop.client.com", "SHOP_EU"),
+    ("localhost:3000", "LOCAL"),
+]
+
+
+@pytest.mark.parametrize("hostname, key", [
+    ("client.com", "CLIENT"),
+    ("www.client.com", "CLIENT"),
+    ("blog.client.com", "CLIENT_ANY"),
+    ("a.b.client.com", "CLIENT_ANY"),
+    ("shop.client.com", "SHOP"),
+    ("www.shop.client.com", "SHOP"),
+    ("cart.shop.client.com", "CLIENT_ANY"),
+    ("x.eu.shop.client.com", "SHOP_EU"),
+    ("eu.shop.client.com", "CLIENT_ANY"),
+    ("SHOP.Client.COM", "SHOP"),
+    ("localhost:3000", "LOCAL"),
+    ("client.org", None),
+    ("otherclient.com", None),
+    ("com", None),
+    ("www.com", None),
+])
+def test_most_specific_entry_wins(hostname, key):
+    assert OriginMatcher(ENTRIES).match(hostname) == key
+
+
+def test_directory_reloads_in_the_background():
+    address = f"*.{uuid.uuid4().hex[:12]}.test"
+    directory = OriginDirectory(lambda: create_sync_connection(DATABASE_URL, autocommit=True), ttl_seconds=3600)
+    assert directory.resolve("www.example.com") == "COMMON"
+    assert directory.resolve("example.com:8080") == "COMMON"
+    assert directory.resolve(f"app{address[1:]}") is None
+
+    try:
+        with sync_connection.cursor() as cur:
+            cur.execute("INSERT INTO domains (key, address) VALUES ('WILDCARD_TEST', %s);", (address,))
+        sync_connection.commit()
+        # Cached until the TTL or an invalidate, which the refresher thread acts on
+        assert directory.resolve(f"app{address[1:]}") is None
+        directory.invalidate()
+        deadline = time.monotonic() + 5
+        while directory.resolve(f"app{address[1:]}") is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert directory.resolve(f"app{address[1:]}") == "WILDCARD_TEST"
+    finally:
+        directory.close()
+        sync_connection.rollback()
+        with sync_connection.cursor() as cur:
+            cur.execute("DELETE FROM domains WHERE address = %s;", (address,))
+        sync_connection.commit()
+
+
+class _NoQueries:
+    closed = False
+
+    def cursor(self):
+        raise AssertionError("origin lookup queried the database")
+
+    def close(self):
+        pass
+
+
+def test_stale_lookups_do_not_query():
+    directory = OriginDirectory(lambda: create_sync_connection(DATABASE_URL, autocommit=True), ttl_seconds=0)
+    directory.refresh()
+    directory.close()
+    directory._conn = _NoQueries()
+
+    # Past the TTL, lookups keep serving the loaded matcher; only the refresher thread reloads
+    assert directory.resolve("www.example.com") == "COMMON"
+
+
+def test_history_accepts_www_and_wildcard_origins(client):
+    address = f"*.{uuid.uuid4().hex[:12]}.test"
+    try:
+        with sync_connection.cursor() as cur:
+            cur.execute("INSERT INTO domains (key, address) VALUES ('COMMON', %s);", (address,))
+        sync_connection.commit()
+        origin_directory.refresh()
+
+        for origin in ("http://www.example.com", f"https://eu.shop{address[1:]}"):
+            response = client.get("/history", query_string={"session_id": str(uuid.uuid4())}, headers={"Origin": origin})
+            assert response.status_code == HTTPStatus.CREATED, origin
+        bare = client.get("/history", query_string={"session_id": str(uuid.uuid4())},
+                          headers={"Origin": f"https://{address[2:]}"})
+        assert bare.get_json()["error"] == "Incorrect Address"
+    finally:
+        sync_connection.rollback()
+        with sync_connection.cursor() as cur:
+            cur.execute("DELETE FROM domains WHERE address = %s;", (address,))
+        sync_connection.commit()
+        origin_directory.refresh()
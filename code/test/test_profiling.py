@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+import api.admin
+import profiling
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "ADMIN_API_TOKEN", "secret")
+    monkeypatch.setattr(api.admin, "ADMIN_API_TOKEN", "secret")
+    return tmp_path
+
+
+def _busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_profiler_collects_collapsed_stacks():
+    profiler = profiling.RequestProfiler(threading.get_ident(), interval_ms=1).start()
+    _busy_wait(0.1)
+    stacks = profiler.stop()
+
+    assert profiler.samples > 0
+    assert any(stack.split(";")[-1].startswith("_busy_wait@test_profiling.py") for stack in stacks)
+    assert all(" " not in stack for stack in stacks)
+
+
+def test_profiles_are_pruned_to_the_newest(tmp_path):
+    profiler = profiling.RequestProfiler(threading.get_ident(), interval_ms=1).start()
+    profiler.stop()
+    for index in range(5):
+        profiling.write_profile(profiler, f"2026010{index}_chat_r{index}.folded", str(tmp_path), max_files=3)
+
+    assert [profile["name"] for profile in profiling.list_profiles(str(tmp_path))] == [
+        "20260104_chat_r4.folded", "20260103_chat_r3.folded", "20260102_chat_r2.folded"]
+
+
+def test_header_triggers_profile_listed_by_admin_endpoint(client, profile_dir):
+    assert "X-Profile-Id" not in client.get("/health").headers
+    assert "X-Profile-Id" not in client.get("/health", headers={"X-Profile": "wrong"}).headers
+
+    response = client.get("/chat-info", headers={"X-Profile": "secret", "X-Request-ID": "req-1"})
+    name = response.headers["X-Profile-Id"]
+    assert name.endswith("_chat-info_req-1.folded")
+
+    listing = client.get("/admin/profiles", headers={"X-Admin-Token": "secret"}).get_json()
+    assert listing["profiles"][0]["name"] == name
+
+    download = client.get(f"/admin/profiles/{name}", headers={"X-Admin-Token": "secret"})
+    assert download.status_code == 200
+    assert download.get_data(as_text=True).startswith("# samples=")
+    assert client.get("/admin/profiles/..%2Fconfig.py", headers={"X-Admin-Token": "secret"}).status_code == 404
@@ -0,0 +1,171 @@
+"""
+Query-plan regression tests for the hot SQL.
+
+The database is seeded with synthetic domains, leads, history and prompts
+(``benchmarks.datagen``) and ANALYZEd, then each hot function runs against a
+connection whose cursors EXPLAIN every statement instead of executing it.
+The tests assert the expected index is used and no populated table is
+sequentially scanned, so a schema change that drops or breaks an index fails
+here instead of in production.
+"""
+from contextlib import contextmanager
+
+import psycopg
+import pytest
+from langchain_postgres.chat_message_histories import _get_messages_query
+from psycopg import sql
+
+import leads
+import system_prompt
+from api import validators
+from benchmarks import datagen
+from config import DATABASE_URL, table_name
+from conversation_processor import conversation_processor
+from domains import DomainRepository
+
+_plans = []
+
+
+class _ExplainCursor(psycopg.Cursor):
+    """Runs ``EXPLAIN (FORMAT JSON)`` instead of each statement and records the plan."""
+
+    def execute(self, query, params=None, **kwargs):
+        query = sql.SQL(query) if isinstance(query, str) else query
+        super().execute(sql.Composed([sql.SQL("EXPLAIN (FORMAT JSON) "), query]), params, **kwargs)
+        row = self.fetchone()
+        # Callers may ask for dict rows (get_all_chat_info)
+        plan = row["QUERY PLAN"] if isinstance(row, dict) else row[0]
+        _plans.append(plan[0]["Plan"])
+        return self
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    datagen.delete_synthetic_data(DATABASE_URL)
+    datagen.generate(DATABASE_URL, messages=20000, leads=5000, domains=2000, seed=40)
+    with psycopg.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO prompts (domain, agent_type, type, "text")
+            SELECT key, 'sales', 'system', 'Synthetic prompt for ' || address
+            FROM domains WHERE address LIKE %s;
+        """, (f"%.{datagen.SYNTHETIC_SUFFIX}",))
+        cur.execute("ANALYZE prompts;")
+        cur.execute("SELECT key, address FROM domains WHERE address LIKE %s ORDER BY id DESC LIMIT 1;",
+                    (f"%.{datagen.SYNTHETIC_SUFFIX}",))
+        domain = cur.fetchone()
+    session_id = datagen.sample_sessions(DATABASE_URL, 1)[0][0]
+    yield {"key": domain[0], "address": domain[1], "session_id": session_id}
+    with psycopg.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM prompts WHERE domain IN (SELECT key FROM domains WHERE address LIKE %s);",
+                    (f"%.{datagen.SYNTHETIC_SUFFIX}",))
+    datagen.delete_synthetic_data(DATABASE_URL)
+
+
+@pytest.fixture
+def explain():
+    """An autocommit connection whose cursors EXPLAIN instead of executing (plans land in ``_plans``)."""
+    _plans.clear()
+    conn = psycopg.connect(DATABASE_URL, cursor_factory=_ExplainCursor, autocommit=True)
+    yield conn
+    conn.close()
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+def _indexes(plan) -> set:
+    return {node["Index Name"] for node in _nodes(plan) if "Index Name" in node}
+
+
+def _populated_seq_scans(plan) -> list:
+    """Relations read with a Seq Scan that hold rows (empty partitions are rightly seq-scanned)."""
+    relations = [node["Relation Name"] for node in _nodes(plan) if node["Node Type"] == "Seq Scan"]
+    if not relations:
+        return []
+    with psycopg.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        cur.execute("SELECT relname FROM pg_class WHERE relname = ANY(%s) AND reltuples > 0;", (relations,))
+        return [row[0] for row in cur.fetchall()]
+
+
+def _only_plan():
+    assert len(_plans) == 1, f"expected one statement, got {len(_plans)}"
+    return _plans[0]
+
+
+def test_find_prompt_uses_unique_index(seeded, explain, monkeypatch):
+    monkeypatch.setattr(system_prompt, "sync_connection", explain)
+    system_prompt.find_prompt(seeded["key"], "sales", "system")
+
+    plan = _only_plan()
+    assert "prompts_domain_agent_type_type_key" in _indexes(plan)
+    assert _populated_seq_scans(plan) == []
+
+
+def test_find_parent_key_uses_key_and_primary_key_indexes(seeded, explain, monkeypatch):
+    monkeypatch.setattr(system_prompt, "sync_connection", explain)
+    system_prompt.find_parent_key(seeded["key"])
+
+    plan = _only_plan()
+    assert "idx_domains_key" in _indexes(plan)
+    assert _populated_seq_scans(plan) == []
+
+
+def test_validate_address_runs_no_query_once_origins_are_loaded(seeded, explain, monkeypatch, app):
+    # Origins are matched in memory (domains.matcher); the table is read once per ORIGIN_MAP_TTL_SECONDS
+    validators.origin_directory.refresh()
+    monkeypatch.setattr(validators.origin_directory, "_conn", explain)
+    with app.test_request_context("/history", headers={"Origin": f"https://{seeded['address']}"}) as context:
+        response = validators.validate_address(context.request)
+
+    assert response.is_valid and response.data == seeded["key"]
+    assert _plans == []
+
+
+def test_find_by_address_uses_address_index(seeded, explain):
+    DomainRepository(explain).find_by_address(seeded["address"])
+
+    plan = _only_plan()
+    assert _indexes(plan) == {"domains_address_key"}
+    assert _populated_seq_scans(plan) == []
+
+
+def test_history_by_session_uses_session_index(seeded, explain):
+    with explain.cursor() as cur:
+        cur.execute(_get_messages_query(table_name), {"session_id": seeded["session_id"]})
+
+    plan = _only_plan()
+    assert _indexes(plan), "history lookup does not use an index"
+    assert all("session_id" in index for index in _indexes(plan))
+    assert _populated_seq_scans(plan) == []
+
+
+def test_chat_info_upserts_use_session_id_arbiter(seeded, explain):
+    conversation_processor._insert_session_request_type(explain, seeded["session_id"], "sales", seeded["key"])
+    conversation_processor._upsert_info(explain, seeded["session_id"], {"contact_name": "Plan Test"},
+                                        "I am Plan Test", "sales", seeded["key"])
+
+    assert len(_plans) == 2
+    for plan in _plans:
+        assert plan["Conflict Arbiter Indexes"] == ["chat_info_session_id_key"]
+
+
+def test_get_all_chat_info_order_is_served_by_created_at_index(seeded, explain, monkeypatch):
+    # The endpoint returns every active lead, where a seq scan plus sort can be the cheaper
+    # plan; with both disabled the planner must still find an index that yields the order.
+    with psycopg.Cursor(explain) as cur:
+        cur.execute("SET enable_seqscan = off;")
+        cur.execute("SET enable_sort = off;")
+
+    @contextmanager
+    def read_shard_connection(shard):
+        yield explain
+
+    monkeypatch.setattr(leads, "read_shard_connection", read_shard_connection)
+    leads.get_all_chat_info()
+
+    plan = _only_plan()
+    assert "idx_chat_info_created_at" in _indexes(plan)
+    assert not [node for node in _nodes(plan) if node["Node Type"] in ("Seq Scan", "Sort")]
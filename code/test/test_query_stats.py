@@ -0,0 +1,127 @@
+import threading
+
+import psycopg
+import pytest
+
+import api.admin
+from config import DATABASE_URL
+from migrations import MIGRATION_LOCK_ID, Migration, migrate
+from query_stats import InstrumentedCursor, fingerprint, query_stats
+
+
+@pytest.fixture
+def conn():
+    with psycopg.connect(DATABASE_URL, cursor_factory=InstrumentedCursor) as connection:
+        yield connection
+
+
+@pytest.fixture
+def explain_everything(monkeypatch):
+    monkeypatch.setattr(query_stats, "threshold_ms", 0)
+    monkeypatch.setattr(query_stats, "explain_sample_rate", 1.0)
+    monkeypatch.setattr(query_stats, "explain_interval_seconds", 0)
+    query_stats.reset()
+    yield
+    query_stats.reset()
+
+
+def test_fingerprint_replaces_values():
+    assert fingerprint("SELECT key FROM domains WHERE address = 'a.com' AND id = 42;") == \
+        "SELECT key FROM domains WHERE address = ? AND id = ?"
+    assert fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s, %s)") == fingerprint("SELECT 1 FROM t WHERE id IN (%s)")
+    assert fingerprint("INSERT INTO t VALUES (%s::text, %s::int), (%s::text, %s::int)") == "INSERT INTO t VALUES (...)"
+
+
+def test_statements_are_grouped_by_fingerprint(conn, explain_everything):
+    for value in range(5):
+        conn.execute("SELECT %s::int + 1", (value,))
+
+    row = next(row for row in query_stats.summary() if row["fingerprint"] == "SELECT ?::int + ?")
+    assert row["count"] == 5
+    assert 0 <= row["p50_ms"] <= row["p99_ms"] <= row["max_ms"]
+
+
+def test_timings_of_finished_threads_are_kept(conn, explain_everything, monkeypatch):
+    monkeypatch.setattr(query_stats, "explain_sample_rate", 0.0)
+
+    def query():
+        with psycopg.connect(DATABASE_URL, cursor_factory=InstrumentedCursor) as thread_conn:
+            thread_conn.execute("SELECT 'finished thread'")
+    threads = [threading.Thread(target=query) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert next(row for row in query_stats.summary() if row["fingerprint"] == "SELECT ?")["count"] == 3
+    assert all(thread.is_alive() for thread, _ in query_stats._slots)
+
+
+def test_slow_select_is_explained_and_still_returns_its_rows(conn, explain_everything):
+    with conn.cursor() as cur:
+        cur.execute("SELECT datname FROM pg_database WHERE datname = %s", ("postgres",))
+        assert cur.fetchall() == [("postgres",)]
+
+    slow = query_stats.slow_queries()[0]
+    assert slow["fingerprint"] == "SELECT datname FROM pg_database WHERE datname = ?"
+    assert "Scan" in slow["plan"]
+    # Plain EXPLAIN unless ANALYZE is enabled
+    assert "Execution Time" not in slow["plan"]
+
+
+def test_analyze_only_reruns_statements_without_side_effects(conn, explain_everything, monkeypatch):
+    monkeypatch.setattr(query_stats, "explain_analyze", True)
+    conn.execute("SELECT count(*) FROM pg_database WHERE datname = %s", ("postgres",))
+    assert "Execution Time" in query_stats.slow_queries()[0]["plan"]
+
+    conn.execute("CREATE TEMP SEQUENCE query_stats_seq")
+    assert conn.execute("SELECT nextval('query_stats_seq')").fetchone() == (1,)
+    conn.execute("CREATE TEMP TABLE query_stats_locked (n int)")
+    conn.execute("SELECT n FROM query_stats_locked FOR SHARE")
+
+    plans = {slow["fingerprint"]: slow["plan"] for slow in query_stats.slow_queries()}
+    for key in ("SELECT nextval(...)", "SELECT n FROM query_stats_locked FOR SHARE"):
+        assert "Execution Time" not in plans[key]
+    # nextval ran once: not again under EXPLAIN ANALYZE
+    assert conn.execute("SELECT nextval('query_stats_seq')").fetchone() == (2,)
+
+
+def test_migrations_are_not_instrumented(conn, explain_everything, monkeypatch):
+    monkeypatch.setattr(query_stats, "explain_analyze", True)
+    migrate(conn, "test_query_stats", [Migration(1, "noop", lambda conn: None)])
+    try:
+        assert not any("pg_advisory" in row["fingerprint"] for row in query_stats.summary())
+        held = conn.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND objid = %s",
+                            (MIGRATION_LOCK_ID,)).fetchone()
+        assert held == (0,)
+    finally:
+        conn.execute("DELETE FROM schema_version WHERE component = 'test_query_stats'")
+        conn.commit()
+
+
+def test_writes_are_never_explained(conn, explain_everything):
+    conn.execute("CREATE TEMP TABLE query_stats_probe (n int)")
+    conn.execute("INSERT INTO query_stats_probe VALUES (1)")
+    conn.execute("WITH moved AS (DELETE FROM query_stats_probe RETURNING n) SELECT count(*) FROM moved")
+
+    assert all(slow["plan"] is None for slow in query_stats.slow_queries())
+    # Run once, not twice by EXPLAIN ANALYZE
+    assert conn.execute("SELECT count(*) FROM query_stats_probe").fetchone() == (0,)
+
+
+def test_admin_query_stats_requires_token(client, monkeypatch, explain_everything):
+    monkeypatch.setattr(api.admin, "ADMIN_API_TOKEN", None)
+    assert client.get("/admin/query-stats").status_code == 404
+
+    monkeypatch.setattr(api.admin, "ADMIN_API_TOKEN", "secret")
+    assert client.get("/admin/query-stats", headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+    client.get("/chat-info")
+    response = client.get("/admin/query-stats", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert any("chat_info" in row["fingerprint"] for row in data["queries"])
+    assert data["slow_queries"]
+
+    assert client.delete("/admin/query-stats", headers={"X-Admin-Token": "secret"}).status_code == 200
+    assert client.get("/admin/query-stats", headers={"X-Admin-Token": "secret"}).get_json()["queries"] == []
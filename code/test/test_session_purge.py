@@ -0,0 +1,99 @@
+import json
+import uuid
+
+import pytest
+from db import sync_connection, table_name
+from session_purge import count_purge_candidates, purge_inactive_sessions
+
+# Far older than anything the rest of the suite creates
+OLDER_THAN_DAYS = 365 * 20
+
+
+@pytest.fixture
+def sessions():
+    """
+    Two sessions inactive for long with transcripts, plus two old ones that must survive:
+    one active, one created long ago but only just set inactive.
+    """
+    inactive = [str(uuid.uuid4()), str(uuid.uuid4())]
+    active = str(uuid.uuid4())
+    just_closed = str(uuid.uuid4())
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        for session_id, is_active, deactivated_at in [(inactive[0], False, "2000-01-02"),
+                                                      (inactive[1], False, "2000-01-02"),
+                                                      (active, True, None),
+                                                      (just_closed, False, "now")]:
+            cur.execute(
+                "INSERT INTO chat_info (session_id, is_active, created_at, deactivated_at) "
+                "VALUES (%s, %s, '2000-01-01', %s);",
+                (session_id, is_active, deactivated_at),
+            )
+            for n in range(3):
+                cur.execute(
+                    f"INSERT INTO {table_name} (session_id, message) VALUES (%s, %s);",
+                    (session_id, json.dumps({"type": "human", "data": {"content": f"message {n}"}})),
+                )
+    sync_connection.commit()
+    yield inactive, [active, just_closed]
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute("DELETE FROM chat_info WHERE session_id = ANY(%s);", (inactive + [active, just_closed],))
+        cur.execute(f"DELETE FROM {table_name} WHERE session_id = ANY(%s::uuid[]);",
+                    (inactive + [active, just_closed],))
+    sync_connection.commit()
+
+
+def _remaining(session_ids):
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM chat_info WHERE session_id = ANY(%s);", (session_ids,))
+        leads = cur.fetchone()[0]
+        cur.execute(f"SELECT COUNT(*) FROM {table_name} WHERE session_id = ANY(%s::uuid[]);", (session_ids,))
+        messages = cur.fetchone()[0]
+    return leads, messages
+
+
+def test_dry_run_counts_candidates(sessions):
+    assert count_purge_candidates(sync_connection, OLDER_THAN_DAYS) == {"sessions": 2, "messages": 6}
+
+
+def test_purge_deletes_inactive_sessions_in_batches(sessions):
+    inactive, kept = sessions
+    stats = purge_inactive_sessions(sync_connection, OLDER_THAN_DAYS, batch_size=2, delay_seconds=0)
+
+    assert stats["sessions_deleted"] == 2
+    assert stats["messages_deleted"] == 6
+    # 6 messages in chunks of 2 (plus the empty chunk that ends the loop) and one chat_info delete
+    assert stats["batches"] == 5
+    assert _remaining(inactive) == (0, 0)
+    assert _remaining(kept) == (2, 6)
+
+
+def test_purge_respects_max_batches(sessions):
+    inactive, _ = sessions
+    stats = purge_inactive_sessions(sync_connection, OLDER_THAN_DAYS, batch_size=2, delay_seconds=0, max_batches=1)
+
+    # One chunk of two transcript messages, then it stops
+    assert stats["batches"] == 1
+    assert stats["messages_deleted"] == 2
+    assert _remaining(inactive) == (2, 4)
+
+
+def test_deactivation_time_is_recorded(client, sessions):
+    _, (active, _) = sessions
+    client.patch("/chat-info", json={"session_id": active, "is_active": False})
+    closed_at = _deactivated_at(active)
+    assert closed_at is not None
+    # Closing again keeps the first time; reopening clears it
+    client.patch("/chat-info/bulk", json={"updates": [{"session_id": active, "is_active": False}]})
+    assert _deactivated_at(active) == closed_at
+    client.patch("/chat-info/bulk", json={"updates": [{"session_id": active, "is_active": True}]})
+    assert _deactivated_at(active) is None
+
+
+def _deactivated_at(session_id):
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute("SELECT deactivated_at FROM chat_info WHERE session_id = %s;", (session_id,))
+        return cur.fetchone()[0]
@@ -0,0 +1,104 @@
+import uuid
+from http import HTTPStatus
+
+import pytest
+from starlette.testclient import TestClient
+
+import llm_api
+import llm_backend
+import session_token
+from asgi import create_asgi_app
+from session_token import SessionTokenError, issue_token, parse_keys, verify_token
+
+ORIGIN = {"Origin": "http://example.com"}
+
+
+@pytest.fixture
+def signing_keys(monkeypatch):
+    monkeypatch.setattr(session_token, "_keys", parse_keys("k2:new-secret,k1:old-secret"))
+
+
+@pytest.fixture
+def local_chat(monkeypatch):
+    model = llm_backend.create_chat_model("chat", "local")
+    monkeypatch.setattr(llm_api, "get_chat_model", lambda purpose: model)
+    monkeypatch.setattr(llm_api, "_process_conversation_async", lambda *args: None)
+
+
+def test_token_round_trip_and_rejections(signing_keys):
+    session_id = str(uuid.uuid4())
+    token = issue_token(session_id, "COMMON", "sales", now=1000)
+
+    claims = verify_token(token, now=1001)
+    assert (claims["sid"], claims["dom"], claims["typ"], claims["kid"]) == (session_id, "COMMON", "sales", "k2")
+
+    payload, signature = token.split(".")
+    forged = issue_token(session_id, "OTHER", "sales", now=1000).split(".")[0]
+    for bad in (f"{forged}.{signature}", f"{payload}.{signature[:-2]}", "garbage", f"{payload}."):
+        with pytest.raises(SessionTokenError, match="Invalid session token"):
+            verify_token(bad, now=1001)
+    with pytest.raises(SessionTokenError, match="expired"):
+        verify_token(token, now=1000 + session_token.SESSION_TOKEN_TTL_SECONDS)
+
+
+def test_key_rotation(monkeypatch):
+    monkeypatch.setattr(session_token, "_keys", parse_keys("k1:old-secret"))
+    old_token = issue_token(str(uuid.uuid4()), "COMMON", "sales")
+
+    # New key first: it signs, the old one still verifies until removed
+    monkeypatch.setattr(session_token, "_keys", parse_keys("k2:new-secret,k1:old-secret"))
+    assert verify_token(old_token)["kid"] == "k1"
+    assert verify_token(issue_token(str(uuid.uuid4()), "COMMON", "sales"))["kid"] == "k2"
+
+    monkeypatch.setattr(session_token, "_keys", parse_keys("k2:new-secret"))
+    with pytest.raises(SessionTokenError):
+        verify_token(old_token)
+
+
+def test_no_keys_no_tokens(client, monkeypatch):
+    monkeypatch.setattr(session_token, "_keys", [])
+    response = client.get("/history", query_string={"session_id": str(uuid.uuid4())}, headers=ORIGIN)
+
+    assert issue_token(str(uuid.uuid4()), "COMMON", "sales") is None
+    assert "session_token" not in response.get_json()
+    with pytest.raises(ValueError):
+        parse_keys("missing-secret")
+
+
+def test_history_token_is_accepted_by_chat(client, signing_keys, local_chat):
+    session_id = str(uuid.uuid4())
+    history = client.get("/history", query_string={"session_id": session_id, "request_type": "generic"},
+                         headers=ORIGIN).get_json()
+    claims = verify_token(history["session_token"])
+    assert (claims["sid"], claims["dom"], claims["typ"]) == (session_id, "COMMON", "generic")
+
+    # No Origin and no session id: the token carries both
+    response = client.post("/chat", json={"input": "Hello"},
+                           headers={"X-Session-Token": history["session_token"]})
+    assert response.status_code == HTTPStatus.OK
+    stored = client.get("/history", query_string={"session_id": session_id}, headers=ORIGIN).get_json()["history"]
+    assert stored[-1]["content"] == response.get_json()["response"]
+
+
+def test_chat_rejects_bad_or_mismatched_tokens(client, signing_keys):
+    token = issue_token(str(uuid.uuid4()), "COMMON", "sales")
+
+    mismatched = client.post("/chat", json={"input": "Hello", "session_id": str(uuid.uuid4()), "session_token": token})
+    assert mismatched.status_code == HTTPStatus.BAD_REQUEST
+    assert mismatched.get_json()["error"] == "Session token does not match the session id"
+
+    wrong_type = client.post("/chat", json={"input": "Hello", "request_type": "generic", "session_token": token})
+    assert wrong_type.get_json()["error"] == "Session token does not match the request type"
+
+    tampered = client.post("/chat", json={"input": "Hello", "session_token": token[:-2]})
+    assert tampered.get_json()["error"] == "Invalid session token"
+
+
+def test_asgi_history_and_chat_use_tokens(signing_keys, local_chat):
+    session_id = str(uuid.uuid4())
+    with TestClient(create_asgi_app()) as asgi_client:
+        history = asgi_client.get("/history", params={"session_id": session_id}, headers=ORIGIN).json()
+        response = asgi_client.post("/chat", json={"input": "Hello", "session_token": history["session_token"]})
+
+    assert verify_token(history["session_token"])["sid"] == session_id
+    assert response.status_code == HTTPStatus.OK and response.json()["success"]
@@ -0,0 +1,98 @@
+import json
+import uuid
+
+import psycopg
+import pytest
+from config import DATABASE_URL, PRIMARY_SHARD, table_name
+from db import sync_connection
+import sharding
+from sharding import ShardMovingError, ShardRouter, move_domain
+
+SHARD_DB = "chatdb_shard_test"
+SHARD_URL = DATABASE_URL.rsplit("/", 1)[0] + f"/{SHARD_DB}"
+DOMAIN_KEY = "SHARD_TEST_COM"
+
+
+def _admin(statement):
+    with psycopg.connect(DATABASE_URL.rsplit("/", 1)[0] + "/postgres", autocommit=True) as conn:
+        conn.execute(statement)
+
+
+@pytest.fixture
+def shard(monkeypatch):
+    _admin(f'DROP DATABASE IF EXISTS "{SHARD_DB}" WITH (FORCE)')
+    _admin(f'CREATE DATABASE "{SHARD_DB}"')
+    monkeypatch.setitem(sharding.SHARD_DATABASE_URLS, "s1", SHARD_URL)
+    yield "s1"
+    sync_connection.rollback()
+    with sync_connection.cursor() as cur:
+        cur.execute("DELETE FROM domain_shards WHERE domain_key = %s;", (DOMAIN_KEY,))
+        cur.execute("DELETE FROM chat_info WHERE domain = %s;", (DOMAIN_KEY,))
+    sync_connection.commit()
+    _admin(f'DROP DATABASE IF EXISTS "{SHARD_DB}" WITH (FORCE)')
+
+
+def _map(shard_name, moving=False):
+    with sync_connection.cursor() as cur:
+        cur.execute(
+            "INSERT INTO domain_shards (domain_key, shard, moving) VALUES (%s, %s, %s) "
+            "ON CONFLICT (domain_key) DO UPDATE SET shard = EXCLUDED.shard, moving = EXCLUDED.moving;",
+            (DOMAIN_KEY, shard_name, moving),
+        )
+    sync_connection.commit()
+
+
+def test_without_shards_everything_is_primary():
+    router = ShardRouter({}, sync_connection)
+    assert router.shard_for(DOMAIN_KEY) == PRIMARY_SHARD
+    assert router.all_shards() == [PRIMARY_SHARD]
+
+
+def test_mapped_domain_resolves_to_its_shard(shard):
+    _map(shard)
+    router = ShardRouter({shard: SHARD_URL}, sync_connection)
+    try:
+        assert router.shard_for(DOMAIN_KEY) == shard
+        assert router.shard_for("UNMAPPED_KEY") == PRIMARY_SHARD
+        # Shard schema is created on first use
+        with router.connection(shard) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM chat_info").fetchone() == (0,)
+    finally:
+        router.close()
+
+
+def test_moving_domain_is_rejected(shard):
+    _map(PRIMARY_SHARD, moving=True)
+    router = ShardRouter({shard: SHARD_URL}, sync_connection)
+    with pytest.raises(ShardMovingError):
+        router.shard_for(DOMAIN_KEY)
+
+
+def test_move_domain_copies_rows_and_flips_map(shard):
+    session_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+    with sync_connection.cursor() as cur:
+        for session_id in session_ids:
+            cur.execute("INSERT INTO chat_info (session_id, domain, contact_name) VALUES (%s, %s, 'Jane');",
+                        (session_id, DOMAIN_KEY))
+            for n in range(2):
+                cur.execute(f"INSERT INTO {table_name} (session_id, message) VALUES (%s, %s);",
+                            (session_id, json.dumps({"type": "human", "data": {"content": f"m{n}"}})))
+    sync_connection.commit()
+
+    stats = move_domain(DOMAIN_KEY, shard, wait_seconds=0)
+
+    assert stats == {"sessions": 2, "messages": 4}
+    with psycopg.connect(SHARD_URL) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM chat_info WHERE domain = %s AND contact_name = 'Jane'",
+                            (DOMAIN_KEY,)).fetchone() == (2,)
+        messages = conn.execute(f"SELECT message->'data'->>'content' FROM {table_name} WHERE session_id = %s ORDER BY id",
+                                (session_ids[0],)).fetchall()
+        assert messages == [("m0",), ("m1",)]
+    with sync_connection.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM chat_info WHERE domain = %s;", (DOMAIN_KEY,))
+        assert cur.fetchone() == (0,)
+        cur.execute(f"SELECT COUNT(*) FROM {table_name} WHERE session_id = ANY(%s::uuid[]);", (session_ids,))
+        assert cur.fetchone() == (0,)
+        cur.execute("SELECT shard, moving FROM domain_shards WHERE domain_key = %s;", (DOMAIN_KEY,))
+        assert cur.fetchone() == (shard, False)
+    sync_connection.rollback()
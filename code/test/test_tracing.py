@@ -0,0 +1,123 @@
+import json
+import uuid
+
+import pytest
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.messages import AIMessage
+
+import llm_api
+import tracing
+from db import sync_connection
+
+
+@pytest.fixture
+def spans(tmp_path):
+    """Record spans to a temporary file; call the fixture value to read them back."""
+    path = tmp_path / "spans.jsonl"
+    tracing.init_tracing(str(path))
+
+    def read():
+        tracing.shutdown_tracing()
+        records = []
+        for line in path.read_text().splitlines():
+            for resource_spans in json.loads(line)["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    records.extend(scope_spans["spans"])
+        return records
+
+    yield read
+    tracing.shutdown_tracing()
+
+
+def _attributes(span):
+    return {item["key"]: next(iter(item["value"].values())) for item in span["attributes"]}
+
+
+def test_request_span_with_query_children_and_request_id(client, spans):
+    response = client.get("/history", query_string={"session_id": str(uuid.uuid4())},
+                          headers={"Origin": "http://example.com", "X-Request-ID": "req-123"})
+    assert response.headers["X-Request-ID"] == "req-123"
+
+    recorded = spans()
+    server = next(span for span in recorded if span["name"] == "GET /history")
+    assert server["kind"] == 2
+    assert _attributes(server)["http.status_code"] in ("200", "201")
+    assert response.headers["traceparent"] == f"00-{server['traceId']}-{server['spanId']}-01"
+
+    queries = [span for span in recorded if span["name"] == "db.query"]
+    assert queries
+    assert all(span["traceId"] == server["traceId"] for span in queries)
+    assert all(_attributes(span)["request.id"] == "req-123" for span in queries)
+    assert any("chat_table" in _attributes(span)["db.statement"] for span in queries)
+
+
+@pytest.mark.parametrize("header", ["", "a" * 65, "id with spaces", "../../etc/passwd", "<script>"])
+def test_unsafe_request_ids_are_replaced(client, header):
+    response = client.get("/health", headers={"X-Request-ID": header})
+
+    request_id = response.headers["X-Request-ID"]
+    assert request_id != header and len(request_id) == 32
+    assert tracing.request_id_from("req-1.a_B") == "req-1.a_B"
+
+
+def test_generated_request_id_and_incoming_traceparent(client, spans):
+    trace_id, parent_id = "0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331"
+    response = client.get("/chat-info", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+
+    assert len(response.headers["X-Request-ID"]) == 32
+    server = next(span for span in spans() if span["name"] == "GET /chat-info")
+    assert server["traceId"] == trace_id
+    assert server["parentSpanId"] == parent_id
+
+
+def test_background_processing_joins_request_trace(monkeypatch, spans):
+    def fake_process_conversation(*args):
+        with sync_connection.cursor() as cur:
+            cur.execute("SELECT 1;")
+        sync_connection.rollback()
+
+    monkeypatch.setattr(llm_api, "process_conversation", fake_process_conversation)
+    token = tracing.bind_request_id("req-bg")
+    with tracing.start_span("POST /chat", kind="server") as request_span:
+        llm_api._process_conversation_async("hi", str(uuid.uuid4()), "sales", "COMMON", "primary").result()
+    tracing.unbind_request_id(token)
+
+    recorded = spans()
+    background = next(span for span in recorded if span["name"] == "background.process_conversation")
+    assert background["traceId"] == request_span.trace_id
+    assert background["parentSpanId"] == request_span.span_id
+    assert _attributes(background)["request.id"] == "req-bg"
+    query = next(span for span in recorded if span["name"] == "db.query")
+    assert query["parentSpanId"] == background["spanId"]
+
+
+def test_llm_callback_records_client_span_with_usage(spans):
+    callback = tracing.LLMTracingCallback("chat")
+    run_id = uuid.uuid4()
+    with tracing.start_span("POST /chat", kind="server") as request_span:
+        callback.on_chat_model_start({}, [], run_id=run_id, invocation_params={"model": "test-model"})
+        callback.on_llm_end(LLMResult(generations=[[ChatGeneration(message=AIMessage(content="ok"))]],
+                                      llm_output={"token_usage": {"prompt_tokens": 12, "completion_tokens": 3}}),
+                            run_id=run_id)
+
+    llm = next(span for span in spans() if span["name"] == "llm.chat")
+    assert llm["kind"] == 3
+    assert llm["parentSpanId"] == request_span.span_id
+    attributes = _attributes(llm)
+    assert attributes["llm.model"] == "test-model"
+    assert attributes["llm.usage.prompt_tokens"] == "12"
+
+
+def test_failed_span_records_error_status(spans):
+    with pytest.raises(ValueError):
+        with tracing.start_span("failing"):
+            raise ValueError("boom")
+
+    failing = next(span for span in spans() if span["name"] == "failing")
+    assert failing["status"] == {"code": 2, "message": "ValueError: boom"}
+
+
+def test_nothing_is_recorded_while_tracing_is_off():
+    with tracing.start_span("ignored") as span:
+        assert span is None
+        assert tracing.current_span() is None
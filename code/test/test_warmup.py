@@ -0,0 +1,66 @@
+import pytest
+
+import warmup
+
+
+@pytest.fixture
+def fresh_warmup():
+    """Warm-up state cleared for the test and restored to ready afterwards (the suite runs without warm-up)."""
+    warmup.reset()
+    yield
+    warmup.reset()
+    warmup.mark_ready()
+
+
+def test_ready_is_503_until_warmup_finishes(client, fresh_warmup):
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "warming_up"
+
+    assert warmup.run_warmup() is True
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["status"] == "ready"
+    assert set(body["steps"]) == {name for name, _ in warmup.WARMUP_STEPS}
+    assert all(step["ok"] for step in body["steps"].values())
+
+
+def test_failed_step_keeps_worker_unready_and_is_retried(client, fresh_warmup):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database unreachable")
+
+    done = []
+    steps = (("database", flaky), ("prompts", lambda: done.append(1)))
+
+    assert warmup.run_warmup(steps) is False
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.get_json()["steps"]["database"] == {"ok": False, "error": "database unreachable",
+                                                        "seconds": pytest.approx(0, abs=1)}
+
+    # The retry only re-runs the failed step
+    assert warmup.run_warmup(steps) is True
+    assert len(calls) == 2 and len(done) == 1
+    assert client.get("/ready").status_code == 200
+    assert warmup.readiness_report()["attempts"] == 2
+
+
+def test_start_warmup_retries_in_background(fresh_warmup):
+    attempts = []
+
+    def step():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("not yet")
+
+    thread = warmup.start_warmup((("database", step),), retry_seconds=0.01)
+    thread.join(timeout=5)
+
+    assert warmup.is_ready()
+    assert len(attempts) == 3
@@ -0,0 +1,59 @@
+import json
+import os
+
+import db
+import db_router
+import sharding
+import system_prompt
+import warmup
+import worker_lifecycle
+
+
+def _backend_pid(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_backend_pid();")
+        pid = cur.fetchone()[0]
+    conn.rollback()
+    return pid
+
+
+def test_forked_worker_gets_its_own_connection():
+    parent_pid = _backend_pid(db.sync_connection)
+    read_end, write_end = os.pipe()
+    child = os.fork()
+    if child == 0:
+        # Worker side: anything going wrong must still end the child, never return into pytest
+        try:
+            os.close(read_end)
+            worker_lifecycle.after_fork()
+            report = {
+                "pid": _backend_pid(db.sync_connection),
+                "rebound": system_prompt.sync_connection is db.sync_connection,
+                "routers": sharding.router._directory is db.sync_connection is db_router.router._primary,
+                "ready": warmup.is_ready(),
+            }
+            os.write(write_end, json.dumps(report).encode())
+        finally:
+            os._exit(0)
+
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        report = json.loads(pipe.read())
+    os.waitpid(child, 0)
+
+    assert report["pid"] != parent_pid
+    assert report["rebound"] and report["routers"] and report["ready"]
+    # The parent's session survived the child's start-up and exit
+    assert _backend_pid(db.sync_connection) == parent_pid
+
+
+def test_before_and_after_fork_replace_the_shared_connection():
+    before = db.sync_connection
+
+    worker_lifecycle.before_fork()
+    assert before.closed
+    worker_lifecycle.after_fork()
+
+    assert db.sync_connection is not before
+    assert system_prompt.sync_connection is db.sync_connection
+    assert _backend_pid(system_prompt.sync_connection) > 0
@@ -0,0 +1,350 @@
+"""
+Request tracing with spans exported as OTLP/JSON to a rotating local file.
+
+Every HTTP request gets a server span (see ``create_app``) carrying its
+request ID, which is taken from the ``X-Request-ID`` header (when it matches
+``[A-Za-z0-9._-]{1,64}``) or generated, and echoed back.  An incoming W3C ``traceparent`` header continues the caller's
+trace.  Child spans are recorded for:
+
+* chat stages (``metrics.observe_stage`` opens a span per stage),
+* every query run through a ``TracedCursor`` (the base of
+  ``query_stats.InstrumentedCursor``, the cursor factory of all application
+  connections and pools),
+* LLM calls, via ``LLMTracingCallback``.
+
+The current span is held in a ``contextvars.ContextVar``; the background
+conversation processor is handed the request span and request ID explicitly so
+its spans join the request's trace.
+
+Finished spans are written by a background thread, one OTLP/JSON
+``ExportTraceServiceRequest`` per line, so the file can be replayed into a
+collector (``POST /v1/traces``) or read with ``jq``.  Nothing is recorded
+until ``init_tracing`` is called (TRACING_ENABLED).
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import psycopg
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import TRACE_FILE, TRACE_FILE_BACKUP_COUNT, TRACE_FILE_MAX_BYTES, TRACING_SERVICE_NAME
+
+SpanContext = namedtuple("SpanContext", "trace_id span_id")
+
+# OTLP span kinds
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+MAX_STATEMENT_LENGTH = 2000
+# Client-supplied request IDs accepted as-is; anything else is replaced
+_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_request_id = contextvars.ContextVar("request_id", default=None)
+_exporter = None
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_span_id", "attributes", "links",
+                 "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, name: str, parent=None, kind="internal", attributes=None, links=()):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        if _request_id.get():
+            self.attributes.setdefault("request.id", _request_id.get())
+        self.links = list(links)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if _exporter is not None:
+            _exporter.export(self)
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS[self.kind],
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": 2, "message": self.error} if self.error else {},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        if self.links:
+            span["links"] = [{"traceId": link.trace_id, "spanId": link.span_id} for link in self.links]
+        return span
+
+
+class SpanFileExporter:
+    """Appends finished spans to a size-rotated file from a background thread."""
+
+    def __init__(self, path: str, max_bytes: int = TRACE_FILE_MAX_BYTES, backup_count: int = TRACE_FILE_BACKUP_COUNT,
+                 service_name: str = TRACING_SERVICE_NAME):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._resource = {"attributes": _otlp_attributes({"service.name": service_name, "process.pid": os.getpid()})}
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue = queue.SimpleQueue()
+        self._enqueue = QueueHandler(self._queue)
+        self._listener = QueueListener(self._queue, self._handler)
+        self._listener.start()
+
+    def export(self, span: Span):
+        batch = {"resourceSpans": [{
+            "resource": self._resource,
+            "scopeSpans": [{"scope": {"name": "ai-agent.tracing"}, "spans": [span.to_otlp()]}],
+        }]}
+        self._enqueue.handle(logging.makeLogRecord({"msg": json.dumps(batch, default=str)}))
+
+    def queue_depth(self) -> int:
+        """Spans handed to the writer thread but not yet written."""
+        return self._queue.qsize()
+
+    def shutdown(self):
+        """Write out queued spans and close the file."""
+        self._listener.stop()
+        self._handler.close()
+
+
+def init_tracing(path: str = TRACE_FILE, max_bytes: int = TRACE_FILE_MAX_BYTES,
+                 backup_count: int = TRACE_FILE_BACKUP_COUNT) -> SpanFileExporter:
+    """Start recording spans to *path* (once per process)."""
+    global _exporter
+    if _exporter is None:
+        _exporter = SpanFileExporter(path, max_bytes, backup_count)
+        print(f"[TRACING] Writing spans to {path}")
+    return _exporter
+
+
+def shutdown_tracing():
+    global _exporter
+    exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.shutdown()
+
+
+def export_queue_depth() -> dict:
+    """Gauge callback: spans waiting to be written, when tracing is on."""
+    exporter = _exporter
+    return {} if exporter is None else {("trace_export",): exporter.queue_depth()}
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def request_id_from(header):
+    """The client's X-Request-ID if it is a short token, else a new ID (it is echoed, logged and traced)."""
+    if header and _REQUEST_ID.fullmatch(header):
+        return header
+    return uuid.uuid4().hex
+
+
+def bind_request_id(request_id):
+    """Set the request ID for the current context; returns a token for ``unbind_request_id``."""
+    return _request_id.set(request_id)
+
+
+def unbind_request_id(token):
+    _request_id.reset(token)
+
+
+def parse_traceparent(header):
+    """Return the caller's SpanContext from a W3C ``traceparent`` header, or None."""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return SpanContext(parts[1], parts[2])
+
+
+# ---------------------------------------------------------------------------
+# Creating spans
+# ---------------------------------------------------------------------------
+
+def open_span(name: str, parent=None, kind="internal", attributes=None, links=()):
+    """
+    Start a span and make it current. Returns None while tracing is off.
+    Must be paired with ``close_span`` on the same thread.
+    """
+    if _exporter is None:
+        return None
+    span = Span(name, parent or _current_span.get(), kind, attributes, links)
+    span._token = _current_span.set(span)
+    return span
+
+
+def close_span(span, error=None):
+    if span is None:
+        return
+    if error is not None:
+        span.record_exception(error)
+    if span._token is not None:
+        _current_span.reset(span._token)
+        span._token = None
+    span.end()
+
+
+@contextmanager
+def start_span(name: str, parent=None, kind="internal", attributes=None, links=()):
+    """Record the enclosed block as a child of the current span (or of *parent*)."""
+    span = open_span(name, parent, kind, attributes, links)
+    try:
+        yield span
+    except BaseException as e:
+        close_span(span, e)
+        raise
+    close_span(span)
+
+
+def traced(name: str):
+    """Decorator form of ``start_span``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+
+class TracedCursor(psycopg.Cursor):
+    """Cursor recording a ``db.query`` span per statement executed inside a traced request."""
+
+    def execute(self, query, params=None, **kwargs):
+        with query_span(self, query):
+            return super().execute(query, params, **kwargs)
+
+    def executemany(self, query, params_seq, **kwargs):
+        with query_span(self, query):
+            return super().executemany(query, params_seq, **kwargs)
+
+
+@contextmanager
+def query_span(cursor, query):
+    """A ``db.query`` span around a statement run on *cursor* (sync or async)."""
+    # Startup and maintenance queries run outside any request: not traced
+    if _exporter is None or _current_span.get() is None:
+        yield
+        return
+    with start_span("db.query", kind="client", attributes={
+        "db.system": "postgresql",
+        "db.name": cursor.connection.info.dbname,
+        "db.statement": statement_text(query, cursor)[:MAX_STATEMENT_LENGTH],
+    }) as span:
+        yield
+        span.set_attribute("db.rows", cursor.rowcount)
+
+
+class LLMTracingCallback(BaseCallbackHandler):
+    """LangChain callback recording a client span per LLM call."""
+
+    def __init__(self, call: str):
+        self.call = call
+        self._spans = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        for key in ("prompt_tokens", "completion_tokens"):
+            if usage.get(key) is not None:
+                span.set_attribute(f"llm.usage.{key}", usage[key])
+        span.end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.record_exception(error)
+            span.end()
+
+    def _start(self, run_id, kwargs):
+        if _exporter is None:
+            return
+        params = kwargs.get("invocation_params") or {}
+        # Not made current: nothing runs inside it on this thread
+        self._spans[run_id] = Span(f"llm.{self.call}", _current_span.get(), "client", {
+            "llm.call": self.call,
+            "llm.model": params.get("model") or params.get("model_name") or "",
+        })
+
+
+def statement_text(query, cursor) -> str:
+    if isinstance(query, bytes):
+        return query.decode("utf-8", "replace")
+    if isinstance(query, str):
+        return query
+    return query.as_string(cursor)
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            encoded.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            encoded.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            encoded.append({"key": key, "value": {"stringValue": str(value)}})
+    return encoded
@@ -0,0 +1,162 @@
+"""
+Worker warm-up and readiness.
+
+``start_warmup`` (called from ``create_app`` when WARMUP_ENABLED) runs, in a
+background thread, everything the first requests would otherwise pay for:
+
+* database: the primary connection, the read-replica pool and every shard
+  pool (which also brings shard schemas up to date);
+* domains and prompts: the origin matcher, the default domain's lookups,
+  shard mapping and prompt resolution, so connections, catalog caches and Postgres buffers are hot;
+* imports deferred off the start-up path (langchain_postgres, LangChain
+  prompts and runnables);
+* the chat and extraction LLM clients.
+
+``GET /ready`` answers 503 until every step has succeeded, so a load balancer
+only routes to warm workers; ``/health`` stays a plain liveness check.  Failed
+steps are retried every WARMUP_RETRY_SECONDS.
+"""
+import importlib
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import DEFAULT_DOMAIN, WARMUP_RETRY_SECONDS, agent_type
+
+# Imported lazily by llm_api / conversation_processor on the first chat request
+WARMUP_IMPORTS = ("langchain_core.messages", "langchain_core.prompts", "langchain_core.runnables.history")
+
+_lock = threading.Lock()
+_ready = threading.Event()
+_state = {"started_at": None, "finished_at": None, "attempts": 0, "steps": {}}
+_warmup_thread = None
+
+
+def _warm_database():
+    from db import sync_connection
+    from db_router import read_connection
+    from sharding import router, shard_connection
+
+    with sync_connection.cursor() as cur:
+        cur.execute("SELECT 1;")
+    sync_connection.rollback()
+    with read_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1;")
+    for shard in router.all_shards():
+        with shard_connection(shard) as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+
+
+def _warm_domains():
+    from api.validators import origin_directory
+    from db import sync_connection
+    from domains import DomainRepository
+    from sharding import router
+    from system_prompt import find_parent_key
+
+    DomainRepository(sync_connection).find_by_id(1)
+    origin_directory.resolve("example.com")
+    find_parent_key(DEFAULT_DOMAIN)
+    sync_connection.rollback()
+    router.shard_for(DEFAULT_DOMAIN)
+
+
+def _warm_prompts():
+    from db import sync_connection
+    from system_prompt import get_prompt
+
+    get_prompt(DEFAULT_DOMAIN, agent_type.SALES, "system")
+    get_prompt(DEFAULT_DOMAIN, agent_type.SALES, "fetch-contact-info")
+    get_prompt(DEFAULT_DOMAIN, agent_type.GENERIC, "fetch-name")
+    sync_connection.rollback()
+
+
+def preload_imports():
+    """Import the modules deferred off the start-up path (no connections or threads, so fork-safe)."""
+    from history import _history_class
+
+    for module in WARMUP_IMPORTS:
+        importlib.import_module(module)
+    _history_class()
+
+
+def _warm_llm_clients():
+    from llm_backend import LLM_PURPOSES, get_chat_model
+
+    for purpose in LLM_PURPOSES:
+        get_chat_model(purpose)
+
+
+WARMUP_STEPS = (
+    ("database", _warm_database),
+    ("domains", _warm_domains),
+    ("prompts", _warm_prompts),
+    ("imports", preload_imports),
+    ("llm_clients", _warm_llm_clients),
+)
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def readiness_report() -> dict:
+    with _lock:
+        return {"ready": _ready.is_set(), **_state, "steps": {name: dict(step) for name, step in _state["steps"].items()}}
+
+
+def run_warmup(steps=WARMUP_STEPS) -> bool:
+    """Run the steps not yet done; marks the worker ready once all have succeeded."""
+    with _lock:
+        _state["started_at"] = _state["started_at"] or datetime.now(timezone.utc).isoformat()
+        _state["attempts"] += 1
+    for name, step in steps:
+        if _state["steps"].get(name, {}).get("ok"):
+            continue
+        started = time.perf_counter()
+        try:
+            step()
+            result = {"ok": True}
+        except Exception as e:
+            print(f"[WARMUP] Step '{name}' failed: {e}")
+            result = {"ok": False, "error": str(e)}
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        with _lock:
+            _state["steps"][name] = result
+
+    with _lock:
+        done = all(_state["steps"].get(name, {}).get("ok") for name, _ in steps)
+        if done:
+            _state["finished_at"] = datetime.now(timezone.utc).isoformat()
+            _ready.set()
+    if done:
+        total = sum(step["seconds"] for step in _state["steps"].values())
+        print(f"[WARMUP] Worker ready after {total:.2f}s of warm-up")
+    return done
+
+
+def start_warmup(steps=WARMUP_STEPS, retry_seconds: float = WARMUP_RETRY_SECONDS):
+    """Warm up in a background thread (once per process), retrying failed steps until ready."""
+    global _warmup_thread
+    if _warmup_thread is not None and _warmup_thread.is_alive():
+        return _warmup_thread
+
+    def loop():
+        while not run_warmup(steps):
+            time.sleep(retry_seconds)
+
+    _warmup_thread = threading.Thread(target=loop, name="warmup", daemon=True)
+    _warmup_thread.start()
+    return _warmup_thread
+
+
+def mark_ready():
+    """Skip warm-up (WARMUP_ENABLED off): the worker is ready immediately."""
+    _ready.set()
+
+
+def reset():
+    """Forget all warm-up progress (tests)."""
+    with _lock:
+        _ready.clear()
+        _state.update({"started_at": None, "finished_at": None, "attempts": 0, "steps": {}})
@@ -0,0 +1,82 @@
+"""
+Per-process resources and their set-up under a pre-forking server.
+
+With ``preload_app`` (gunicorn.conf.py) the master imports the app once, so
+migrations run once and workers share the imported code copy-on-write.
+Connections, pools, LLM clients and threads must not cross the fork:
+
+* ``before_fork`` (master, once, before the first worker) closes the master's
+  connection and pools, imports the deferred LangChain modules so workers
+  share them, and starts the maintenance workers there, which open a
+  connection per pass;
+* ``after_fork`` (each worker) opens the worker's own connection, resets the
+  replica and shard routers so their pools are created on demand, drops the
+  cached LLM clients and the background executor, and starts the worker's
+  threads (span writer, memory snapshots, warm-up);
+* ``worker_exit`` waits for queued conversation processing and flushes spans.
+
+Without a forking server (``python app.py``, ``flask run``) ``create_app``
+starts everything in-process.
+"""
+import db
+import db_router
+import llm_api
+import llm_backend
+import sharding
+import warmup
+from api import validators
+from config import (CHAT_RETENTION_ENABLED, MEMORY_DIAGNOSTICS_ENABLED, PURGE_ENABLED, TRACING_ENABLED,
+                    WARMUP_ENABLED)
+from history_retention import start_retention_worker
+from memory_diagnostics import start_memory_diagnostics
+from session_purge import start_purge_worker
+from tracing import init_tracing, shutdown_tracing
+
+
+def start_process_resources():
+    """Threads owned by one serving process: span writer, memory snapshots, warm-up."""
+    if TRACING_ENABLED:
+        init_tracing()
+    if MEMORY_DIAGNOSTICS_ENABLED:
+        start_memory_diagnostics()
+    if WARMUP_ENABLED:
+        warmup.start_warmup()
+    else:
+        warmup.mark_ready()
+
+
+def start_maintenance_workers():
+    """History partitions and archival, inactive-session purge: one set per server, not per worker."""
+    # Upcoming months are partitioned even with archival off, or their rows would land in DEFAULT
+    start_retention_worker(archive=CHAT_RETENTION_ENABLED)
+    if PURGE_ENABLED:
+        start_purge_worker()
+
+
+def before_fork():
+    """In the master, before forking workers: release connections, share imports, start maintenance."""
+    db.sync_connection.close()
+    db_router.router.close()
+    sharding.router.close()
+    validators.origin_directory.close()
+    print("[WORKERS] Master released its database connections before forking")
+    warmup.preload_imports()
+    start_maintenance_workers()
+
+
+def after_fork():
+    """In a freshly forked worker: open this worker's connections, clients and threads."""
+    connection = db.reconnect_after_fork()
+    db_router.router.after_fork(connection)
+    sharding.router.after_fork(connection)
+    validators.origin_directory.after_fork()
+    llm_backend.get_chat_model.cache_clear()
+    llm_api.reset_background_executor_after_fork()
+    warmup.reset()
+    start_process_resources()
+
+
+def worker_exit():
+    """In a stopping worker: finish queued conversation processing, write out spans."""
+    llm_api.drain_background_jobs()
+    shutdown_tracing()
@@ -31,8 +31,16 @@ echo "Stopping only ai-agent service..."
 pkill -f "/opt/ai-agent-boilerplate"
 
 cd /opt/ai-agent-boilerplate/code
-export FLASK_APP=app.py
-nohup flask run --host=0.0.0.0 --port=5000 > flask.log 2>&1 &
-
+# Multi-process server; settings and per-worker set-up in code/gunicorn.conf.py
+nohup gunicorn app:app > flask.log 2>&1 &
+
+echo "Waiting for warm-up (/ready)..."
+for _ in $(seq 1 120); do
+	if curl -fs http://127.0.0.1:5000/ready > /dev/null; then
+		break
+	fi
+	sleep 1
+done
+curl -fs http://127.0.0.1:5000/ready > /dev/null || { echo "❌ Service not ready after 120s, see flask.log"; exit 1; }
 
 echo "✅ Deployment complete!"